@@ -0,0 +1,220 @@
+import logging
+import queue
+import torch
+import torch.multiprocessing as mp
+from agent import DQN, DQNAgent
+
+# Multi-process self-play: K actor processes play PokerGame hands with
+# snapshots of the learner's networks and stream their experiences back over
+# a torch.multiprocessing queue, which moves tensors through shared memory.
+# The learner (the training process) consumes them, trains, and periodically
+# publishes new weights into shared-memory models the actors reload from.
+
+STATE_SIZE = 7 + (5 * 2) + 2 * 4 * 2
+ACTION_SIZE = 4
+SEATS = ("oop", "ip")
+
+HANDS_PER_MESSAGE = 32  # Hands an actor plays before sending its experiences
+SYNC_EVERY = 256  # Hands the learner trains on between weight broadcasts
+QUEUE_DEPTH = 4  # Messages each actor may have in flight
+
+
+def publish_weights(agents, shared_models, shared_epsilons, weights_version):
+    """
+    Copy the learner's weights and epsilons to the shared snapshots.
+
+    Args:
+        agents (dict): Learner DQNAgent per seat.
+        shared_models (dict): Shared-memory DQN per seat.
+        shared_epsilons (dict): Shared epsilon value per seat.
+        weights_version (mp.Value): Incremented so actors know to reload.
+    """
+    with weights_version.get_lock():
+        for seat in SEATS:
+            # load_state_dict copies in place, so the shared storage is kept
+            shared_models[seat].load_state_dict(agents[seat].model.state_dict())
+            shared_epsilons[seat].value = agents[seat].epsilon
+        weights_version.value += 1
+
+
+def actor_loop(actor_id, shared_models, shared_epsilons, weights_version, experience_queue, stop_event, drained_event):
+    """
+    Actor process: self-play with the latest weight snapshot and send experiences to the learner.
+
+    Args:
+        actor_id (int): Index of this actor, used in logs.
+        shared_models (dict): Shared-memory DQN per seat.
+        shared_epsilons (dict): Shared epsilon value per seat.
+        weights_version (mp.Value): Version of the shared snapshots.
+        experience_queue (mp.Queue): Queue of experience messages to the learner.
+        stop_event (mp.Event): Set by the learner when training is over.
+        drained_event (mp.Event): Set by the learner once it has emptied the
+            queue. Shared tensors must outlive their transfer, so actors wait for it.
+    """
+    # Imported here so the engine's logging is set up in the actor process
+    from ai_trainer import PokerGame
+
+    torch.set_num_threads(1)
+    try:
+        game = PokerGame()
+        agents = {"oop": game.oop_agent, "ip": game.ip_agent}
+        version = -1
+
+        while not stop_event.is_set():
+            if weights_version.value != version:
+                with weights_version.get_lock():
+                    for seat in SEATS:
+                        agents[seat].model.load_state_dict(shared_models[seat].state_dict())
+                        agents[seat].epsilon = shared_epsilons[seat].value
+                    version = weights_version.value
+
+            rewards = {"oop": 0.0, "ip": 0.0}
+            for _ in range(HANDS_PER_MESSAGE):
+                _, oop_reward, ip_reward = game.play_hand()
+                rewards["oop"] += oop_reward
+                rewards["ip"] += ip_reward
+
+            experiences = {}
+            for seat in SEATS:
+                memory = agents[seat].memory
+                # Copies, since the replay storage is reused for the next hands
+                experiences[seat] = tuple(t.clone() for t in memory.transitions()) if len(memory) else None
+                memory.clear()
+
+            message = (experiences, HANDS_PER_MESSAGE, rewards["oop"], rewards["ip"])
+            while not stop_event.is_set():
+                try:
+                    experience_queue.put(message, timeout=1)
+                    break
+                except queue.Full:
+                    pass
+    except Exception:
+        logging.exception(f"Actor {actor_id} failed")
+        raise
+    finally:
+        # Always tell the learner, which otherwise waits on this actor forever
+        logging.info(f"Actor {actor_id} stopping")
+        experience_queue.put(None)
+        drained_event.wait()
+
+
+def start_actors(num_actors, agents):
+    """
+    Create the shared weight snapshots and start the actor processes.
+
+    Args:
+        num_actors (int): Number of actor processes.
+        agents (dict): Learner DQNAgent per seat, whose weights seed the snapshots.
+
+    Returns:
+        dict: Handles used by publish_weights and stop_actors.
+    """
+    ctx = mp.get_context("spawn")
+    shared_models = {}
+    shared_epsilons = {}
+    for seat in SEATS:
+        shared_models[seat] = DQN(STATE_SIZE, ACTION_SIZE)
+        shared_models[seat].share_memory()
+        shared_epsilons[seat] = ctx.Value("d", 1.0)
+    weights_version = ctx.Value("i", 0)
+    publish_weights(agents, shared_models, shared_epsilons, weights_version)
+
+    experience_queue = ctx.Queue(maxsize=num_actors * QUEUE_DEPTH)
+    stop_event = ctx.Event()
+    drained_event = ctx.Event()
+    processes = [
+        ctx.Process(
+            target=actor_loop,
+            args=(i, shared_models, shared_epsilons, weights_version, experience_queue, stop_event, drained_event),
+            daemon=True,
+        )
+        for i in range(num_actors)
+    ]
+    for process in processes:
+        process.start()
+
+    return {
+        "shared_models": shared_models,
+        "shared_epsilons": shared_epsilons,
+        "weights_version": weights_version,
+        "queue": experience_queue,
+        "stop_event": stop_event,
+        "drained_event": drained_event,
+        "processes": processes,
+    }
+
+
+def stop_actors(pool):
+    """
+    Stop the actors, discard experiences still in flight and join the processes.
+
+    Args:
+        pool (dict): Handles returned by start_actors.
+    """
+    pool["stop_event"].set()
+    running = len(pool["processes"])
+    while running:
+        try:
+            if pool["queue"].get(timeout=5) is None:
+                running -= 1
+        except queue.Empty:
+            # Killed actors never send their None
+            if running <= sum(process.exitcode is not None for process in pool["processes"]):
+                break
+    pool["drained_event"].set()
+    for process in pool["processes"]:
+        process.join()
+
+
+def next_message(pool, timeout=5):
+    """
+    Wait for the next experience message from the actors.
+
+    Args:
+        pool (dict): Handles returned by start_actors.
+        timeout (float): Seconds between checks that the actors are still running.
+
+    Returns:
+        tuple: An experience message, or None when an actor stopped.
+    """
+    while True:
+        # A killed actor never sends its None
+        for process in pool["processes"]:
+            if process.exitcode is not None:
+                raise RuntimeError(f"Actor process {process.pid} exited with code {process.exitcode}")
+        try:
+            return pool["queue"].get(timeout=timeout)
+        except queue.Empty:
+            pass
+
+
+def ingest_experiences(agent, experiences):
+    """
+    Add a batch of experiences received from an actor to an agent's replay memory.
+
+    Args:
+        agent (DQNAgent): The learner agent.
+        experiences (tuple): (states, actions, rewards, next_states, dones) tensors.
+    """
+    # Copied into the replay storage, so the actor's shared memory can be released
+    agent.remember_batch(*experiences)
+
+
+def make_learner_agents(oop_agent=None, ip_agent=None):
+    """
+    Return learner agents per seat, creating any that are not given.
+
+    Args:
+        oop_agent (DQNAgent, optional): A pre-initialized OOP agent.
+        ip_agent (DQNAgent, optional): A pre-initialized IP agent.
+
+    Returns:
+        dict: DQNAgent per seat.
+    """
+    agents = {
+        "oop": oop_agent or DQNAgent(STATE_SIZE, ACTION_SIZE),
+        "ip": ip_agent or DQNAgent(STATE_SIZE, ACTION_SIZE),
+    }
+    agents["oop"].name = "OOP"
+    agents["ip"].name = "IP"
+    return agents
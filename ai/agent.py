@@ -4,8 +4,8 @@ import torch.nn as nn
 import torch.optim as optim
 import torch.cuda
 import random
-from collections import deque
-from metrics import q_value, epsilon, action_taken, bet_size_metric
+from replay_buffer import ReplayBuffer, PrioritizedReplayBuffer, MemmapReplayBuffer
+from metrics import q_value, epsilon, action_taken, bet_size_metric, metrics_accumulator, timed
 
 
 class DQN(nn.Module):
@@ -42,33 +42,64 @@ class DQN(nn.Module):
         return torch.cat([actions, bet_size], dim=-1)
 
 
+def cpu_copy(value):
+    """
+    Recursively copy the tensors in a state dict to the CPU.
+
+    Args:
+        value: A tensor, or a dict, list or tuple containing tensors.
+
+    Returns:
+        The same structure with every tensor cloned to the CPU.
+    """
+    if isinstance(value, torch.Tensor):
+        return value.detach().to("cpu", copy=True)
+    if isinstance(value, dict):
+        return {key: cpu_copy(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(cpu_copy(item) for item in value)
+    return value
+
 
 # fmt: off
 class DQNAgent:
-    def __init__(self, state_size, action_size):
+    def __init__(self, state_size, action_size, prioritized=False, replay_path=None, replay_capacity=10000):
         """
         Initialize the DQN Agent.
 
         Args:
             state_size (int): The size of the state space.
             action_size (int): The number of possible actions.
+            prioritized (bool): Sample replay memory in proportion to TD error.
+            replay_path (str, optional): Directory of a disk-backed replay store,
+                reopened if it already exists.
+            replay_capacity (int): Maximum number of transitions remembered.
         """
         self.name = None
         self.state_size = state_size  # Dimension of poker game state (cards, pot, etc.)
         self.action_size = action_size  # Number of possible actions (fold, call, raise)
         self.batch_size = 128
-        self.memory = deque(maxlen=10000)  # Experience replay buffer, crucial for stable learning in poker
         self.gamma = 0.95    # Discount rate for future rewards, important for long-term strategy
         self.epsilon = 1.0   # Start with 100% exploration to learn diverse poker situations
         self.epsilon_min = 0.01  # Minimum exploration to always adapt to opponent's strategy
         self.epsilon_decay = 0.995  # Gradually reduce exploration to exploit learned poker knowledge
         self.learning_rate = 0.001  # Small learning rate for stable improvement of poker strategy
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")  # GPU acceleration for faster learning
+        # Experience replay buffer, crucial for stable learning in poker. The
+        # prioritized variant replays rare high-error spots (big pots, all-ins) more often
+        if replay_path and prioritized:
+            raise ValueError("Prioritized replay is not supported with a disk-backed replay store")
+        if replay_path:
+            self.memory = MemmapReplayBuffer(replay_path, replay_capacity, state_size, self.device)
+        else:
+            replay_buffer = PrioritizedReplayBuffer if prioritized else ReplayBuffer
+            self.memory = replay_buffer(replay_capacity, state_size, self.device)
         self.model = DQN(state_size, action_size).to(self.device)  # Main network for action selection
         self.target_model = DQN(state_size, action_size).to(self.device)  # Target network for stable Q-learning
         self.optimizer = optim.Adam(self.model.parameters(), lr=self.learning_rate)  # Adam optimizer works well for poker's noisy rewards
         self.min_bet = 2
 
+    @timed("remember")
     def remember(self, state, action, reward, next_state, done):
         """
         Store a transition in the replay memory.
@@ -81,14 +112,27 @@ class DQNAgent:
             done: Whether the episode has ended.
         """
         # Store experiences to learn from diverse poker situations
-        state = torch.FloatTensor(state).to(self.device) if not isinstance(state, torch.Tensor) else state.to(self.device)
-        next_state = torch.FloatTensor(next_state).to(self.device) if not isinstance(next_state, torch.Tensor) else next_state.to(self.device)
-        action = torch.LongTensor([action]).to(self.device)
-        reward = torch.FloatTensor([reward]).to(self.device)
-        done = torch.FloatTensor([done]).to(self.device)
+        state = torch.as_tensor(state, dtype=torch.float32, device=self.device)
+        next_state = torch.as_tensor(next_state, dtype=torch.float32, device=self.device)
+        self.memory.add(state, action, reward, next_state, done)
 
-        self.memory.append((state, action, reward, next_state, done))
+    @timed("remember")
+    def remember_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Store a batch of transitions in the replay memory.
 
+        Args:
+            states: (N, state_size) states.
+            actions: (N,) actions taken.
+            rewards: (N,) rewards received.
+            next_states: (N, state_size) resulting states.
+            dones: (N,) whether each episode has ended.
+        """
+        self.memory.add_batch(
+            *(torch.as_tensor(t, dtype=torch.float32, device=self.device) for t in (states, actions, rewards, next_states, dones))
+        )
+
+    @timed("act")
     def act(self, state, valid_actions, max_bet, min_bet):
         """
         Choose an action using an epsilon-greedy policy.
@@ -97,42 +141,79 @@ class DQNAgent:
             state: The current state.
 
         Returns:
-            int: The chosen action.
+            tuple: (action, bet_size, diagnostics). diagnostics holds the
+            "q_values" from the forward pass that chose the action, "max_q"
+            over the valid actions and whether the action was "explored", so
+            callers never need to run the network again for instrumentation.
         """
         state_tensor = torch.FloatTensor(state).unsqueeze(0).to(self.device)
         with torch.no_grad():
-            q_values = self.model(state_tensor)
+            q_values = self.model(state_tensor)[0].cpu().numpy()
 
         action_map = {"fold": 0, "check": 1, "call": 2, "bet": 3}
         valid_action_indices = [action_map[action] for action in valid_actions]
-        
-        if not isinstance(state, torch.Tensor):
-            state = torch.FloatTensor(state).to(self.device)
-        elif state.device != self.device:
-            state = state.to(self.device)
-        if np.random.rand() <= self.epsilon:
+        valid_q_values = q_values[valid_action_indices]
+
+        explored = np.random.rand() <= self.epsilon
+        if explored:
             # Exploration: randomly try actions to discover new poker strategies
             action = random.choice(valid_action_indices)
         else:
-            valid_q_values = q_values[0, valid_action_indices]
-            action = valid_action_indices[valid_q_values.argmax().item()]
+            # Exploitation: choose best action based on learned Q-values
+            action = valid_action_indices[valid_q_values.argmax()]
 
+        player = 'oop' if self.name == 'OOP' else 'ip'
         bet_size = None
         if action == 3 and "bet" in valid_actions:
-            bet_fraction = q_values[0, -1].item()
+            bet_fraction = float(q_values[-1])
             bet_size = max(min_bet, min(min_bet + bet_fraction * (max_bet - min_bet), max_bet))
-            ##print(f"DQN bet_size: {bet_size}")
             bet_size = round(bet_size, 0)
-            bet_size_metric.labels(player='oop' if self.name == 'OOP' else 'ip', street="agent_decision").observe(bet_size)  # Add this line
+            metrics_accumulator.observe(bet_size_metric, bet_size, player=player, street="agent_decision")
 
+        max_q = float(valid_q_values.max())
+        metrics_accumulator.set(q_value, max_q, player=player)
+        metrics_accumulator.set(epsilon, self.epsilon, player=player)
 
-        max_q_values = q_values[0, valid_action_indices].max().item()
-        q_value.labels(player='oop' if self.name == 'OOP' else 'ip').set(max_q_values)
-        epsilon.labels(player='oop' if self.name == 'OOP' else 'ip').set(self.epsilon)
-        # Exploitation: choose best action based on learned Q-values
-        ##print(f"ABOUT TO RETURN BET SIZE: {bet_size}")
-        return action, bet_size
+        diagnostics = {"q_values": q_values, "max_q": max_q, "explored": explored}
+        return action, bet_size, diagnostics
 
+    @timed("act_batch")
+    def act_batch(self, states, valid_mask, max_bets, min_bets):
+        """
+        Choose actions for a batch of states with a single forward pass.
+
+        Args:
+            states (torch.Tensor): (N, state_size) encoded states.
+            valid_mask (torch.Tensor): (N, action_size) boolean mask of valid actions.
+            max_bets (torch.Tensor): (N,) maximum bet for each state.
+            min_bets (torch.Tensor): (N,) minimum bet for each state.
+
+        Returns:
+            tuple: (actions, bet_sizes) as NumPy arrays of shape (N,).
+        """
+        states = states.to(self.device)
+        valid_mask = valid_mask.to(self.device)
+        max_bets = max_bets.to(self.device)
+        min_bets = min_bets.to(self.device)
+        with torch.no_grad():
+            q_values = self.model(states)
+
+        action_q = q_values[:, :self.action_size].masked_fill(~valid_mask, float("-inf"))
+        actions = action_q.argmax(dim=1)
+
+        # Exploration: a uniformly random valid action for each exploring row
+        explore = torch.rand(len(states), device=self.device) <= self.epsilon
+        if explore.any():
+            actions[explore] = torch.multinomial(valid_mask[explore].float(), 1).squeeze(1)
+
+        bet_fraction = q_values[:, -1]
+        bet_sizes = torch.minimum(torch.maximum(min_bets + bet_fraction * (max_bets - min_bets), min_bets), max_bets)
+        bet_sizes = torch.where(actions == 3, torch.round(bet_sizes), torch.zeros_like(bet_sizes))
+
+        metrics_accumulator.set(epsilon, self.epsilon, player='oop' if self.name == 'OOP' else 'ip')
+        return actions.cpu().numpy(), bet_sizes.cpu().numpy()
+
+    @timed("replay")
     def replay(self, batch_size):
         """
         Train the model using experiences from the replay memory.
@@ -144,40 +225,56 @@ class DQNAgent:
         if len(self.memory) < self.batch_size:
             return
 
-        minibatch = random.sample(self.memory, self.batch_size)  # Random sampling breaks correlation between consecutive hands
-        states, actions, rewards, next_states, dones = zip(*minibatch)
+        # Random sampling breaks correlation between consecutive hands
+        (states, actions, rewards, next_states, dones), indices, weights = self.memory.sample_weighted(self.batch_size)
+        loss_value, td_errors = self.learn(states, actions, rewards, next_states, dones, weights)
+        self.memory.update_priorities(indices, td_errors)
+
+        # Decay epsilon to gradually shift from exploration to exploitation
+        if self.epsilon > self.epsilon_min:
+            self.epsilon *= self.epsilon_decay
+
+        return loss_value
 
-        # Convert to tensors for batch processing
-        states = torch.stack(states)
-        actions = torch.cat(actions)
-        rewards = torch.cat(rewards)
-        next_states = torch.stack(next_states)
-        dones = torch.cat(dones)
+    def learn(self, states, actions, rewards, next_states, dones, weights=None):
+        """
+        Take one gradient step on a minibatch of transitions.
 
+        Args:
+            states (torch.Tensor): (N, state_size) states.
+            actions (torch.Tensor): (N,) actions taken, as int64.
+            rewards (torch.Tensor): (N,) rewards received.
+            next_states (torch.Tensor): (N, state_size) resulting states.
+            dones (torch.Tensor): (N,) whether each episode has ended.
+            weights (torch.Tensor, optional): (N,) per-transition loss weights.
+
+        Returns:
+            tuple: (loss, td_errors).
+        """
         # Compute current Q-values and target Q-values
-        current_q = self.model(states)
-        next_q = self.target_model(next_states).detach()
-        target_q = current_q.clone()
-
-        for i in range(batch_size):
-            if actions[i] == 3:
-                target_q[i, -1] = rewards[i]
-            else:
-                target_q[i, actions[i]] = rewards[i] + self.gamma * next_q[i].max() * (1- dones[i])
-
-        # MSE loss helps the model learn to accurately predict action values in poker
-        loss = nn.MSELoss()(current_q, target_q)
+        current = self.model(states)
+        taken_q = current[:, :self.action_size].gather(1, actions.unsqueeze(1)).squeeze(1)
+        with torch.no_grad():
+            next_q = self.target_model(next_states)[:, :self.action_size].max(dim=1).values
+            td_target = rewards + self.gamma * next_q * (1 - dones)
+
+        # Bets train the bet-size head towards the reward, every other action
+        # trains its own Q-value towards the TD target
+        is_bet = actions == 3
+        prediction = torch.where(is_bet, current[:, -1], taken_q)
+        target = torch.where(is_bet, rewards, td_target)
+
+        # MSE loss helps the model learn to accurately predict action values in poker,
+        # weighted to correct for prioritized sampling
+        td_errors = target - prediction
+        squared_errors = td_errors ** 2
+        loss = (squared_errors if weights is None else weights * squared_errors).mean()
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
+        metrics_accumulator.end_learner_step()
 
-        # Decay epsilon to gradually shift from exploration to exploitation
-        if self.epsilon > self.epsilon_min:
-            self.epsilon *= self.epsilon_decay
-
-        loss_value = loss.item()
-
-        return loss_value
+        return loss.item(), td_errors
 
     def update_target_model(self):
         """
@@ -185,3 +282,35 @@ class DQNAgent:
         """
         # Periodically update target network to stabilize training
         self.target_model.load_state_dict(self.model.state_dict())
+
+    def state_dict(self):
+        """
+        Snapshot everything needed to resume training.
+
+        Tensors are copied to the CPU, so the snapshot stays valid while
+        training goes on and can be written out by another thread.
+
+        Returns:
+            dict: Network, target network and optimizer state, epsilon and replay memory.
+        """
+        return {
+            "model": cpu_copy(self.model.state_dict()),
+            "target_model": cpu_copy(self.target_model.state_dict()),
+            "optimizer": cpu_copy(self.optimizer.state_dict()),
+            "epsilon": self.epsilon,
+            "memory": self.memory.state_dict(),
+        }
+
+    def load_state_dict(self, state):
+        """
+        Restore a snapshot returned by state_dict.
+
+        Args:
+            state (dict): The saved agent state.
+        """
+        self.model.load_state_dict(state["model"])
+        self.target_model.load_state_dict(state["target_model"])
+        # Adam moments are moved to the parameters' device on load
+        self.optimizer.load_state_dict(state["optimizer"])
+        self.epsilon = state["epsilon"]
+        self.memory.load_state_dict(state["memory"])
@@ -4,7 +4,9 @@ import sys
 import numpy as np
 from agent import DQNAgent
 from phevaluator import evaluate_omaha_cards
-from logging_config import setup_logging
+from logging_config import setup_logging, hand_logger, start_hand_logging
+from cards import NUM_CARDS, CARD_ENCODING, cards_to_str, encode_cards
+from hand_history import pack_action
 import torch
 from metrics import (
     episode_reward,
@@ -19,6 +21,8 @@ from metrics import (
     loss,
     bet_size_metric,
     update_bet_size,
+    metrics_accumulator,
+    timed,
 )
 
 CONST_100bb = 200
@@ -37,14 +41,15 @@ class Player:
         Player.players.append(self)
         self.name: str = name
         self.chips: int = chips
-        self.hand = []
+        self.hand = np.empty(0, dtype=np.uint8)
 
     @classmethod
     def get_players(cls):
         return cls.players
 
     def reset_hands():
-        [player.hand.clear() for player in Player.get_players()]
+        for player in Player.get_players():
+            player.hand = np.empty(0, dtype=np.uint8)
 
     def reset_chips():
         for player in Player.get_players():
@@ -67,17 +72,19 @@ class HumanPlayer(Player):
 
 class Deck:
     def __init__(self):
-        # fmt: off
-        self.cards = [
-            "2c", "3c", "4c", "5c", "6c", "7c", "8c", "9c", "Tc", "Jc", "Qc", "Kc", "Ac", 
-            "2d", "3d", "4d", "5d", "6d", "7d", "8d", "9d", "Td", "Jd", "Qd", "Kd", "Ad", 
-            "2h", "3h", "4h", "5h", "6h", "7h", "8h", "9h", "Th", "Jh", "Qh", "Kh", "Ah", 
-            "2s", "3s", "4s", "5s", "6s", "7s", "8s", "9s", "Ts", "Js", "Qs", "Ks", "As",
-        ]
-        # fmt: on
+        # Card ids 0..51, see cards.py
+        self.cards = np.arange(NUM_CARDS, dtype=np.uint8)
+        self.position = 0
 
     def shuffle(self):
-        secrets.SystemRandom().shuffle(self.cards)
+        rng = np.random.default_rng(secrets.randbits(128))
+        self.cards = rng.permutation(NUM_CARDS).astype(np.uint8)
+        self.position = 0
+
+    def deal(self, num_cards):
+        cards = self.cards[self.position : self.position + num_cards]
+        self.position += num_cards
+        return cards
 
 
 class PokerGame:
@@ -85,6 +92,8 @@ class PokerGame:
         self.deck = Deck()
 
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # Where this game's metric updates go, see metrics.MetricsAccumulator
+        self.metrics = metrics_accumulator
 
         if human_position == "oop":
             self.oop_player = HumanPlayer(name="OOP", chips=200)
@@ -96,12 +105,20 @@ class PokerGame:
             self.oop_player = Player(name="OOP", chips=200)
             self.ip_player = Player(name="IP", chips=200)
 
-        self.initialize_game_state()
-
         # Initialize DQN agents
         self.state_size = 7 + (5 * 2) + 2 * 4 * 2
         self.action_size = 4  # check, call, bet, fold
 
+        # The state encoding is written in place into one preallocated buffer.
+        # Board and hand slots change only when cards are dealt, the first 7
+        # floats are refreshed at each decision.
+        self.state_buffer = np.zeros(self.state_size, dtype=np.float32)
+        self.state_tensor = torch.from_numpy(self.state_buffer)
+        self.oop_hand_encoding = np.zeros(8, dtype=np.float32)
+        self.ip_hand_encoding = np.zeros(8, dtype=np.float32)
+
+        self.initialize_game_state()
+
         if oop_agent:
             self.oop_agent = oop_agent
             self.oop_agent.name = "OOP"
@@ -123,6 +140,10 @@ class PokerGame:
         self.oop_cumulative_reward = 0
         self.ip_cumulative_reward = 0
 
+        # Optional HandHistoryWriter, given the decisions of each hand as packed action bytes
+        self.recorder = None
+        self.hand_actions = []
+
         logging.info("PokerGame initialized")
 
     def calculate_state_size(self):
@@ -137,49 +158,65 @@ class PokerGame:
             (num_hand_cards * num_players * card_encoding_size)
         )
 
+    def encode_state(self, current_player=None):
+        # Refresh the preallocated encoding from the game attributes, without
+        # building a state dict. The returned tensor shares memory with the
+        # buffer and is overwritten by the next call.
+        buffer = self.state_buffer
+        buffer[:7] = (
+            self.pot,
+            len(self.community_cards),
+            self.current_bet,
+            self.oop_player.chips,
+            self.ip_player.chips,
+            self.oop_committed,
+            self.ip_committed,
+        )
+        if current_player == self.oop_player:
+            buffer[17:25] = self.oop_hand_encoding
+        else:
+            buffer[17:25] = self.ip_hand_encoding
+        return self.state_tensor
+
+    def update_card_encoding(self):
+        # Called whenever hands or the board change
+        self.state_buffer[7:17] = encode_cards(self.community_cards, 5)
+        self.oop_hand_encoding[:] = encode_cards(self.oop_player.hand, 4)
+        self.ip_hand_encoding[:] = encode_cards(self.ip_player.hand, 4)
+
     def get_state_representation(self, state=None, current_player=None):
         # Convert the game state to a numerical representation for the DQN
         if state is None:
-            state = self.get_game_state()
-        representation = [
-            float(state["pot"]),
-            float(len(state["community_cards"])),
-            float(state["current_bet"]),
-            float(state["oop_player"]["chips"]),
-            float(state["ip_player"]["chips"]),
-            float(state["oop_player"]["committed"]),
-            float(state["ip_player"]["committed"]),
-        ]
-        # Add encoded representations of community cards and player hands
-        community_cards = state["community_cards"] + [""] * (
-            5 - len(state["community_cards"])
+            # Snapshot of the preallocated encoding, safe to keep in replay memory
+            return self.encode_state(current_player).clone()
+        representation = np.zeros(self.state_size, dtype=np.float32)
+        representation[:7] = (
+            state["pot"],
+            len(state["community_cards"]),
+            state["current_bet"],
+            state["oop_player"]["chips"],
+            state["ip_player"]["chips"],
+            state["oop_player"]["committed"],
+            state["ip_player"]["committed"],
         )
-        for card in community_cards:
-            representation.extend(self.encode_card(card))
-
+        # Add encoded representations of community cards and player hands,
+        # the last 8 slots stay zero
+        representation[7:17] = encode_cards(state["community_cards"], 5)
         if current_player == self.oop_player:
-            for card in state["oop_player"]["hand"]:
-                representation.extend(self.encode_card(card))
-            representation.extend([0, 0] * 4)
+            representation[17:25] = encode_cards(state["oop_player"]["hand"], 4)
         else:
-            for card in state["ip_player"]["hand"]:
-                representation.extend(self.encode_card(card))
-            representation.extend([0, 0] * 4)
-
-        assert len(representation) == self.state_size, f"State size mismatch: expected { self.state_size }"
+            representation[17:25] = encode_cards(state["ip_player"]["hand"], 4)
 
-        return torch.FloatTensor(representation)
+        return torch.from_numpy(representation)
 
     def encode_card(self, card):
-        if not card:
+        if card is None:
             return [0, 0]
         # Simple encoding: rank (2-14) and suit (0-3)
-        ranks = "23456789TJQKA"
-        suits = "cdhs"
-        return (ranks.index(card[0]) + 2, suits.index(card[1]))
+        return CARD_ENCODING[card]
 
     def initialize_game_state(self):
-        self.community_cards = []
+        self.community_cards = np.empty(0, dtype=np.uint8)
         self.pot = 3
         self.hand_over = False
         self.current_bet = 2
@@ -195,7 +232,8 @@ class PokerGame:
 
     def deal_cards(self):
         for player in [self.oop_player, self.ip_player]:
-            player.hand = [self.deck.cards.pop() for _ in range(4)]
+            player.hand = self.deck.deal(4)
+        self.update_card_encoding()
 
     def start_new_hand(self):
         self.initialize_game_state()
@@ -208,8 +246,10 @@ class PokerGame:
         return self.get_game_state()
 
     def play_hand(self):
-        logging.info("Starting new hand")
+        start_hand_logging()
+        hand_logger.info("Starting new hand")
         game_state = self.start_new_hand()
+        self.hand_actions.clear()
 
         # print(f"Your hand: {self.get_player_hand()}")
 
@@ -258,51 +298,58 @@ class PokerGame:
 
         final_state = self.get_state_representation()
         oop_reward, ip_reward = self.calculate_rewards(game_state)
-        logging.info(f"OOP Reward: {oop_reward}")
-        logging.info(f"IP Reward: {ip_reward}")
+        hand_logger.info("OOP Reward: %s", oop_reward)
+        hand_logger.info("IP Reward: %s", ip_reward)
+
+        if self.recorder is not None:
+            self.recorder.record(
+                self.oop_player.hand, self.ip_player.hand, self.community_cards, self.hand_actions,
+                game_state["pot"], oop_reward, ip_reward,
+                showdown=self.num_active_players == 2, allin=self.is_allin,
+            )
 
-        for state, action, valid_actions, bet_size, max_bet in oop_experiences:
-            self.oop_agent.remember(state, action, oop_reward, final_state, True)
-        for state, action, valid_actions, bet_size, max_bet in ip_experiences:
-            self.ip_agent.remember(state, action, ip_reward, final_state, True)
+        for agent, experiences, reward in (
+            (self.oop_agent, oop_experiences, oop_reward),
+            (self.ip_agent, ip_experiences, ip_reward),
+        ):
+            if experiences:
+                states, actions, valid_actions, bet_sizes, max_bets = zip(*experiences)
+                n = len(states)
+                agent.remember_batch(torch.stack(states), actions, [reward] * n, final_state.expand(n, -1), [True] * n)
 
-        loss.labels(player="oop").set(self.oop_loss if self.oop_loss is not None else 0)
-        loss.labels(player="ip").set(self.ip_loss if self.ip_loss is not None else 0)
+        self.metrics.set(loss, self.oop_loss if self.oop_loss is not None else 0, player="oop")
+        self.metrics.set(loss, self.ip_loss if self.ip_loss is not None else 0, player="ip")
 
-        episode_reward.labels(player="oop").set(oop_reward)
-        episode_reward.labels(player="ip").set(ip_reward)
+        self.metrics.set(episode_reward, oop_reward, player="oop")
+        self.metrics.set(episode_reward, ip_reward, player="ip")
 
-        player_chips.labels(player="oop").set(self.oop_player.chips)
-        player_chips.labels(player="ip").set(self.ip_player.chips)
-        pot_size.set(self.pot)
-        community_cards.set(len(self.community_cards))
-        episodes_completed.inc()
+        self.metrics.set(player_chips, self.oop_player.chips, player="oop")
+        self.metrics.set(player_chips, self.ip_player.chips, player="ip")
+        self.metrics.set(pot_size, self.pot)
+        self.metrics.set(community_cards, len(self.community_cards))
+        self.metrics.inc(episodes_completed)
+        self.metrics.end_hand()
 
         return game_state, oop_reward, ip_reward
 
     def get_player_hand(self):
         if isinstance(self.oop_player, HumanPlayer):
-            return self.oop_player.hand
+            return cards_to_str(self.oop_player.hand)
         elif isinstance(self.ip_player, HumanPlayer):
-            return self.ip_player.hand
+            return cards_to_str(self.ip_player.hand)
         else:
             return None
 
+    @timed("showdown")
     def determine_showdown_winner(self):
-        logging.info("Determining Showdown Winner")
+        hand_logger.info("Determining Showdown Winner")
         #print(f"\nIP Tables: {self.ip_player.hand}")
         #print(f"\nOOP Tables: {self.oop_player.hand}\n")
         updated_state = self.get_game_state()
-        # fmt: off
-        ip_rank = evaluate_omaha_cards(
-            self.community_cards[0], self.community_cards[1], self.community_cards[2], self.community_cards[3], self.community_cards[4],
-            self.ip_player.hand[0], self.ip_player.hand[1], self.ip_player.hand[2], self.ip_player.hand[3],
-        )
-        oop_rank = evaluate_omaha_cards(
-            self.community_cards[0], self.community_cards[1], self.community_cards[2], self.community_cards[3], self.community_cards[4],
-            self.oop_player.hand[0], self.oop_player.hand[1], self.oop_player.hand[2], self.oop_player.hand[3],
-        )
-        # fmt: on
+        # Card ids are phevaluator ids, so they are passed straight through
+        board = self.community_cards.tolist()
+        ip_rank = evaluate_omaha_cards(*board, *self.ip_player.hand.tolist())
+        oop_rank = evaluate_omaha_cards(*board, *self.oop_player.hand.tolist())
 
         if ip_rank < oop_rank:
             # print(f"{updated_state['ip_player']['name']} wins {self.pot}")
@@ -332,30 +379,32 @@ class PokerGame:
         return oop_reward, ip_reward
 
     def deal_flop(self):
-        logging.info("Dealing flop")
+        hand_logger.info("Dealing flop")
         self.deal_community_cards(3)
         return self.postflop_betting(street="flop")
 
     def deal_turn(self):
-        logging.info("Dealing Turn")
+        hand_logger.info("Dealing Turn")
         self.deal_community_cards(1)
         return self.postflop_betting(street="turn")
 
     def deal_river(self):
-        logging.info("Dealing River")
+        hand_logger.info("Dealing River")
         self.deal_community_cards(1)
         return self.postflop_betting(street="river")
 
     def deal_community_cards(self, num_cards):
-        self.community_cards.extend([self.deck.cards.pop() for _ in range(num_cards)])
+        self.community_cards = np.concatenate((self.community_cards, self.deck.deal(num_cards)))
+        self.state_buffer[7:17] = encode_cards(self.community_cards, 5)
 
     def reset_hands(self):
-        logging.info("Resetting Hands")
+        hand_logger.info("Resetting Hands")
         self.deck = Deck()
-        self.community_cards = []
+        self.community_cards = np.empty(0, dtype=np.uint8)
         self.pot = 0
-        self.oop_player.hand = []
-        self.ip_player.hand = []
+        self.oop_player.hand = np.empty(0, dtype=np.uint8)
+        self.ip_player.hand = np.empty(0, dtype=np.uint8)
+        self.update_card_encoding()
         self.current_bet = 2
         self.num_actions = 0
         self.last_action = None
@@ -390,7 +439,7 @@ class PokerGame:
     def get_public_game_state(self):
         return {
             "pot": self.pot,
-            "community_cards": self.community_cards,
+            "community_cards": cards_to_str(self.community_cards),
             "current_player": self.current_player.name,
             "current_bet": self.current_bet,
             "last_action": self.last_action,
@@ -409,45 +458,53 @@ class PokerGame:
             },
         }
 
+    def format_game_state(self, state):
+        # Card strings are only produced here, for logs and display
+        formatted = dict(state)
+        formatted["community_cards"] = cards_to_str(state["community_cards"])
+        for player in ("oop_player", "ip_player"):
+            formatted[player] = dict(state[player], hand=cards_to_str(state[player]["hand"]))
+        return formatted
+
     def get_private_game_state(self):
         return {
             "oop_player": {
-                "hand": self.oop_player.hand,
+                "hand": cards_to_str(self.oop_player.hand),
             },
             "ip_player": {
-                "hand": self.ip_player.hand,
+                "hand": cards_to_str(self.ip_player.hand),
             },
         }
 
-    def get_player_action(self, valid_actions, max_bet, min_bet):
-        logging.info(f"Getting {self.current_player.name}'s Action: ({valid_actions})")
+    def get_player_action(self, valid_actions, max_bet, min_bet, state=None):
+        hand_logger.info("Getting %s's Action: (%s)", self.current_player.name, valid_actions)
         if isinstance(self.current_player, HumanPlayer):
             return self.current_player.get_action(valid_actions, max_bet)
         else:
-            state = self.get_state_representation(current_player=self.current_player)
+            if state is None:
+                state = self.encode_state(self.current_player)
             if self.current_player == self.oop_player:
-                action, bet_size = self.oop_agent.act(state, valid_actions, max_bet, min_bet)
+                action, bet_size, diagnostics = self.oop_agent.act(state, valid_actions, max_bet, min_bet)
                 player = "oop"
-                agent = self.oop_agent
             else:
-                action, bet_size = self.ip_agent.act(state, valid_actions, max_bet, min_bet)
+                action, bet_size, diagnostics = self.ip_agent.act(state, valid_actions, max_bet, min_bet)
                 player = "ip"
-                agent = self.ip_agent
 
             action_map = {0: "fold", 1: "check", 2: "call", 3: "bet"}
             chosen_action = action_map[action]
 
-            q_value.labels(player).set(np.max(agent.model(state.to(agent.device)).cpu().data.numpy()))
-            epsilon.labels(player).set(agent.epsilon)
+            # The agent records its Q-value and epsilon gauges from the forward pass it already ran
+            hand_logger.info("Q-values: %s (explored: %s)", diagnostics["q_values"], diagnostics["explored"])
             # print(f"Player: {player}\nAction: {chosen_action}")
-            action_taken.labels(player_action=f"{player}_{chosen_action}").inc()
+            self.metrics.inc(action_taken, player_action=f"{player}_{chosen_action}")
 
         if chosen_action == "bet":
-            logging.info(f"Bet size: {bet_size}")
-            logging.info(f"Bet Max: {max_bet}")
+            hand_logger.info("Bet size: %s", bet_size)
+            hand_logger.info("Bet Max: %s", max_bet)
             return chosen_action, min(bet_size, max_bet)
         return chosen_action
 
+    @timed("preflop_betting")
     def preflop_betting(self):
         # self.num_active_players = len(
         # [p for p in [self.oop_player, self.ip_player] if p.chips > 0]
@@ -458,14 +515,11 @@ class PokerGame:
         # self.current_player = self.ip_player
         # self.hand_over = False
 
-        logging.info("Starting Preflop Betting")
+        hand_logger.info("Starting Preflop Betting")
         oop_experiences = []
         ip_experiences = []
 
         while True:
-            game_state = self.get_game_state()
-            state_representation = self.get_state_representation()
-
             if self.hand_over or self.num_active_players == 1:
                 self.current_player.chips += self.pot
                 game_state = self.get_game_state()
@@ -483,7 +537,8 @@ class PokerGame:
             #print(f"All players acted: {all_players_acted}")
             #print(f"All bets settled: {all_bets_settled}")
 
-            logging.info(f"Current State: {game_state}")
+            if hand_logger.isEnabledFor(logging.INFO):
+                hand_logger.info("Current State: %s", self.format_game_state(self.get_game_state()))
             # print(f"\nCommunity Cards: {game_state['community_cards']}")
             # print(f"Pot: {game_state['pot']}")
             # print(f"Your Hand: {self.get_player_hand()}")
@@ -493,7 +548,8 @@ class PokerGame:
             # Instead of prompting for input, we'll return the game state
             valid_actions, max_bet, min_bet = self.get_valid_preflop_actions()
             # print(f"Finished getting valid actions: {valid_actions}")
-            action = self.get_player_action(valid_actions, max_bet, min_bet)
+            state_representation = self.get_state_representation(current_player=self.current_player)
+            action = self.get_player_action(valid_actions, max_bet, min_bet, state_representation)
 
             # print(f"RETURNED TUPLE: {action}")
             if isinstance(action, tuple):
@@ -514,18 +570,20 @@ class PokerGame:
                 ip_experiences.append(
                     (state_representation, action_int, valid_actions, bet_size, max_bet)
                 )
+            if self.recorder is not None:
+                seat = 0 if self.current_player == self.oop_player else 1
+                self.hand_actions.append((pack_action(seat, len(self.community_cards), action_int), bet_size or 0))
 
             # print("About to process action")
 
             self.process_preflop_action(action, bet_size)
-        return game_state, (oop_experiences, ip_experiences)
 
     def action_to_int(self, action):
         action_map = {"fold": 0, "check": 1, "call": 2, "bet": 3}
         return action_map[action]
 
     def process_preflop_action(self, action, bet_size=None):
-        logging.info(f"Processing preflop action: {action}")
+        hand_logger.info("Processing preflop action: %s", action)
         # This method will be called from the server to process each action
         # print(f"Processing action: {action}")
 
@@ -562,9 +620,8 @@ class PokerGame:
 
     def calculate_max_preflop_bet_size(self):
         max_bet = 0
-        state = self.get_game_state()
-        pot = state["pot"]
-        current_bet = state["current_bet"]
+        pot = self.pot
+        current_bet = self.current_bet
         player_chips = self.current_player.chips
         player_committed = (
             self.oop_committed
@@ -582,16 +639,15 @@ class PokerGame:
             max_bet = min(max_raise, player_chips)
 
         max_bet = (max_bet // MINIMUM_BET_INCREMENT) * MINIMUM_BET_INCREMENT
-        max_bet = min(self.current_player.chips, 3 * state["current_bet"])
+        max_bet = min(self.current_player.chips, 3 * self.current_bet)
         return max_bet
 
     def calculate_max_postflop_bet_size(self, initial_pot):
         max_bet = 0
-        state = self.get_game_state()
-        pot = state["pot"]
-        print(f"POT: {pot}")
-        current_bet = state["current_bet"]
-        print(f"CURRENT_BET: {current_bet}")
+        pot = self.pot
+        hand_logger.debug("POT: %s", pot)
+        current_bet = self.current_bet
+        hand_logger.debug("CURRENT_BET: %s", current_bet)
         player_chips = self.current_player.chips
         player_committed = (
             self.oop_committed
@@ -619,7 +675,7 @@ class PokerGame:
         return min(max_bet, player_chips)
 
     def handle_preflop_bet(self, bet_size=None):
-        logging.info(f"Handling preflop bet for {self.current_player.name}")
+        hand_logger.info("Handling preflop bet for %s", self.current_player.name)
         is_allin, bet_amount = self.calculate_preflop_bet_size()
         # logging.info(f"\n\nis_allin: {is_allin}  bet_amount: {bet_amount}\n\n")
         if not is_allin:
@@ -628,13 +684,13 @@ class PokerGame:
                 self.pot += bet_amount - self.ip_committed
                 self.ip_committed = bet_amount
                 self.current_bet = bet_amount
-                update_bet_size("ip", bet_amount, self.pot)
+                update_bet_size("ip", bet_amount, self.pot, self.metrics)
             else:
                 self.current_player.chips -= bet_amount - self.oop_committed
                 self.pot += bet_amount - self.oop_committed
                 self.oop_committed = bet_amount
                 self.current_bet = bet_amount
-                update_bet_size("ip", bet_amount, self.pot)
+                update_bet_size("ip", bet_amount, self.pot, self.metrics)
         else:
             self.is_allin = True
             if self.current_player.name == self.ip_player.name:
@@ -647,12 +703,13 @@ class PokerGame:
                 "ip" if self.current_player.name == self.ip_player.name else "oop",
                 self.current_player.chips,
                 self.pot,
+                self.metrics,
             )
         self.num_actions += 1
         self.last_action = "bet"
 
     def handle_preflop_call(self):
-        logging.info(f"Handling preflop call for {self.current_player.name}")
+        hand_logger.info("Handling preflop call for %s", self.current_player.name)
         if self.current_player == self.ip_player and self.num_actions == 0:
             self.current_player.chips -= 1
             self.ip_committed += 1
@@ -670,28 +727,27 @@ class PokerGame:
         self.last_action = "call"
 
     def handle_preflop_check(self):
-        logging.info(f"Handling preflop check from {self.current_player.name}")
+        hand_logger.info("Handling preflop check from %s", self.current_player.name)
         if self.current_player == self.oop_player and self.last_action == "call":
             self.num_actions += 1
             self.last_action = "check"
 
     def calculate_preflop_bet_size(self, bet_size=None):
-        state = self.get_game_state()
         all_in = False
         is_raise = True
         if is_raise:
             # If it's a raise, the bet size is 3 times the last raise plus the current pot size
-            bet_size = 3 * state["current_bet"]
+            bet_size = 3 * self.current_bet
         if self.current_player.chips < bet_size:
             bet_size = self.current_player.chips
             all_in = True
 
         return all_in, bet_size
 
+    @timed("postflop_betting")
     def postflop_betting(self, street):
-        logging.info("Starting Postflop Betting")
-        state = self.get_game_state()
-        initial_pot = state["pot"]
+        hand_logger.info("Starting Postflop Betting")
+        initial_pot = self.pot
         self.current_bet = 0
         self.num_actions = 0
         self.current_player = self.oop_player
@@ -702,10 +758,8 @@ class PokerGame:
         ip_committed = 0
 
         while True:
-            state = self.get_game_state()
-            state_representation = self.get_state_representation()
-
-            logging.info(f"Current State: {state}")
+            if hand_logger.isEnabledFor(logging.INFO):
+                hand_logger.info("Current State: %s", self.format_game_state(self.get_game_state()))
             # print(f"\nCommunity Cards: {state['community_cards']}")
             # print(f"Your Hand: {self.get_player_hand()}")
             # print( f"IP Chips: {state[self.ip_player.name.lower() + '_player']['chips']}")
@@ -729,12 +783,13 @@ class PokerGame:
             max_bet = self.calculate_max_postflop_bet_size(initial_pot)
             # print(f"Finished getting valid actions: {valid_actions}")
             #print(f"MAX BET: {max_bet}")
-            action = self.get_player_action(valid_actions, max_bet, min_bet)
+            state_representation = self.get_state_representation(current_player=self.current_player)
+            action = self.get_player_action(valid_actions, max_bet, min_bet, state_representation)
 
             if isinstance(action, tuple):
                 # print("CORRECT INSTANCE TUPLE")
                 action, bet_size = action
-                logging.info(f"Received bet size: {bet_size}")
+                hand_logger.info("Received bet size: %s", bet_size)
             else:
                 bet_size = None
             # print(f"Finished getting action: {action}")
@@ -748,6 +803,9 @@ class PokerGame:
                 ip_experiences.append(
                     (state_representation, action_int, valid_actions, bet_size, max_bet)
                 )
+            if self.recorder is not None:
+                seat = 0 if self.current_player == self.oop_player else 1
+                self.hand_actions.append((pack_action(seat, len(self.community_cards), action_int), bet_size or 0))
 
             # print( f"Before process_postflop_action, current player: {self.current_player.name}")
             self.process_postflop_action(action, bet_size)
@@ -757,10 +815,9 @@ class PokerGame:
                 game_state = self.get_game_state()
                 game_state["message"] = f"{street.capitalize()} betting complete"
                 return game_state, (oop_experiences, ip_experiences)
-        return game_state, (oop_experiences, ip_experiences)
 
     def process_postflop_action(self, action, bet_size=None):
-        logging.info(f"Processing Postflop Action: {action}")
+        hand_logger.info("Processing Postflop Action: %s", action)
         # print(f"Bet Size: {bet_size}")
 
         if action == "check":
@@ -789,27 +846,25 @@ class PokerGame:
         return valid_actions, min_bet
 
     def handle_postflop_bet(self, bet_size=MINIMUM_BET_INCREMENT):
-        logging.info(
-            f"Handling postflop bet of {bet_size} for {self.current_player.name}"
-        )
+        hand_logger.info("Handling postflop bet of %s for %s", bet_size, self.current_player.name)
 
         if self.current_player.name == self.ip_player.name:
             self.current_player.chips -= bet_size
             self.pot += bet_size
             self.ip_committed += bet_size
             self.current_bet = bet_size
-            bet_size_metric.labels(player="ip", street="postflop").observe(bet_size)
-            update_bet_size("ip", bet_size, self.pot)
+            self.metrics.observe(bet_size_metric, bet_size, player="ip", street="postflop")
+            update_bet_size("ip", bet_size, self.pot, self.metrics)
         else:
             self.current_player.chips -= bet_size
             self.pot += bet_size
             self.oop_committed += bet_size
             self.current_bet = bet_size
-            bet_size_metric.labels(player="oop", street="postflop").observe(bet_size)
-            update_bet_size("oop", bet_size, self.pot)
+            self.metrics.observe(bet_size_metric, bet_size, player="oop", street="postflop")
+            update_bet_size("oop", bet_size, self.pot, self.metrics)
 
     def handle_postflop_call(self):
-        logging.info("Handling postflop CALL for {self.current_player.name}")
+        hand_logger.info("Handling postflop CALL for %s", self.current_player.name)
         if self.current_player.name == self.oop_player.name:
             call_amount = self.oop_committed - self.ip_committed
         else:
@@ -843,12 +898,12 @@ class PokerGame:
         self.last_action = "call"
 
     def handle_postflop_check(self):
-        logging.info(f"Handling postflop CHECK for {self.current_player.name}")
+        hand_logger.info("Handling postflop CHECK for %s", self.current_player.name)
         self.num_actions += 1
         self.last_action = "check"
 
     def handle_fold(self):
-        logging.info(f"Handling postflop FOLD for {self.current_player.name}")
+        hand_logger.info("Handling postflop FOLD for %s", self.current_player.name)
         self.num_active_players -= 1
         self.hand_over = True
 
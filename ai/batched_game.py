@@ -0,0 +1,356 @@
+import logging
+import numpy as np
+import torch
+from agent import DQNAgent
+from ai_trainer import CONST_100bb, MINIMUM_BET_INCREMENT
+from cards import NUM_CARDS, CARD_ENCODING
+from hand_evaluator import evaluate_omaha_batch
+
+# Seats
+OOP = 0
+IP = 1
+
+# Streets
+PREFLOP = 0
+FLOP = 1
+TURN = 2
+RIVER = 3
+
+# Actions, same indices as PokerGame.action_to_int
+FOLD = 0
+CHECK = 1
+CALL = 2
+BET = 3
+NO_ACTION = -1
+
+# Number of board cards visible on each street
+BOARD_SIZE_BY_STREET = np.array([0, 3, 4, 5], dtype=np.int64)
+
+
+class BatchedPokerGame:
+    """
+    Lockstep self-play over N heads-up PLO hands.
+
+    All per-hand state (cards, pot, chips, committed amounts, street, current
+    player) lives in NumPy arrays indexed by hand. Each call to `step` advances
+    every unfinished hand by exactly one decision, running each agent's network
+    once on the rows where that agent is to act.
+
+    Betting follows PokerGame: blinds 1/2 from 200 chip stacks, preflop raises
+    to 3x the current bet, postflop bets are sized by the agent's bet head
+    between the minimum bet and the pot-limit maximum.
+
+    Cards are the uint8 card ids from cards.py.
+    """
+
+    def __init__(self, num_hands, oop_agent=None, ip_agent=None, seed=None):
+        """
+        Initialize the batched game.
+
+        Args:
+            num_hands (int): Number of hands played in lockstep.
+            oop_agent (DQNAgent, optional): Agent for the out-of-position seat.
+            ip_agent (DQNAgent, optional): Agent for the in-position seat.
+            seed (int, optional): Seed for dealing, for reproducible runs.
+        """
+        self.num_hands = num_hands
+        self.state_size = 7 + (5 * 2) + 2 * 4 * 2
+        self.action_size = 4
+        self.rng = np.random.default_rng(seed)
+
+        self.oop_agent = oop_agent or DQNAgent(self.state_size, self.action_size)
+        self.ip_agent = ip_agent or DQNAgent(self.state_size, self.action_size)
+        self.oop_agent.name = "OOP"
+        self.ip_agent.name = "IP"
+
+        n = num_hands
+        self.hands = np.zeros((n, 2, 4), dtype=np.uint8)
+        self.board = np.zeros((n, 5), dtype=np.uint8)
+        self.pot = np.zeros(n, dtype=np.float32)
+        self.chips = np.zeros((n, 2), dtype=np.float32)
+        self.committed = np.zeros((n, 2), dtype=np.float32)
+        self.current_bet = np.zeros(n, dtype=np.float32)
+        self.initial_pot = np.zeros(n, dtype=np.float32)
+        self.num_actions = np.zeros(n, dtype=np.int8)
+        self.last_action = np.full(n, NO_ACTION, dtype=np.int8)
+        self.street = np.zeros(n, dtype=np.int8)
+        self.current_player = np.zeros(n, dtype=np.int8)
+        self.active = np.zeros(n, dtype=bool)
+
+        self.experiences = []
+
+        logging.info(f"BatchedPokerGame initialized with {num_hands} hands")
+
+    def reset(self):
+        """Deal N new hands and post the blinds."""
+        n = self.num_hands
+        # An independent random permutation of the deck per hand; the first
+        # 13 cards are both hands and the full board.
+        deals = np.argsort(self.rng.random((n, NUM_CARDS)), axis=1)[:, :13].astype(np.uint8)
+        self.hands[:] = deals[:, :8].reshape(n, 2, 4)
+        self.board[:] = deals[:, 8:]
+
+        self.pot[:] = 3
+        self.chips[:, OOP] = CONST_100bb - 2
+        self.chips[:, IP] = CONST_100bb - 1
+        self.committed[:, OOP] = 2
+        self.committed[:, IP] = 1
+        self.current_bet[:] = 2
+        self.initial_pot[:] = 3
+        self.num_actions[:] = 0
+        self.last_action[:] = NO_ACTION
+        self.street[:] = PREFLOP
+        self.current_player[:] = IP
+        self.active[:] = True
+        self.experiences = []
+
+    def get_state_representation(self, rows, seat):
+        """
+        Build the 33-float state encoding for a set of hands.
+
+        Args:
+            rows (np.ndarray): Indices of the hands to encode.
+            seat (np.ndarray): Seat (OOP or IP) whose hole cards are included, per row.
+
+        Returns:
+            torch.Tensor: (len(rows), state_size) float tensor.
+        """
+        k = len(rows)
+        states = np.zeros((k, self.state_size), dtype=np.float32)
+        street = self.street[rows]
+        board_size = BOARD_SIZE_BY_STREET[np.minimum(street, RIVER)]
+
+        states[:, 0] = self.pot[rows]
+        states[:, 1] = board_size
+        states[:, 2] = self.current_bet[rows]
+        states[:, 3] = self.chips[rows, OOP]
+        states[:, 4] = self.chips[rows, IP]
+        states[:, 5] = self.committed[rows, OOP]
+        states[:, 6] = self.committed[rows, IP]
+
+        board = CARD_ENCODING[self.board[rows]].reshape(k, -1)
+        hidden = np.arange(10) >= 2 * board_size[:, None]
+        board[hidden] = 0
+        states[:, 7:17] = board
+        states[:, 17:25] = CARD_ENCODING[self.hands[rows, seat]].reshape(k, -1)
+        # The remaining 8 slots stay zero, matching the opponent padding in PokerGame
+
+        return torch.from_numpy(states)
+
+    def get_valid_actions(self, rows):
+        """
+        Compute valid action masks and bet bounds for the player to act.
+
+        Args:
+            rows (np.ndarray): Indices of the hands to evaluate.
+
+        Returns:
+            tuple: (valid_mask (k, 4) bool, max_bet (k,), min_bet (k,)).
+        """
+        seat = self.current_player[rows]
+        chips = self.chips[rows, seat]
+        current_bet = self.current_bet[rows]
+        preflop = self.street[rows] == PREFLOP
+        facing_allin = (self.chips[rows] <= 0).any(axis=1)
+        facing_bet = self.committed[rows, 1 - seat] > self.committed[rows, seat]
+
+        valid = np.zeros((len(rows), self.action_size), dtype=bool)
+        # Preflop: the big blind may check or raise after a limp, otherwise call/raise/fold
+        limped_to = preflop & (seat == OOP) & (self.last_action[rows] == CALL)
+        # Postflop: check/bet when unopened, call/raise/fold facing a bet
+        unopened = ~preflop & ~facing_bet
+        can_check = limped_to | unopened
+        valid[:, CHECK] = can_check
+        valid[:, BET] = True
+        valid[:, CALL] = ~can_check
+        valid[:, FOLD] = ~can_check
+        valid[facing_allin] = [True, False, True, False]
+
+        min_bet = np.maximum(MINIMUM_BET_INCREMENT, np.minimum(current_bet * 2, chips))
+        pot_limit = np.where(
+            current_bet == 0, self.initial_pot[rows], 3 * current_bet + self.initial_pot[rows]
+        )
+        max_bet = np.where(preflop, 3 * current_bet, pot_limit)
+        max_bet = np.minimum(max_bet, chips)
+        return valid, max_bet.astype(np.float32), min_bet.astype(np.float32)
+
+    def step(self):
+        """
+        Advance every active hand by one decision.
+
+        Returns:
+            int: Number of hands still active after the step.
+        """
+        rows = np.flatnonzero(self.active)
+        if rows.size == 0:
+            return 0
+
+        seat = self.current_player[rows]
+        valid, max_bet, min_bet = self.get_valid_actions(rows)
+        states = self.get_state_representation(rows, seat)
+
+        actions = np.empty(rows.size, dtype=np.int64)
+        bet_sizes = np.zeros(rows.size, dtype=np.float32)
+        for player, agent in ((OOP, self.oop_agent), (IP, self.ip_agent)):
+            sel = np.flatnonzero(seat == player)
+            if sel.size == 0:
+                continue
+            agent_actions, agent_bets = agent.act_batch(
+                states[torch.from_numpy(sel)],
+                torch.from_numpy(valid[sel]),
+                torch.from_numpy(max_bet[sel]),
+                torch.from_numpy(min_bet[sel]),
+            )
+            actions[sel] = agent_actions
+            bet_sizes[sel] = agent_bets
+
+        self.experiences.append((rows, seat, states, actions))
+        self.apply_actions(rows, seat, actions, np.minimum(bet_sizes, max_bet))
+        self.advance_streets(rows)
+
+        return int(self.active.sum())
+
+    def apply_actions(self, rows, seat, actions, bet_sizes):
+        """
+        Apply one action per hand to the chip, pot and betting state.
+
+        Args:
+            rows (np.ndarray): Hands that acted.
+            seat (np.ndarray): Seat that acted in each hand.
+            actions (np.ndarray): Chosen action per hand.
+            bet_sizes (np.ndarray): Bet size per hand, used for postflop bets.
+        """
+        opp = 1 - seat
+        preflop = self.street[rows] == PREFLOP
+        chips = self.chips[rows, seat]
+        to_call = self.committed[rows, opp] - self.committed[rows, seat]
+
+        is_bet = actions == BET
+        is_call = actions == CALL
+        is_fold = actions == FOLD
+
+        # Preflop raises go to 3x the current bet, or all-in if short
+        raise_to = 3 * self.current_bet[rows]
+        preflop_amount = np.where(
+            chips < raise_to, chips, raise_to - self.committed[rows, seat]
+        )
+        bet_amount = np.where(preflop, preflop_amount, bet_sizes)
+        new_current_bet = np.where(preflop, np.where(chips < raise_to, self.current_bet[rows], raise_to), bet_sizes)
+
+        call_amount = np.minimum(to_call, chips)
+
+        amount = np.where(is_bet, bet_amount, np.where(is_call, call_amount, 0)).astype(np.float32)
+        self.chips[rows, seat] -= amount
+        self.committed[rows, seat] += amount
+        self.pot[rows] += amount
+        self.current_bet[rows] = np.where(is_bet, new_current_bet, self.current_bet[rows])
+
+        # A short all-in call leaves part of the bet uncalled; return it to the bettor
+        uncalled = np.where(is_call, to_call - call_amount, 0).astype(np.float32)
+        self.chips[rows, opp] += uncalled
+        self.committed[rows, opp] -= uncalled
+        self.pot[rows] -= uncalled
+
+        self.num_actions[rows] += 1
+        self.last_action[rows] = actions
+
+        # Folds end the hand immediately; the opponent takes the pot
+        folded = rows[is_fold]
+        self.chips[folded, opp[is_fold]] += self.pot[folded]
+        self.pot[folded] = 0
+        self.active[folded] = False
+
+        self.current_player[rows] = opp
+
+    def advance_streets(self, rows):
+        """
+        Close finished betting rounds, moving to the next street or showdown.
+
+        Args:
+            rows (np.ndarray): Hands that acted this step.
+        """
+        rows = rows[self.active[rows]]
+        settled = (self.num_actions[rows] >= 2) & (
+            self.committed[rows, OOP] == self.committed[rows, IP]
+        )
+        rows = rows[settled]
+        if rows.size == 0:
+            return
+
+        allin = (self.chips[rows] <= 0).any(axis=1)
+        showdown = rows[allin | (self.street[rows] == RIVER)]
+        self.determine_showdown_winner(showdown)
+
+        next_street = rows[~(allin | (self.street[rows] == RIVER))]
+        self.street[next_street] += 1
+        self.current_bet[next_street] = 0
+        self.num_actions[next_street] = 0
+        self.last_action[next_street] = NO_ACTION
+        self.current_player[next_street] = OOP
+        self.initial_pot[next_street] = self.pot[next_street]
+
+    def determine_showdown_winner(self, rows):
+        """
+        Award the pot for hands that reached showdown.
+
+        Args:
+            rows (np.ndarray): Hands going to showdown with the full board.
+        """
+        if rows.size == 0:
+            return
+        board = self.board[rows]
+        oop_rank = evaluate_omaha_batch(board, self.hands[rows, OOP])
+        ip_rank = evaluate_omaha_batch(board, self.hands[rows, IP])
+
+        # Lower rank is the stronger hand; ties split the pot
+        oop_share = np.where(
+            oop_rank < ip_rank, 1.0, np.where(oop_rank > ip_rank, 0.0, 0.5)
+        ).astype(np.float32)
+        self.chips[rows, OOP] += self.pot[rows] * oop_share
+        self.chips[rows, IP] += self.pot[rows] * (1 - oop_share)
+        self.pot[rows] = 0
+        self.street[rows] = RIVER
+        self.active[rows] = False
+
+    def calculate_rewards(self):
+        """
+        Zero-sum rewards per hand, computed as in PokerGame.calculate_rewards.
+
+        Returns:
+            tuple: (oop_rewards, ip_rewards) arrays of shape (N,).
+        """
+        oop_reward = self.chips[:, OOP] - CONST_100bb
+        ip_reward = self.chips[:, IP] - CONST_100bb
+        total_reward = oop_reward + ip_reward
+        return oop_reward - total_reward / 2, ip_reward - total_reward / 2
+
+    def play_hands(self):
+        """
+        Play N hands to completion and store every decision in the agents' memories.
+
+        Returns:
+            tuple: (oop_rewards, ip_rewards) arrays of shape (N,).
+        """
+        self.reset()
+        while self.step():
+            pass
+
+        rewards = self.calculate_rewards()
+        all_rows = np.arange(self.num_hands)
+        for player, agent in ((OOP, self.oop_agent), (IP, self.ip_agent)):
+            final_states = self.get_state_representation(all_rows, np.full(self.num_hands, player))
+            for rows, seat, states, actions in self.experiences:
+                sel = np.flatnonzero(seat == player)
+                if sel.size == 0:
+                    continue
+                hands = rows[sel]
+                agent.remember_batch(
+                    states[torch.from_numpy(sel)],
+                    actions[sel],
+                    rewards[player][hands],
+                    final_states[torch.from_numpy(hands)],
+                    np.ones(sel.size, dtype=np.float32),
+                )
+
+        logging.info(f"Played {self.num_hands} batched hands")
+        return rewards
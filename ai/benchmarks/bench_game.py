@@ -0,0 +1,108 @@
+import numpy as np
+import torch
+from common import latency, main, optional_import, result, throughput, use_sources
+
+# Benchmarks of the full game in ai/.
+#
+#   python3 ./benchmarks/bench_game.py
+
+use_sources()
+
+from agent import DQNAgent  # noqa: E402
+from ai_trainer import PokerGame  # noqa: E402
+from phevaluator import evaluate_omaha_cards  # noqa: E402
+
+hand_evaluator = optional_import("hand_evaluator")
+
+STATE_SIZE = 7 + (5 * 2) + 2 * 4 * 2
+ACTION_SIZE = 4
+PLAY_EPSILON = 0.1  # Mostly network decisions, enough exploration that two agents never stall
+ACT_CALLS = 5000
+ENCODE_CALLS = 20000
+TAIL_THRESHOLD = 0.5  # p99 latencies vary far more between runs than medians
+REPLAY_BATCH = 128
+SHOWDOWN_HANDS = 100_000
+SCALAR_SHOWDOWN_HANDS = 20_000
+
+
+def make_game():
+    game = PokerGame()
+    for agent in (game.oop_agent, game.ip_agent):
+        agent.epsilon = PLAY_EPSILON
+    return game
+
+
+def bench_play_hand():
+    game = make_game()
+    return result(throughput(game.play_hand, warmup=50), "hands/s", True)
+
+
+def bench_act():
+    agent = DQNAgent(STATE_SIZE, ACTION_SIZE)
+    agent.epsilon = 0.0
+    rng = np.random.default_rng(0)
+    states = [torch.from_numpy(rng.random(STATE_SIZE, dtype=np.float32) * 100) for _ in range(ACT_CALLS)]
+    valid_actions = (["check", "bet"], ["call", "bet", "fold"])
+    p50, p99 = latency(lambda i: agent.act(states[i % ACT_CALLS], valid_actions[i % 2], 100, 4), ACT_CALLS)
+    return result(p50, "us", False), result(p99, "us", False, TAIL_THRESHOLD)
+
+
+def bench_replay():
+    # Memory filled from real hands, so sampling and the loss see real transitions
+    game = make_game()
+    agent = game.oop_agent
+    capacity = getattr(agent.memory, "capacity", None) or agent.memory.maxlen
+    while len(agent.memory) < capacity:
+        game.play_hand()
+    p50, _ = latency(lambda i: agent.replay(REPLAY_BATCH), 200, warmup=20)
+    return result(p50 / 1000, "ms", False)
+
+
+def random_deals(n, rng):
+    # 9 distinct cards per deal, board first
+    cards = np.argsort(rng.random((n, 52)), axis=1)[:, :9].astype(np.uint8)
+    return cards[:, :5], cards[:, 5:]
+
+
+def bench_showdown():
+    rng = np.random.default_rng(0)
+    boards, holes = random_deals(SHOWDOWN_HANDS, rng)
+    batch = None
+    if hand_evaluator is not None:
+        batch = result(throughput(lambda: hand_evaluator.evaluate_omaha_batch(boards, holes), SHOWDOWN_HANDS), "hands/s", True)
+
+    deals = [(board.tolist(), hole.tolist()) for board, hole in zip(*random_deals(SCALAR_SHOWDOWN_HANDS, rng))]
+
+    def evaluate_scalar():
+        for board, hole in deals:
+            evaluate_omaha_cards(*board, *hole)
+
+    scalar = throughput(evaluate_scalar, SCALAR_SHOWDOWN_HANDS)
+    return batch, result(scalar, "hands/s", True)
+
+
+def bench_state_encoding():
+    game = make_game()
+    game.start_new_hand()
+    game.deal_community_cards(3)
+    p50, _ = latency(lambda i: game.get_state_representation(), ENCODE_CALLS, warmup=1000)
+    return result(p50, "us", False)
+
+
+def run():
+    act_p50, act_p99 = bench_act()
+    batch_showdown, scalar_showdown = bench_showdown()
+    results = {
+        "play_hand": bench_play_hand(),
+        "act_p50": act_p50,
+        "act_p99": act_p99,
+        "replay_step": bench_replay(),
+        "showdown_batch": batch_showdown,
+        "showdown_scalar": scalar_showdown,
+        "state_encoding": bench_state_encoding(),
+    }
+    return {name: metric for name, metric in results.items() if metric is not None}
+
+
+if __name__ == "__main__":
+    main(run)
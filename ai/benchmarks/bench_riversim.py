@@ -0,0 +1,97 @@
+import contextlib
+import io
+import numpy as np
+import torch
+from common import latency, main, optional_import, result, throughput, use_sources
+
+# Benchmarks of the river simulator in ai/riversim/. Showdown evaluation is
+# the same phevaluator call as in the full game and is measured there.
+#
+#   python3 ./benchmarks/bench_riversim.py
+
+use_sources("riversim")
+
+from agent import DQNAgent  # noqa: E402
+from ai_trainer import PokerGame  # noqa: E402
+
+scenario_bank = optional_import("scenario_bank")
+tensor_env = optional_import("tensor_env")
+
+STATE_SIZE = 7 + (5 * 2) + 2 * 4 * 2
+ACTION_SIZE = 4
+PLAY_EPSILON = 0.1  # Mostly network decisions, enough exploration that two agents never stall
+ACT_CALLS = 5000
+ENCODE_CALLS = 20000
+TAIL_THRESHOLD = 0.5  # p99 latencies vary far more between runs than medians
+REPLAY_BATCH = 128
+TENSOR_GAMES = 20_000
+
+
+def make_game():
+    game = PokerGame()
+    for agent in (game.oop_agent, game.ip_agent):
+        agent.epsilon = PLAY_EPSILON
+    return game
+
+
+def bench_play_hand():
+    game = make_game()
+    return result(throughput(game.play_hand, warmup=50), "hands/s", True)
+
+
+def bench_act():
+    agent = DQNAgent(STATE_SIZE, ACTION_SIZE)
+    agent.epsilon = 0.0
+    rng = np.random.default_rng(0)
+    states = [torch.from_numpy(rng.random(STATE_SIZE, dtype=np.float32) * 100) for _ in range(ACT_CALLS)]
+    valid_actions = (["check", "bet"], ["call", "bet", "fold"])
+    p50, p99 = latency(lambda i: agent.act(states[i % ACT_CALLS], valid_actions[i % 2], 100, 4), ACT_CALLS)
+    return result(p50, "us", False), result(p99, "us", False, TAIL_THRESHOLD)
+
+
+def bench_replay():
+    game = make_game()
+    agent = game.oop_agent
+    capacity = getattr(agent.memory, "capacity", None) or agent.memory.maxlen
+    while len(agent.memory) < capacity:
+        game.play_hand()
+    p50, _ = latency(lambda i: agent.replay(REPLAY_BATCH), 200, warmup=20)
+    return result(p50 / 1000, "ms", False)
+
+
+def bench_state_encoding():
+    game = make_game()
+    game.start_new_river_scenario()
+    game.deal_community_cards(4)
+    p50, _ = latency(lambda i: game.get_state_representation(), ENCODE_CALLS, warmup=1000)
+    return result(p50, "us", False)
+
+
+def bench_tensor_env():
+    if tensor_env is None or scenario_bank is None:
+        return None
+    env = tensor_env.TensorRiverEnv(TENSOR_GAMES)
+    for agent in (env.oop_agent, env.ip_agent):
+        agent.epsilon = PLAY_EPSILON
+    # Spots dealt up front, so only the betting and replay storage are timed
+    spots = scenario_bank.generate_spots(TENSOR_GAMES, np.random.default_rng(0))
+    return result(throughput(lambda: env.play(spots), TENSOR_GAMES), "games/s", True)
+
+
+def run():
+    # The simulator prints every hand, which would bury the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        act_p50, act_p99 = bench_act()
+        results = {
+            "play_hand": bench_play_hand(),
+            "act_p50": act_p50,
+            "act_p99": act_p99,
+            "replay_step": bench_replay(),
+            "state_encoding": bench_state_encoding(),
+            "tensor_env": bench_tensor_env(),
+        }
+    return {name: metric for name, metric in results.items() if metric is not None}
+
+
+if __name__ == "__main__":
+    main(run)
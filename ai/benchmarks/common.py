@@ -0,0 +1,156 @@
+import importlib
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+
+# Shared timing helpers of the benchmark scripts.
+#
+# Each bench_*.py script measures one deploy directory in its own process,
+# since ai/ and ai/riversim/ have modules of the same names, and writes a JSON
+# dict of {metric: {"value", "unit", "higher_is_better"}}. run.py collects
+# them and compares the results against baseline.json. Metrics of modules an
+# older tree does not have yet are left out of its results.
+
+BENCH_SEED = 0
+REPEATS = 3  # Measurements per metric, the best one is kept to filter out interference
+# The ai/ directory measured, another checkout's with POKER_BENCH_AI_DIR (see run.py --tree)
+AI_DIR = os.environ.get("POKER_BENCH_AI_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def use_sources(subdir=""):
+    """
+    Make a deploy directory's flat modules importable.
+
+    Args:
+        subdir (str): Directory under ai/, "" for ai/ itself.
+    """
+    sys.path.insert(0, os.path.join(AI_DIR, subdir))
+
+
+def optional_import(module):
+    """
+    Import a module that older trees may not have.
+
+    Returns:
+        module: The module, or None if it does not exist in the measured tree.
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        return None
+
+
+def seed_everything(seed=BENCH_SEED):
+    import torch
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def result(value, unit, higher_is_better, threshold=None):
+    """
+    One metric of a benchmark's results.
+
+    Args:
+        value (float): The measurement.
+        unit (str): Its unit.
+        higher_is_better (bool): Direction of improvement.
+        threshold (float, optional): Regression threshold of this metric when
+            it is noisier than the run.py default, such as tail latencies.
+
+    Returns:
+        dict: The metric.
+    """
+    metric = {"value": float(value), "unit": unit, "higher_is_better": higher_is_better}
+    if threshold is not None:
+        metric["threshold"] = threshold
+    return metric
+
+
+def latency(fn, calls, warmup=100, repeats=REPEATS):
+    """
+    Time individual calls of fn.
+
+    Args:
+        fn (callable): Called with the call index.
+        calls (int): Calls timed per repeat.
+        warmup (int): Calls made first and not timed.
+        repeats (int): Timed runs, the lowest percentiles are kept.
+
+    Returns:
+        tuple: (p50, p99) in microseconds.
+    """
+    for i in range(warmup):
+        fn(i)
+    percentiles = []
+    latencies = np.empty(calls)
+    for _ in range(repeats):
+        for i in range(calls):
+            start = time.perf_counter()
+            fn(i)
+            latencies[i] = time.perf_counter() - start
+        percentiles.append(np.percentile(latencies, (50, 99)) * 1e6)
+    return tuple(np.min(percentiles, axis=0))
+
+
+def throughput(fn, items_per_call=1, min_seconds=1.0, warmup=1, repeats=REPEATS):
+    """
+    Call fn repeatedly for at least min_seconds.
+
+    Args:
+        fn (callable): The work.
+        items_per_call (int): Items one call processes.
+        min_seconds (float): Minimum timed duration per repeat.
+        warmup (int): Calls made first and not timed.
+        repeats (int): Timed runs, the fastest is kept.
+
+    Returns:
+        float: Items per second.
+    """
+    for _ in range(warmup):
+        fn()
+    rates = []
+    for _ in range(repeats):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            fn()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds:
+                rates.append(calls * items_per_call / elapsed)
+                break
+    return max(rates)
+
+
+def write_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+
+
+def main(run):
+    """
+    Entry point of a bench_*.py script: run it and write or print the results.
+
+    Args:
+        run (callable): Returns the results dict.
+    """
+    import argparse
+    import logging
+
+    parser = argparse.ArgumentParser(description="Run one benchmark group")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON results here instead of printing them")
+    args = parser.parse_args()
+
+    # Hand logging would otherwise dominate the game benchmarks
+    logging.disable(logging.INFO)
+    seed_everything()
+    results = run()
+    if args.output:
+        write_results(results, args.output)
+    else:
+        print(json.dumps(results, indent=1, sort_keys=True))
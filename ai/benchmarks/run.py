@@ -0,0 +1,199 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from common import write_results
+
+# Runs the benchmark groups and compares them with a stored baseline.
+#
+# Every group runs in a fresh process. The results are written as JSON with
+# the machine they were measured on, and each metric is compared with
+# baseline.json: a change for the worse of more than the threshold is a
+# regression, and the exit status is 1 if any metric regressed. Groups with a
+# regression are run again and each metric keeps its better result, so one
+# disturbed process does not fail the run. Baselines are
+# only comparable on the same machine, so regenerate baseline.json with
+# --update-baseline when the benchmark machine changes.
+#
+# --tree measures the ai/ directory of another checkout with these scripts.
+# baseline_pre_series.json was recorded that way from the tree before the
+# performance work (96f3c7a), so comparing with it shows the series' gains.
+# Metrics of modules that tree does not have are reported as "new".
+#
+#   python3 ./benchmarks/run.py
+#   python3 ./benchmarks/run.py --groups game --threshold 0.05
+#   python3 ./benchmarks/run.py --update-baseline
+#   python3 ./benchmarks/run.py --baseline ./benchmarks/baseline_pre_series.json
+#   git worktree add /tmp/pre 96f3c7a
+#   python3 ./benchmarks/run.py --tree /tmp/pre/ai --update-baseline --baseline ./benchmarks/baseline_pre_series.json
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+GROUPS = ("game", "riversim")
+REGRESSION_THRESHOLD = 0.10  # Relative change for the worse that counts as a regression
+CONFIRM_RUNS = 1  # Extra runs of a group that regressed
+
+
+def machine():
+    import numpy as np
+    import torch
+
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "cuda": torch.cuda.is_available(),
+    }
+
+
+def git_commit(directory=BENCHMARKS_DIR):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=directory, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_group(group, tree=None):
+    """
+    Run one bench_<group>.py script in a new process.
+
+    Args:
+        group (str): The group.
+        tree (str, optional): ai/ directory to measure instead of this one.
+
+    Returns:
+        dict: Its results, with the metric names prefixed by the group.
+    """
+    env = dict(os.environ)
+    if tree:
+        env["POKER_BENCH_AI_DIR"] = os.path.abspath(tree)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.json")
+        # Older trees log to ./logs, which must exist
+        os.makedirs(os.path.join(tmp, "logs"))
+        subprocess.run(
+            [sys.executable, os.path.join(BENCHMARKS_DIR, f"bench_{group}.py"), "--output", output],
+            cwd=tmp,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        with open(output) as f:
+            return {f"{group}.{name}": metric for name, metric in json.load(f).items()}
+
+
+def best(first, second):
+    """
+    Merge two runs' results, keeping the better value of each metric.
+    """
+    merged = dict(first)
+    for name, metric in second.items():
+        current = merged.get(name)
+        if current is None or (metric["value"] > current["value"]) == metric["higher_is_better"]:
+            merged[name] = metric
+    return merged
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare results with a baseline.
+
+    Args:
+        results (dict): {metric: {"value", "unit", "higher_is_better"}}.
+        baseline (dict): The same for the baseline.
+        threshold (float): Relative change for the worse that is a regression,
+            unless the metric carries its own.
+
+    Returns:
+        list: (metric, baseline value, value, relative change, status) rows.
+        The change is signed so positive is always an improvement.
+    """
+    rows = []
+    for name, metric in sorted(results.items()):
+        if name not in baseline:
+            rows.append((name, None, metric["value"], None, "new"))
+            continue
+        base = baseline[name]["value"]
+        change = (metric["value"] - base) / base if base else 0.0
+        if not metric["higher_is_better"]:
+            change = -change
+        limit = metric.get("threshold", threshold)
+        status = "REGRESSED" if change < -limit else ("improved" if change > limit else "ok")
+        rows.append((name, base, metric["value"], change, status))
+    return rows
+
+
+def print_report(rows, results):
+    print(f"{'metric':<26} {'baseline':>12} {'current':>12} {'unit':<8} {'change':>8}  status")
+    for name, base, value, change, status in rows:
+        base_text = f"{base:12.4g}" if base is not None else f"{'-':>12}"
+        change_text = f"{change:+8.1%}" if change is not None else f"{'-':>8}"
+        print(f"{name:<26} {base_text} {value:12.4g} {results[name]['unit']:<8} {change_text}  {status}")
+
+
+def main(args):
+    results = {}
+    for group in args.groups:
+        print(f"Running {group} benchmarks...", flush=True)
+        results.update(run_group(group, args.tree))
+
+    baseline = None
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline["results"], args.threshold)
+        for _ in range(args.confirm_runs):
+            regressed = {row[0].split(".", 1)[0] for row in rows if row[4] == "REGRESSED"}
+            if not regressed:
+                break
+            for group in sorted(regressed):
+                print(f"Running {group} benchmarks again to confirm regressions...", flush=True)
+                results = best(results, run_group(group, args.tree))
+            rows = compare(results, baseline["results"], args.threshold)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(args.tree or BENCHMARKS_DIR),
+        "machine": machine(),
+        "results": results,
+    }
+    if args.output:
+        write_results(report, args.output)
+        print(f"Results written to {args.output}")
+    if args.update_baseline:
+        write_results(report, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, create one with --update-baseline")
+        return 0
+
+    if baseline["machine"] != report["machine"]:
+        print("Warning: the baseline was measured on a different machine or software versions")
+    print_report(rows, results)
+    regressions = [row[0] for row in rows if row[4] == "REGRESSED"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks and compare them with the baseline")
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS), help="Benchmark groups to run")
+    parser.add_argument("--baseline", type=str, default=BASELINE_FILE, help="Baseline results to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Relative slowdown flagged as a regression")
+    parser.add_argument("--confirm-runs", type=int, default=CONFIRM_RUNS, help="Extra runs of a group before its regressions are reported")
+    parser.add_argument("--output", type=str, default=None, help="Also write the results as JSON here")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline instead of comparing")
+    parser.add_argument("--tree", type=str, default=None, help="Measure the ai/ directory of another checkout, e.g. an older commit")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,170 @@
+import glob
+import logging
+import os
+import queue
+import random
+import threading
+import numpy as np
+import torch
+
+# Full training checkpoints: both agents' networks, optimizers, epsilons and
+# replay memories, the episode counter, running totals and the RNG states.
+#
+# The training loop only pays for the snapshot, which copies tensors to the
+# CPU. Serializing and writing happen on a background thread, one checkpoint
+# at a time, and each file is written next to its final name and renamed into
+# place so a crash mid-write never leaves a corrupt latest checkpoint.
+
+CHECKPOINT_DIR = "./checkpoints"
+CHECKPOINT_EVERY = 10_000  # Hands between checkpoints
+CHECKPOINTS_KEPT = 3  # Older checkpoint files are deleted
+
+
+def rng_state():
+    """
+    Capture the Python, NumPy and torch random states.
+
+    Returns:
+        dict: The states, restorable with set_rng_state.
+    """
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    """
+    Restore random states captured by rng_state.
+
+    Args:
+        state (dict): The saved states.
+    """
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def training_state(agents, episode, **progress):
+    """
+    Snapshot the full training state.
+
+    Args:
+        agents (dict): DQNAgent per seat.
+        episode (int): Episodes completed so far.
+        **progress: Running totals of the training loop, such as cumulative rewards.
+
+    Returns:
+        dict: The checkpoint contents, safe to hand to another thread.
+    """
+    return {
+        "episode": episode,
+        "agents": {seat: agent.state_dict() for seat, agent in agents.items()},
+        "progress": progress,
+        "rng": rng_state(),
+    }
+
+
+def checkpoint_path(directory, episode):
+    return os.path.join(directory, f"checkpoint_{episode:012d}.pt")
+
+
+def latest_checkpoint(directory=CHECKPOINT_DIR):
+    """
+    Find the most recent checkpoint in a directory.
+
+    Args:
+        directory (str): The checkpoint directory.
+
+    Returns:
+        str or None: Path of the checkpoint with the highest episode, if any.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "checkpoint_*.pt")))
+    return paths[-1] if paths else None
+
+
+def load_checkpoint(path, agents):
+    """
+    Restore agents and random states from a checkpoint.
+
+    Args:
+        path (str): The checkpoint file.
+        agents (dict): DQNAgent per seat, built with the same replay settings
+            as the run that wrote the checkpoint.
+
+    Returns:
+        tuple: (episode, progress) to continue the training loop from.
+    """
+    state = torch.load(path, map_location="cpu", weights_only=False)
+    for seat, agent in agents.items():
+        agent.load_state_dict(state["agents"][seat])
+    set_rng_state(state["rng"])
+    logging.info(f"Resumed from {path} at episode {state['episode']}")
+    return state["episode"], state["progress"]
+
+
+class CheckpointWriter:
+    """
+    Background thread that writes training snapshots to disk.
+
+    At most one snapshot waits behind the one being written. If training
+    produces checkpoints faster than the disk takes them, save() blocks
+    rather than piling snapshots up in memory.
+    """
+
+    def __init__(self, directory=CHECKPOINT_DIR, keep=CHECKPOINTS_KEPT):
+        """
+        Start the writer thread.
+
+        Args:
+            directory (str): Where checkpoint files are written.
+            keep (int): Number of most recent checkpoints kept.
+        """
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        self.pending = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.run, name="checkpoint-writer", daemon=True)
+        self.thread.start()
+
+    def save(self, state):
+        """
+        Queue a snapshot returned by training_state for writing.
+
+        Args:
+            state (dict): The snapshot. It must not be modified afterwards.
+        """
+        self.pending.put(state)
+
+    def run(self):
+        while True:
+            state = self.pending.get()
+            if state is None:
+                break
+            try:
+                self.write(state)
+            except Exception:
+                logging.exception("Failed to write checkpoint")
+
+    def write(self, state):
+        path = checkpoint_path(self.directory, state["episode"])
+        tmp_path = path + ".tmp"
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+        logging.info(f"Saved checkpoint {path}")
+
+        for old in sorted(glob.glob(os.path.join(self.directory, "checkpoint_*.pt")))[: -self.keep]:
+            os.remove(old)
+
+    def close(self):
+        """
+        Finish writing queued snapshots and stop the thread.
+        """
+        self.pending.put(None)
+        self.thread.join()
@@ -0,0 +1,337 @@
+import itertools
+import math
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from cards import NUM_CARDS, str_to_card
+from hand_evaluator import evaluate_omaha_batch
+
+# PLO equity of a 4-card hand against a hand, a range or a random hand.
+#
+# Showdowns are evaluated in batches with hand_evaluator. When the number of
+# remaining (villain hand, runout) showdowns is small enough they are
+# enumerated exactly, otherwise they are sampled. Large jobs are split into
+# shards across a process pool, and results are cached by a canonical key
+# that is invariant to card order and suit relabeling.
+
+EXACT_LIMIT = 250_000  # Most showdowns enumerated exactly when exact=None
+DEFAULT_ITERS = 20_000  # Sampled showdowns when not enumerating
+PARALLEL_THRESHOLD = 200_000  # Smaller jobs run in-process
+SHARD_SIZE = 100_000  # Showdowns per process-pool task
+CACHE_SIZE = 100_000
+
+SUIT_PERMUTATIONS = np.array(list(itertools.permutations(range(4))), dtype=np.uint8)
+
+equity_cache = OrderedDict()
+executor = None
+executor_workers = 0
+
+
+def to_cards(cards):
+    """
+    Convert card ids or card strings to a uint8 array of card ids.
+
+    Args:
+        cards (Iterable[int | str]): The cards.
+
+    Returns:
+        np.ndarray: The card ids.
+    """
+    return np.array(
+        [str_to_card(card) if isinstance(card, str) else int(card) for card in cards],
+        dtype=np.uint8,
+    )
+
+
+def to_range(villain):
+    """
+    Normalize the villain argument of equity() to a (V, 4) array of hands.
+
+    Args:
+        villain: None for a random hand, one 4-card hand, or a list of hands.
+
+    Returns:
+        np.ndarray or None: (V, 4) card ids, or None for a random hand.
+    """
+    if villain is None:
+        return None
+    villain = list(villain)
+    if len(villain) and isinstance(villain[0], (str, int, np.integer)):
+        villain = [villain]
+    return np.stack([to_cards(hand) for hand in villain])
+
+
+def canonical_key(hero, villains, board, dead):
+    """
+    Build a cache key shared by all equivalent spots.
+
+    Cards are sorted within each group and suits are relabeled with whichever
+    of the 24 suit permutations gives the smallest key.
+
+    Args:
+        hero (np.ndarray): Hero's card ids.
+        villains (np.ndarray or None): (V, 4) villain range, or None.
+        board (np.ndarray): Board card ids.
+        dead (np.ndarray): Dead card ids.
+
+    Returns:
+        tuple: The canonical key, whose card ids can be used in place of the inputs.
+    """
+    best = None
+    for perm in SUIT_PERMUTATIONS:
+
+        def relabel(cards):
+            cards = np.asarray(cards, dtype=np.uint8)
+            return np.sort(cards // 4 * 4 + perm[cards % 4], axis=-1)
+
+        key = (
+            tuple(relabel(hero).tolist()),
+            None if villains is None else tuple(sorted(map(tuple, relabel(villains).tolist()))),
+            tuple(relabel(board).tolist()),
+            tuple(relabel(dead).tolist()),
+        )
+        if best is None or key < best:
+            best = key
+    return best
+
+
+def count_showdowns(num_remaining, num_villains, runout_size):
+    """
+    Number of (villain hand, runout) showdowns in an exact enumeration.
+
+    Args:
+        num_remaining (int): Cards left after hero, board and dead cards.
+        num_villains (int or None): Range size, or None for a random hand.
+        runout_size (int): Board cards still to come.
+
+    Returns:
+        int: The showdown count.
+    """
+    if num_villains is None:
+        num_villains = math.comb(num_remaining, 4)
+    return num_villains * math.comb(num_remaining - 4, runout_size)
+
+
+def enumerate_showdowns(deck, villain_positions, board, runout_size):
+    """
+    Enumerate every runout for every villain hand.
+
+    Args:
+        deck (np.ndarray): The remaining card ids.
+        villain_positions (np.ndarray): (V, 4) sorted positions in deck of each villain hand.
+        board (np.ndarray): Known board card ids.
+        runout_size (int): Board cards still to come.
+
+    Returns:
+        tuple: (boards (S, 5), villain holes (S, 4)) card id arrays.
+    """
+    # Runouts are enumerated in the deck minus the villain's four cards, then
+    # mapped back to deck positions by stepping over each villain card
+    num_runouts = math.comb(len(deck) - 4, runout_size)
+    runouts = np.array(list(itertools.combinations(range(len(deck) - 4), runout_size)), dtype=np.intp)
+    runouts = runouts.reshape(num_runouts, runout_size)
+    positions = np.broadcast_to(runouts, (len(villain_positions),) + runouts.shape).copy()
+    for k in range(4):
+        positions += positions >= villain_positions[:, None, None, k]
+
+    boards = np.empty((len(villain_positions) * num_runouts, 5), dtype=np.uint8)
+    boards[:, : len(board)] = board
+    boards[:, len(board) :] = deck[positions.reshape(len(boards), runout_size)]
+    holes = np.repeat(deck[villain_positions], num_runouts, axis=0)
+    return boards, holes
+
+
+def sample_showdowns(deck, villain_positions, board, runout_size, iters, rng):
+    """
+    Sample random showdowns.
+
+    Args:
+        deck (np.ndarray): The remaining card ids.
+        villain_positions (np.ndarray or None): (V, 4) positions in deck of the
+            villain range, or None for a random hand.
+        board (np.ndarray): Known board card ids.
+        runout_size (int): Board cards still to come.
+        iters (int): Number of showdowns to sample.
+        rng (np.random.Generator): Random source.
+
+    Returns:
+        tuple: (boards (iters, 5), villain holes (iters, 4)) card id arrays.
+    """
+    keys = rng.random((iters, len(deck)))
+    if villain_positions is None:
+        draw = 4 + runout_size
+    else:
+        # Pick a villain hand per sample and push its cards out of the draw
+        chosen = villain_positions[rng.integers(len(villain_positions), size=iters)]
+        np.put_along_axis(keys, chosen, 2.0, axis=1)
+        draw = runout_size
+
+    picks = np.argpartition(keys, draw - 1, axis=1)[:, :draw] if draw else np.empty((iters, 0), dtype=np.intp)
+    if villain_positions is None:
+        chosen, picks = picks[:, :4], picks[:, 4:]
+
+    boards = np.empty((iters, 5), dtype=np.uint8)
+    boards[:, : len(board)] = board
+    boards[:, len(board) :] = deck[picks]
+    return boards, deck[chosen]
+
+
+def score_showdowns(hero, boards, holes):
+    """
+    Score hero against villain holes on full boards.
+
+    Args:
+        hero (np.ndarray): Hero's four card ids.
+        boards (np.ndarray): (S, 5) boards.
+        holes (np.ndarray): (S, 4) villain holes.
+
+    Returns:
+        tuple: (wins, ties, showdowns).
+    """
+    hero_rank = evaluate_omaha_batch(boards, np.broadcast_to(hero, holes.shape))
+    villain_rank = evaluate_omaha_batch(boards, holes)
+    return int((hero_rank < villain_rank).sum()), int((hero_rank == villain_rank).sum()), len(boards)
+
+
+def exact_shard(hero, deck, villain_positions, board, runout_size):
+    """Process-pool task: enumerate and score the showdowns for some villain hands."""
+    boards, holes = enumerate_showdowns(deck, villain_positions, board, runout_size)
+    return score_showdowns(hero, boards, holes)
+
+
+def sample_shard(hero, deck, villain_positions, board, runout_size, iters, seed):
+    """Process-pool task: sample and score iters showdowns."""
+    rng = np.random.default_rng(seed)
+    boards, holes = sample_showdowns(deck, villain_positions, board, runout_size, iters, rng)
+    return score_showdowns(hero, boards, holes)
+
+
+def get_executor(workers):
+    """
+    Return the shared process pool, creating it on first use.
+
+    Args:
+        workers (int): Number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    global executor, executor_workers
+    if executor is None or executor_workers != workers:
+        if executor is not None:
+            executor.shutdown()
+        executor = ProcessPoolExecutor(max_workers=workers)
+        executor_workers = workers
+    return executor
+
+
+def run_shards(task, shard_args, workers):
+    """
+    Run shards in-process or on the process pool and total their results.
+
+    Args:
+        task (callable): exact_shard or sample_shard.
+        shard_args (list): Positional argument tuples, one per shard.
+        workers (int): Worker processes; 1 runs in-process.
+
+    Returns:
+        tuple: Total (wins, ties, showdowns).
+    """
+    if workers <= 1 or len(shard_args) == 1:
+        results = [task(*args) for args in shard_args]
+    else:
+        results = list(get_executor(workers).map(task, *zip(*shard_args)))
+    return tuple(map(sum, zip(*results)))
+
+
+def equity(hero, villain=None, board=(), dead=(), iters=DEFAULT_ITERS, exact=None, workers=None, seed=None):
+    """
+    Hero's all-in equity (wins plus half of ties) at showdown.
+
+    Args:
+        hero (Iterable[int | str]): Hero's four cards.
+        villain: None for a random hand, a 4-card hand, or a list of 4-card
+            hands forming a uniform range. Range hands that conflict with
+            known cards are skipped.
+        board (Iterable[int | str]): Zero to five board cards.
+        dead (Iterable[int | str]): Cards known to be out of play.
+        iters (int): Showdowns to sample when not enumerating.
+        exact (bool, optional): True to enumerate every runout, False to
+            sample, None to enumerate when there are at most EXACT_LIMIT showdowns.
+        workers (int, optional): Worker processes for large jobs, defaults to
+            the CPU count. 1 keeps everything in-process.
+        seed (int, optional): Seed for sampling.
+
+    Returns:
+        float: Hero's equity between 0 and 1.
+    """
+    hero = to_cards(hero)
+    villains = to_range(villain)
+    board = to_cards(board)
+    dead = to_cards(dead)
+
+    known = np.concatenate((hero, board, dead))
+    if len(hero) != 4 or len(board) > 5 or len(np.unique(known)) != len(known):
+        raise ValueError("Hero needs four cards, the board at most five, and no card may repeat")
+
+    key = canonical_key(hero, villains, board, dead)
+    hero, villains, board, dead = (
+        np.array(key[0], dtype=np.uint8),
+        None if key[1] is None else np.array(key[1], dtype=np.uint8).reshape(-1, 4),
+        np.array(key[2], dtype=np.uint8),
+        np.array(key[3], dtype=np.uint8),
+    )
+
+    deck = np.setdiff1d(np.arange(NUM_CARDS, dtype=np.uint8), np.concatenate((hero, board, dead)))
+    runout_size = 5 - len(board)
+
+    villain_positions = None
+    if villains is not None:
+        # Drop range hands blocked by known cards and locate the rest in the deck
+        playable = np.isin(villains, deck).all(axis=1)
+        if not playable.any():
+            raise ValueError("Every villain hand conflicts with the known cards")
+        villain_positions = np.sort(np.searchsorted(deck, villains[playable]), axis=1)
+
+    num_villains = None if villain_positions is None else len(villain_positions)
+    showdowns = count_showdowns(len(deck), num_villains, runout_size)
+    if exact is None:
+        exact = showdowns <= EXACT_LIMIT
+
+    cache_key = (key, "exact" if exact else iters, None if exact else seed)
+    if cache_key in equity_cache:
+        equity_cache.move_to_end(cache_key)
+        return equity_cache[cache_key]
+
+    work = showdowns if exact else iters
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if work < PARALLEL_THRESHOLD:
+        workers = 1
+
+    if exact:
+        if villain_positions is None:
+            villain_positions = np.array(list(itertools.combinations(range(len(deck)), 4)), dtype=np.intp)
+        per_villain = math.comb(len(deck) - 4, runout_size)
+        villains_per_shard = max(1, SHARD_SIZE // per_villain)
+        shard_args = [
+            (hero, deck, villain_positions[i : i + villains_per_shard], board, runout_size)
+            for i in range(0, len(villain_positions), villains_per_shard)
+        ]
+        wins, ties, total = run_shards(exact_shard, shard_args, workers)
+    else:
+        num_shards = max(1, math.ceil(iters / SHARD_SIZE))
+        seeds = np.random.SeedSequence(seed).spawn(num_shards)
+        sizes = [len(chunk) for chunk in np.array_split(np.arange(iters), num_shards)]
+        shard_args = [
+            (hero, deck, villain_positions, board, runout_size, size, shard_seed)
+            for size, shard_seed in zip(sizes, seeds)
+        ]
+        wins, ties, total = run_shards(sample_shard, shard_args, workers)
+
+    result = (wins + ties / 2) / total
+    equity_cache[cache_key] = result
+    if len(equity_cache) > CACHE_SIZE:
+        equity_cache.popitem(last=False)
+    return result
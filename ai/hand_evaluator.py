@@ -0,0 +1,175 @@
+import itertools
+import numpy as np
+from phevaluator import evaluate_cards
+from cards import CARD_RANK, CARD_SUIT
+
+# Vectorized Omaha showdown evaluation.
+#
+# A 5-card hand's rank depends only on its ranks, plus whether all five cards
+# share a suit. Both cases are covered by lookup tables built once from
+# phevaluator, so every rank returned here is exactly phevaluator's rank
+# (1 = royal flush, 7462 = 7-5-4-3-2 offsuit, lower is stronger).
+#
+# An Omaha hand is one of 6 hole pairs plus one of 10 board triples. Pairs and
+# triples are reduced to indices of their rank multisets (order independent,
+# so no sorting is needed), and OMAHA_UNSUITED_TABLE[pair, triple] gives the
+# rank of the combined 5 cards. Flushes are looked up by their 13-bit rank mask.
+
+# The 60 Omaha hands: exactly two hole cards and exactly three board cards
+HOLE_PAIRS = np.array(list(itertools.combinations(range(4), 2)), dtype=np.intp)
+BOARD_TRIPLES = np.array(list(itertools.combinations(range(5), 3)), dtype=np.intp)
+
+RANK_PLACE_VALUES = 13 ** np.arange(4, -1, -1)
+RANK_BIT = (1 << np.arange(13)).astype(np.int16)
+
+
+def build_five_card_tables():
+    """
+    Build the 5-card flush and unsuited rank tables from phevaluator.
+
+    Returns:
+        tuple: (flush_table indexed by rank mask, unsuited_table indexed by
+        the descending ranks as a base-13 number), both int16.
+    """
+    flush_table = np.zeros(1 << 13, dtype=np.int16)
+    for ranks in itertools.combinations(range(13), 5):
+        mask = sum(1 << r for r in ranks)
+        flush_table[mask] = evaluate_cards(*[r * 4 for r in ranks])
+
+    unsuited_table = np.zeros(13 ** 5, dtype=np.int16)
+    for ranks in itertools.combinations_with_replacement(range(13), 5):
+        if max(ranks.count(r) for r in ranks) > 4:
+            continue
+        # Suits 0,1,2,3,0 by position: repeated ranks get distinct suits and
+        # the hand is never a flush
+        cards = [r * 4 + i % 4 for i, r in enumerate(ranks)]
+        key = int(np.dot(sorted(ranks, reverse=True), RANK_PLACE_VALUES))
+        unsuited_table[key] = evaluate_cards(*cards)
+
+    return flush_table, unsuited_table
+
+
+def build_multiset_index(size):
+    """
+    Map every ordered tuple of ranks to the index of its rank multiset.
+
+    Args:
+        size (int): Tuple length, 2 for hole pairs and 3 for board triples.
+
+    Returns:
+        tuple: (index array of shape (13,) * size, (M, size) array of the
+        multisets in index order).
+    """
+    multisets = list(itertools.combinations_with_replacement(range(13), size))
+    lookup = {ranks: i for i, ranks in enumerate(multisets)}
+    index = np.zeros((13,) * size, dtype=np.int16)
+    for ranks in itertools.product(range(13), repeat=size):
+        index[ranks] = lookup[tuple(sorted(ranks))]
+    return index, np.array(multisets, dtype=np.int64)
+
+
+def build_omaha_unsuited_table(pairs, triples, unsuited_table):
+    """
+    Combine every pair and triple multiset into a 5-card unsuited rank.
+
+    Args:
+        pairs (np.ndarray): (P, 2) pair multisets.
+        triples (np.ndarray): (T, 3) triple multisets.
+        unsuited_table (np.ndarray): The 5-card unsuited table.
+
+    Returns:
+        np.ndarray: (P, T) int16 ranks. Entries for five cards of one rank,
+        which real cards cannot produce, are 0.
+    """
+    ranks = np.concatenate(
+        (
+            np.broadcast_to(pairs[:, None, :], (len(pairs), len(triples), 2)),
+            np.broadcast_to(triples[None, :, :], (len(pairs), len(triples), 3)),
+        ),
+        axis=-1,
+    )
+    keys = -np.sort(-ranks, axis=-1) @ RANK_PLACE_VALUES
+    return unsuited_table[keys]
+
+
+FLUSH_TABLE, UNSUITED_TABLE = build_five_card_tables()
+PAIR_INDEX, PAIR_MULTISETS = build_multiset_index(2)
+TRIPLE_INDEX, TRIPLE_MULTISETS = build_multiset_index(3)
+OMAHA_UNSUITED_TABLE = build_omaha_unsuited_table(PAIR_MULTISETS, TRIPLE_MULTISETS, UNSUITED_TABLE)
+
+
+def evaluate_five_card_batch(cards):
+    """
+    Rank 5-card hands.
+
+    Args:
+        cards (np.ndarray): (..., 5) array of card ids.
+
+    Returns:
+        np.ndarray: (...) int16 array of phevaluator ranks.
+    """
+    ranks = CARD_RANK[cards].astype(np.int64)
+    suits = CARD_SUIT[cards]
+
+    sorted_ranks = -np.sort(-ranks, axis=-1)
+    ranks_out = UNSUITED_TABLE[sorted_ranks @ RANK_PLACE_VALUES]
+
+    is_flush = (suits == suits[..., :1]).all(axis=-1)
+    if is_flush.any():
+        masks = np.bitwise_or.reduce(RANK_BIT[ranks[is_flush]], axis=-1)
+        ranks_out[is_flush] = FLUSH_TABLE[masks]
+    return ranks_out
+
+
+def evaluate_omaha_batch(boards, holes, chunk_size=65536):
+    """
+    Rank PLO hands, the batched equivalent of phevaluator.evaluate_omaha_cards.
+
+    Args:
+        boards (np.ndarray): (N, 5) array of board card ids.
+        holes (np.ndarray): (N, 4) array of hole card ids.
+        chunk_size (int): Hands evaluated per chunk, bounding peak memory.
+
+    Returns:
+        np.ndarray: (N,) int16 array of ranks, lower is stronger.
+    """
+    boards = np.asarray(boards)
+    holes = np.asarray(holes)
+    n = len(boards)
+    out = np.empty(n, dtype=np.int16)
+
+    for start in range(0, n, chunk_size):
+        board = boards[start : start + chunk_size]
+        hole = holes[start : start + chunk_size]
+
+        # (k, 6, 2) hole pairs and (k, 10, 3) board triples
+        pair_ranks = CARD_RANK[hole[:, HOLE_PAIRS]]
+        pair_suits = CARD_SUIT[hole[:, HOLE_PAIRS]]
+        triple_ranks = CARD_RANK[board[:, BOARD_TRIPLES]]
+        triple_suits = CARD_SUIT[board[:, BOARD_TRIPLES]]
+
+        pair_index = PAIR_INDEX[pair_ranks[..., 0], pair_ranks[..., 1]]
+        triple_index = TRIPLE_INDEX[triple_ranks[..., 0], triple_ranks[..., 1], triple_ranks[..., 2]]
+        # (k, 6, 10): every hole pair with every board triple
+        ranks = OMAHA_UNSUITED_TABLE[pair_index[:, :, None], triple_index[:, None, :]]
+
+        # A combination is a flush when the pair and the triple are each
+        # suited, in the same suit
+        pair_suited = pair_suits[..., 0] == pair_suits[..., 1]
+        triple_suited = (triple_suits[..., 0] == triple_suits[..., 1]) & (
+            triple_suits[..., 0] == triple_suits[..., 2]
+        )
+        is_flush = (
+            pair_suited[:, :, None]
+            & triple_suited[:, None, :]
+            & (pair_suits[:, :, None, 0] == triple_suits[:, None, :, 0])
+        )
+        if is_flush.any():
+            pair_mask = np.bitwise_or.reduce(RANK_BIT[pair_ranks], axis=-1)
+            triple_mask = np.bitwise_or.reduce(RANK_BIT[triple_ranks], axis=-1)
+            flush_ranks = FLUSH_TABLE[pair_mask[:, :, None] | triple_mask[:, None, :]]
+            ranks = np.where(is_flush, flush_ranks, ranks)
+
+        out[start : start + len(board)] = ranks.reshape(len(board), -1).min(axis=1)
+
+    return out
@@ -0,0 +1,280 @@
+import glob
+import os
+import queue
+import threading
+import numpy as np
+from cards import cards_to_str
+
+# Binary hand histories.
+#
+# Each hand is one fixed-width HAND_DTYPE record: hole cards, board, the
+# sequence of decisions with their bet sizes, the final pot, rewards and
+# flags. Records are filled into a preallocated buffer on the game thread and
+# handed off in blocks to a writer thread, which appends them to segment
+# files of at most SEGMENT_HANDS records. A segment starts with a small header
+# and is otherwise a plain array of records, so readers memory-map it.
+
+MAX_ACTIONS = 32  # Decisions kept per hand, later ones set FLAG_TRUNCATED
+SEGMENT_HANDS = 1_000_000  # Records per segment file
+BUFFER_HANDS = 4096  # Records handed to the writer thread at a time
+NO_CARD = 255
+
+HISTORY_MAGIC = b"PLOHH\x00\x00\x01"
+HEADER_SIZE = 16  # Magic, then the record size as uint32, then padding
+
+FLAG_SHOWDOWN = 1
+FLAG_ALLIN = 2
+FLAG_TRUNCATED = 4
+
+# An action byte packs the seat (bit 7), the street (bits 4-5) and the action id (bits 0-1)
+SEATS = ("oop", "ip")
+STREETS = ("preflop", "flop", "turn", "river")
+STREET_BY_BOARD_SIZE = {0: 0, 3: 1, 4: 2, 5: 3}
+ACTION_NAMES = ("fold", "check", "call", "bet")
+
+HAND_DTYPE = np.dtype(
+    [
+        ("hand_id", "<u8"),
+        ("oop_hand", "u1", 4),
+        ("ip_hand", "u1", 4),
+        ("board", "u1", 5),
+        ("num_actions", "u1"),
+        ("flags", "u1"),
+        ("actions", "u1", MAX_ACTIONS),
+        ("bet_sizes", "<u2", MAX_ACTIONS),
+        ("pot", "<f4"),
+        ("oop_reward", "<f4"),
+        ("ip_reward", "<f4"),
+    ]
+)
+
+
+def pack_action(seat, board_size, action):
+    """
+    Pack one decision into an action byte.
+
+    Args:
+        seat (int): 0 for OOP, 1 for IP.
+        board_size (int): Community cards dealt when the decision was made.
+        action (int): Action id, 0 fold, 1 check, 2 call, 3 bet.
+
+    Returns:
+        int: The action byte.
+    """
+    return seat << 7 | STREET_BY_BOARD_SIZE[board_size] << 4 | action
+
+
+def segment_files(directory):
+    return sorted(glob.glob(os.path.join(directory, "hands_*.bin")))
+
+
+def segment_length(path):
+    return (os.path.getsize(path) - HEADER_SIZE) // HAND_DTYPE.itemsize
+
+
+class HandHistoryWriter:
+    """
+    Buffered, background writer of hand records.
+    """
+
+    def __init__(self, directory, segment_hands=SEGMENT_HANDS, buffer_hands=BUFFER_HANDS):
+        """
+        Open a history directory for appending.
+
+        Args:
+            directory (str): Where segment files are written.
+            segment_hands (int): Records per segment file.
+            buffer_hands (int): Records collected before a block is handed to the writer.
+        """
+        self.directory = directory
+        self.segment_hands = segment_hands
+        os.makedirs(directory, exist_ok=True)
+
+        # Appending continues the last segment and the hand ids
+        segments = segment_files(directory)
+        self.segment_index = len(segments) - 1 if segments else 0
+        self.segment_count = segment_length(segments[-1]) if segments else 0
+        self.next_hand_id = sum(segment_length(path) for path in segments)
+        self.file = None
+
+        self.buffer = np.zeros(buffer_hands, dtype=HAND_DTYPE)
+        self.count = 0
+        self.blocks = queue.Queue(maxsize=8)
+        self.thread = threading.Thread(target=self.run, name="hand-history-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, oop_hand, ip_hand, board, actions, pot, oop_reward, ip_reward, showdown=False, allin=False):
+        """
+        Add one hand.
+
+        Args:
+            oop_hand (np.ndarray): OOP's four card ids.
+            ip_hand (np.ndarray): IP's four card ids.
+            board (np.ndarray): The community card ids dealt.
+            actions (list): (action byte, bet size) per decision, see pack_action.
+            pot (float): The final pot.
+            oop_reward (float): OOP's reward.
+            ip_reward (float): IP's reward.
+            showdown (bool): Whether the hand went to showdown.
+            allin (bool): Whether a player was all in.
+        """
+        i = self.count
+        buffer = self.buffer
+        buffer["hand_id"][i] = self.next_hand_id
+        buffer["oop_hand"][i] = oop_hand
+        buffer["ip_hand"][i] = ip_hand
+        buffer["board"][i] = NO_CARD
+        buffer["board"][i, : len(board)] = board
+
+        n = min(len(actions), MAX_ACTIONS)
+        buffer["num_actions"][i] = n
+        buffer["actions"][i] = 0
+        buffer["bet_sizes"][i] = 0
+        if n:
+            packed, bet_sizes = zip(*actions[:n])
+            buffer["actions"][i, :n] = packed
+            buffer["bet_sizes"][i, :n] = bet_sizes
+        buffer["flags"][i] = (
+            (FLAG_SHOWDOWN if showdown else 0)
+            | (FLAG_ALLIN if allin else 0)
+            | (FLAG_TRUNCATED if len(actions) > MAX_ACTIONS else 0)
+        )
+        buffer["pot"][i] = pot
+        buffer["oop_reward"][i] = oop_reward
+        buffer["ip_reward"][i] = ip_reward
+
+        self.next_hand_id += 1
+        self.count += 1
+        if self.count == len(buffer):
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the buffered records to the writer thread.
+        """
+        if self.count:
+            self.blocks.put(self.buffer[: self.count].copy())
+            self.count = 0
+
+    def open_segment(self):
+        path = os.path.join(self.directory, f"hands_{self.segment_index:05d}.bin")
+        new = not os.path.exists(path)
+        self.file = open(path, "ab")
+        if new:
+            header = np.zeros(HEADER_SIZE, dtype=np.uint8)
+            header[: len(HISTORY_MAGIC)] = np.frombuffer(HISTORY_MAGIC, dtype=np.uint8)
+            header[8:12] = np.frombuffer(np.uint32(HAND_DTYPE.itemsize).tobytes(), dtype=np.uint8)
+            self.file.write(header.tobytes())
+
+    def run(self):
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            written = 0
+            while written < len(block):
+                if self.segment_count == self.segment_hands:
+                    self.file.close()
+                    self.file = None
+                    self.segment_index += 1
+                    self.segment_count = 0
+                if self.file is None:
+                    self.open_segment()
+                count = min(len(block) - written, self.segment_hands - self.segment_count)
+                self.file.write(block[written : written + count].tobytes())
+                written += count
+                self.segment_count += count
+            self.file.flush()
+        if self.file is not None:
+            self.file.close()
+
+    def close(self):
+        """
+        Write out everything recorded and stop the writer thread.
+        """
+        self.flush()
+        self.blocks.put(None)
+        self.thread.join()
+
+
+def open_segment(path):
+    """
+    Memory-map a segment's records.
+
+    Args:
+        path (str): The segment file.
+
+    Returns:
+        np.memmap: The HAND_DTYPE records.
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if header[: len(HISTORY_MAGIC)] != HISTORY_MAGIC:
+        raise ValueError(f"{path} is not a hand history segment")
+    record_size = int(np.frombuffer(header[8:12], dtype=np.uint32)[0])
+    if record_size != HAND_DTYPE.itemsize:
+        raise ValueError(f"{path} has {record_size}-byte records, expected {HAND_DTYPE.itemsize}")
+    count = segment_length(path)
+    if count == 0:
+        return np.zeros(0, dtype=HAND_DTYPE)
+    return np.memmap(path, dtype=HAND_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def read_hand_blocks(directory, block_hands=BUFFER_HANDS):
+    """
+    Stream the records of a history directory in blocks.
+
+    Args:
+        directory (str): The history directory.
+        block_hands (int): Records per block.
+
+    Yields:
+        np.ndarray: HAND_DTYPE records, in the order they were written.
+    """
+    for path in segment_files(directory):
+        records = open_segment(path)
+        for start in range(0, len(records), block_hands):
+            yield np.asarray(records[start : start + block_hands])
+
+
+def decode_hand(record):
+    """
+    Expand one record into a readable dict.
+
+    Args:
+        record (np.void): A HAND_DTYPE record.
+
+    Returns:
+        dict: The hand, with cards as strings and actions as
+        (seat, street, action, bet size) tuples.
+    """
+    board = record["board"][record["board"] != NO_CARD]
+    actions = []
+    for packed, bet_size in zip(record["actions"][: record["num_actions"]], record["bet_sizes"]):
+        action = ACTION_NAMES[packed & 3]
+        actions.append((SEATS[packed >> 7], STREETS[packed >> 4 & 3], action, int(bet_size) if action == "bet" else None))
+    return {
+        "hand_id": int(record["hand_id"]),
+        "oop_hand": cards_to_str(record["oop_hand"]),
+        "ip_hand": cards_to_str(record["ip_hand"]),
+        "board": cards_to_str(board),
+        "actions": actions,
+        "pot": float(record["pot"]),
+        "oop_reward": float(record["oop_reward"]),
+        "ip_reward": float(record["ip_reward"]),
+        "showdown": bool(record["flags"] & FLAG_SHOWDOWN),
+        "allin": bool(record["flags"] & FLAG_ALLIN),
+        "truncated": bool(record["flags"] & FLAG_TRUNCATED),
+    }
+
+
+def iter_hands(directory):
+    """
+    Stream decoded hands from a history directory.
+
+    Yields:
+        dict: One hand, see decode_hand.
+    """
+    for block in read_hand_blocks(directory):
+        for record in block:
+            yield decode_hand(record)
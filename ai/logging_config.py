@@ -1,20 +1,82 @@
+import atexit
 import logging
-import sys
+import logging.handlers
 import os
+import queue
+from metrics import timed
 
-def setup_logging():
+# Engine hot paths log through hand_logger with %-style arguments, so messages
+# are only formatted for records that are actually emitted. Records are
+# handed to a background thread through a queue and written to disk there.
+#
+# POKER_HOT_PATH_LOGGING=0 turns per-hand and per-action logs off entirely.
+# POKER_LOG_SAMPLE_RATE=N logs only 1 in N hands (default 1000).
+HOT_PATH_LOGGING = os.environ.get("POKER_HOT_PATH_LOGGING", "1") != "0"
+LOG_SAMPLE_RATE = int(os.environ.get("POKER_LOG_SAMPLE_RATE", "1000"))
+
+hand_logger = logging.getLogger("poker.hand")
+hand_logger.disabled = not HOT_PATH_LOGGING
+
+log_sample_rate = max(1, LOG_SAMPLE_RATE)
+hands_started = 0
+listener = None
+
+
+class TimedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler whose formatting and enqueueing is timed as the "logging" phase.
+    """
+
+    def handle(self, record):
+        with timed("logging"):
+            return super().handle(record)
+
+
+def setup_logging(level=logging.INFO):
+    global listener
+    if listener is not None:
+        return
 
     log_dir = os.path.join(os.path.dirname(__file__), 'logs')
     os.makedirs(log_dir, exist_ok=True)
 
     log_file = os.path.join(log_dir, 'poker_ai.log')
 
-    logging.basicConfig(level=logging.INFO,
-                        format='%(asctime)s - %(levelname)s - %(message)s',
-                        handlers=[
-                            logging.FileHandler("./logs/poker_ai.log", mode='a')
-                        ])
+    file_handler = logging.FileHandler(log_file, mode='a')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    # The file is written by the listener thread, off the training loop
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(TimedQueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def set_log_sample_rate(rate):
+    """
+    Log only 1 in rate hands through hand_logger.
+
+    Args:
+        rate (int): The sampling rate, 1 logs every hand.
+    """
+    global log_sample_rate
+    log_sample_rate = max(1, int(rate))
+
+
+def start_hand_logging():
+    """
+    Enable or disable hand_logger for the hand that is starting.
 
-    # Disable automatic flushing for performance
-    logging.getLogger().handlers[0].flush = lambda: None
-    logging.getLogger().setLevel(logging.INFO)
+    Returns:
+        bool: Whether this hand is logged.
+    """
+    global hands_started
+    sampled = HOT_PATH_LOGGING and hands_started % log_sample_rate == 0
+    hands_started += 1
+    # A disabled logger returns before building a record
+    hand_logger.disabled = not sampled
+    return sampled
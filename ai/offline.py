@@ -0,0 +1,307 @@
+import logging
+import queue
+import threading
+from collections import deque
+import numpy as np
+import torch
+from ai_trainer import Deck, PokerGame
+from metrics import DisabledMetrics
+from hand_history import BUFFER_HANDS, NO_CARD, open_segment, segment_files
+from cards import NUM_CARDS
+
+# Offline training data from recorded hand histories.
+#
+# Hands are replayed through PokerGame with scripted agents that repeat the
+# recorded decisions, so the states and transitions are exactly the ones
+# play_hand produced when the hand was recorded, without running any network.
+# The pipeline is a chain of generators:
+#
+#   history_blocks -> replay_transitions -> shuffle_rows -> minibatches -> prefetch
+#
+# Blocks are drawn in random order from all segment files at once, and rows
+# are mixed again in a shuffle buffer, so minibatches are not dominated by
+# one segment or one stretch of play. prefetch runs the pipeline on a
+# background thread while the learner trains.
+
+SHUFFLE_ROWS = 50_000  # Transitions held in the shuffle buffer
+PREFETCH_BATCHES = 16  # Minibatches prepared ahead of the learner
+SEATS = ("oop", "ip")
+BET_ACTION = 3
+
+
+class ScriptedDeck(Deck):
+    """
+    Deck whose shuffle sets up a recorded deal.
+    """
+
+    def deal_hand(self, oop_hand, ip_hand, board):
+        """
+        Arrange the cards so PokerGame deals the recorded hands and board.
+
+        Args:
+            oop_hand (np.ndarray): OOP's hole cards.
+            ip_hand (np.ndarray): IP's hole cards.
+            board (np.ndarray): The board cards that were dealt.
+        """
+        dealt = np.concatenate((oop_hand, ip_hand, board)).astype(np.uint8)
+        # Cards never dealt in the recorded hand are not known, the rest of the deck is filler
+        rest = np.setdiff1d(np.arange(NUM_CARDS, dtype=np.uint8), dealt)
+        self.next_cards = np.concatenate((dealt, rest))
+
+    def shuffle(self):
+        self.cards = self.next_cards
+        self.position = 0
+
+
+class ScriptedAgent:
+    """
+    Stands in for a DQNAgent, repeating recorded decisions and keeping the transitions it is given.
+    """
+
+    def __init__(self):
+        self.name = None
+        self.decisions = deque()
+        self.transitions = None
+
+    def act(self, state, valid_actions, max_bet, min_bet):
+        action, bet_size = self.decisions.popleft()
+        return action, (float(bet_size) if action == BET_ACTION else None), {"q_values": None, "explored": False}
+
+    def remember_batch(self, states, actions, rewards, next_states, dones):
+        self.transitions = (states, actions, rewards, next_states, dones)
+
+
+class ReplayGame(PokerGame):
+    """
+    PokerGame that deals from a ScriptedDeck instead of a new shuffled deck each hand.
+    """
+
+    def __init__(self, oop_agent, ip_agent):
+        self.scripted_deck = ScriptedDeck()
+        super().__init__()
+        self.oop_agent = oop_agent
+        self.ip_agent = ip_agent
+        # Replayed hands are not live play, and their loss and reward gauges
+        # would overwrite the learner's
+        self.metrics = DisabledMetrics()
+
+    def reset_hands(self):
+        super().reset_hands()
+        self.deck = self.scripted_deck
+
+
+class HandReplayer:
+    """
+    Replays recorded hands through PokerGame.
+    """
+
+    def __init__(self):
+        self.agents = {seat: ScriptedAgent() for seat in SEATS}
+        self.game = ReplayGame(self.agents["oop"], self.agents["ip"])
+        self.replayed = 0
+        self.diverged = 0
+
+    def replay(self, record):
+        """
+        Replay one hand.
+
+        Args:
+            record (np.void): A HAND_DTYPE record.
+
+        Returns:
+            dict or None: (states, actions, rewards, next_states, dones) per
+            seat that acted, or None if the replay did not follow the record.
+        """
+        board = record["board"][record["board"] != NO_CARD]
+        self.game.scripted_deck.deal_hand(record["oop_hand"], record["ip_hand"], board)
+        for agent in self.agents.values():
+            agent.decisions.clear()
+            agent.transitions = None
+        for packed, bet_size in zip(record["actions"][: record["num_actions"]], record["bet_sizes"]):
+            self.agents[SEATS[packed >> 7]].decisions.append((int(packed & 3), int(bet_size)))
+
+        try:
+            _, oop_reward, ip_reward = self.game.play_hand()
+        except IndexError:
+            # A seat was asked for more decisions than were recorded
+            oop_reward = None
+        self.replayed += 1
+        if (
+            oop_reward is None
+            or any(agent.decisions for agent in self.agents.values())
+            or abs(oop_reward - record["oop_reward"]) > 1e-3
+            or abs(ip_reward - record["ip_reward"]) > 1e-3
+        ):
+            self.diverged += 1
+            return None
+        return {seat: agent.transitions for seat, agent in self.agents.items() if agent.transitions is not None}
+
+
+def history_blocks(directory, hands=0, block_hands=BUFFER_HANDS, rng=None):
+    """
+    Yield blocks of records, in random order across all segment files.
+
+    Args:
+        directory (str): The hand history directory.
+        hands (int): Records to yield in total, passing over the data again
+            (in a new order) as needed. 0 makes one pass.
+        block_hands (int): Records per block.
+        rng (np.random.Generator, optional): Random source.
+
+    Yields:
+        np.ndarray: HAND_DTYPE records.
+    """
+    rng = rng or np.random.default_rng()
+    segments = [open_segment(path) for path in segment_files(directory)]
+    blocks = [(i, start) for i, records in enumerate(segments) for start in range(0, len(records), block_hands)]
+    if not blocks:
+        raise ValueError(f"No recorded hands in {directory}")
+
+    remaining = hands or sum(len(records) for records in segments)
+    while remaining > 0:
+        for index in rng.permutation(len(blocks)):
+            segment, start = blocks[index]
+            block = np.asarray(segments[segment][start : start + min(block_hands, remaining)])
+            # Hands within a block are shuffled too
+            yield block[rng.permutation(len(block))]
+            remaining -= len(block)
+            if remaining <= 0:
+                return
+
+
+def replay_transitions(blocks, replayer):
+    """
+    Replay hands into per-seat transition rows.
+
+    Args:
+        blocks (Iterable[np.ndarray]): Blocks of HAND_DTYPE records.
+        replayer (HandReplayer): The replayer.
+
+    Yields:
+        tuple: (seat, state, action, reward, next_state, done).
+    """
+    for block in blocks:
+        for record in block:
+            transitions = replayer.replay(record)
+            if transitions is None:
+                continue
+            for seat, (states, actions, rewards, next_states, dones) in transitions.items():
+                for row in zip(states, actions, rewards, next_states, dones):
+                    yield (seat,) + row
+
+
+def shuffle_rows(rows, buffer_size=SHUFFLE_ROWS, rng=None):
+    """
+    Shuffle a stream through a fixed-size buffer.
+
+    Args:
+        rows (Iterable): The stream.
+        buffer_size (int): Items held at a time; larger mixes more.
+        rng (np.random.Generator, optional): Random source.
+
+    Yields:
+        The items of rows in a shuffled order.
+    """
+    rng = rng or np.random.default_rng()
+    buffer = []
+    for row in rows:
+        if len(buffer) < buffer_size:
+            buffer.append(row)
+            continue
+        # Emit a random held item and keep the new one in its place
+        i = rng.integers(buffer_size)
+        yield buffer[i]
+        buffer[i] = row
+    for i in rng.permutation(len(buffer)):
+        yield buffer[i]
+
+
+def minibatches(rows, batch_size):
+    """
+    Group transition rows into per-seat minibatches.
+
+    Args:
+        rows (Iterable[tuple]): (seat, state, action, reward, next_state, done) rows.
+        batch_size (int): Transitions per minibatch.
+
+    Yields:
+        tuple: (seat, (states, actions, rewards, next_states, dones)) tensors.
+    """
+    pending = {seat: [] for seat in SEATS}
+    for seat, *row in rows:
+        pending[seat].append(row)
+        if len(pending[seat]) == batch_size:
+            states, actions, rewards, next_states, dones = zip(*pending[seat])
+            pending[seat] = []
+            yield seat, (
+                torch.stack(states),
+                torch.tensor(actions, dtype=torch.int64),
+                torch.tensor(rewards, dtype=torch.float32),
+                torch.stack(next_states),
+                torch.tensor(dones, dtype=torch.float32),
+            )
+
+
+def prefetch(items, depth=PREFETCH_BATCHES):
+    """
+    Run a generator on a background thread, keeping up to depth items ready.
+
+    Args:
+        items (Iterable): The generator.
+        depth (int): Items produced ahead of the consumer.
+
+    Yields:
+        The items, in order. An exception in the generator is re-raised here.
+    """
+    ready = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                ready.put(item)
+            ready.put(done)
+        except BaseException as e:
+            ready.put(e)
+
+    thread = threading.Thread(target=produce, name="offline-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue
+        while thread.is_alive():
+            try:
+                ready.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def offline_batches(directory, hands, batch_size, seed=None):
+    """
+    The full offline pipeline.
+
+    Args:
+        directory (str): The hand history directory.
+        hands (int): Recorded hands to replay, 0 for one pass.
+        batch_size (int): Transitions per minibatch.
+        seed (int, optional): Seed of the shuffling.
+
+    Returns:
+        tuple: (iterator of (seat, minibatch), the HandReplayer for its counters).
+    """
+    rng = np.random.default_rng(seed)
+    replayer = HandReplayer()
+    rows = replay_transitions(history_blocks(directory, hands, rng=rng), replayer)
+    logging.info(f"Replaying recorded hands from {directory}")
+    return prefetch(minibatches(shuffle_rows(rows, rng=rng), batch_size)), replayer
@@ -0,0 +1,207 @@
+import argparse
+import io
+import logging
+import os
+import time
+import warnings
+import numpy as np
+import torch
+from agent import DQN, DQNAgent
+
+# Dynamic int8 quantization of saved DQN models for CPU play and evaluation.
+#
+# The nn.Linear weights are stored as int8, per output channel, and
+# activations are quantized on the fly, so no calibration data is needed. fc1
+# stays float: its inputs are raw chip counts and card ranks whose range is
+# too wide for 8 bits, and quantizing it flipped about 10% of greedy actions. The quantized copy is saved as
+# TorchScript next to the float model, <name>_int8.pt, and is loaded with
+# ModelRegistry.load(name, quantized=True).
+#
+# The accuracy harness compares both models over a set of recorded states:
+# agreement of the greedy action, deviation of the bet fraction and Q-values,
+# single-decision latency and serialized size.
+#
+#   python3 ./quantize.py models/oop_dqn_model_20240101_120000.pth --record-hands 500
+
+STATE_SIZE = 7 + (5 * 2) + 2 * 4 * 2
+ACTION_SIZE = 4
+QUANTIZED_SUFFIX = "_int8.pt"
+RECORD_HANDS = 200  # Self-play hands recorded when no state set is given
+LATENCY_SAMPLES = 2000
+QUANTIZED_LAYERS = ("fc2", "fc3", "fc_bet")
+
+
+def quantized_path(model_path):
+    return os.path.splitext(model_path)[0] + QUANTIZED_SUFFIX
+
+
+def quantize_model(model):
+    """
+    Dynamically quantize a DQN's hidden and output layers to int8.
+
+    Args:
+        model (DQN): The float model, left unchanged.
+
+    Returns:
+        torch.jit.ScriptModule: The scripted int8 model, CPU only.
+    """
+    with warnings.catch_warnings():
+        # torch.ao.quantization and torch.jit both warn that they are being superseded
+        warnings.simplefilter("ignore")
+        qconfig = torch.ao.quantization.per_channel_dynamic_qconfig
+        quantized = torch.ao.quantization.quantize_dynamic(
+            copy_to_cpu(model),
+            {layer: qconfig for layer in QUANTIZED_LAYERS},
+            dtype=torch.qint8,
+        )
+        return torch.jit.script(quantized)
+
+
+def copy_to_cpu(model):
+    """
+    Return an eval-mode CPU copy of a DQN.
+    """
+    copy = DQN(STATE_SIZE, ACTION_SIZE)
+    copy.load_state_dict({key: value.cpu() for key, value in model.state_dict().items()})
+    return copy.eval()
+
+
+def load_float_model(model_path):
+    model = DQN(STATE_SIZE, ACTION_SIZE)
+    model.load_state_dict(torch.load(model_path, map_location="cpu", weights_only=True))
+    return model.eval()
+
+
+def record_states(model, hands=RECORD_HANDS):
+    """
+    Record the states both seats act in during self-play with a model.
+
+    Args:
+        model (DQN): The model both seats play with, at minimum exploration.
+        hands (int): Hands to play.
+
+    Returns:
+        np.ndarray: (N, STATE_SIZE) float32 states.
+    """
+    # Imported here so only recording pulls in the game engine
+    from ai_trainer import PokerGame
+
+    agents = []
+    for _ in range(2):
+        agent = DQNAgent(STATE_SIZE, ACTION_SIZE)
+        agent.model.load_state_dict(model.state_dict())
+        # Not fully greedy: two greedy agents can keep betting 0 once both are all in
+        agent.epsilon = agent.epsilon_min
+        agents.append(agent)
+    game = PokerGame(oop_agent=agents[0], ip_agent=agents[1])
+
+    states = []
+    for _ in range(hands):
+        game.play_hand()
+        for agent in agents:
+            states.append(agent.memory.transitions()[0].cpu().numpy())
+            agent.memory.clear()
+    return np.concatenate(states)
+
+
+def serialized_size(model):
+    buffer = io.BytesIO()
+    if isinstance(model, torch.jit.ScriptModule):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            torch.jit.save(model, buffer)
+    else:
+        torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def decision_latency(model, states, samples=LATENCY_SAMPLES):
+    """
+    Time batch-of-one forward passes.
+
+    Returns:
+        tuple: (p50, p99) in microseconds.
+    """
+    latencies = np.empty(samples)
+    with torch.inference_mode():
+        for i in range(samples):
+            state = states[i % len(states)].unsqueeze(0)
+            start = time.perf_counter()
+            model(state)
+            latencies[i] = time.perf_counter() - start
+    return tuple(np.percentile(latencies, (50, 99)) * 1e6)
+
+
+def compare_models(float_model, quantized_model, states):
+    """
+    Accuracy, latency and size of a quantized model against its float model.
+
+    Args:
+        float_model (DQN): The float model on the CPU.
+        quantized_model (torch.jit.ScriptModule): Its quantized copy.
+        states (np.ndarray): (N, STATE_SIZE) recorded states.
+
+    Returns:
+        dict: The report.
+    """
+    states = torch.as_tensor(states, dtype=torch.float32)
+    with torch.inference_mode():
+        float_out = float_model(states)
+        quantized_out = quantized_model(states)
+
+    float_actions = float_out[:, :ACTION_SIZE].argmax(dim=1)
+    quantized_actions = quantized_out[:, :ACTION_SIZE].argmax(dim=1)
+    bet_deviation = (float_out[:, -1] - quantized_out[:, -1]).abs()
+    q_deviation = (float_out[:, :ACTION_SIZE] - quantized_out[:, :ACTION_SIZE]).abs()
+
+    return {
+        "states": len(states),
+        "action_agreement": float((float_actions == quantized_actions).float().mean()),
+        "bet_fraction_mean_abs_error": float(bet_deviation.mean()),
+        "bet_fraction_max_abs_error": float(bet_deviation.max()),
+        "q_value_mean_abs_error": float(q_deviation.mean()),
+        "float_latency_us": decision_latency(float_model, states),
+        "int8_latency_us": decision_latency(quantized_model, states),
+        "float_bytes": serialized_size(float_model),
+        "int8_bytes": serialized_size(quantized_model),
+    }
+
+
+def print_report(report):
+    print(f"States compared:        {report['states']}")
+    print(f"Action agreement:       {report['action_agreement']:.2%}")
+    print(f"Bet fraction error:     mean {report['bet_fraction_mean_abs_error']:.5f}, max {report['bet_fraction_max_abs_error']:.5f}")
+    print(f"Q-value error:          mean {report['q_value_mean_abs_error']:.5f}")
+    print("Latency p50/p99 (us):   float {:.1f}/{:.1f}, int8 {:.1f}/{:.1f}".format(*report["float_latency_us"], *report["int8_latency_us"]))
+    print(f"Size:                   float {report['float_bytes'] / 1024:.0f} KiB, int8 {report['int8_bytes'] / 1024:.0f} KiB")
+
+
+def main(args):
+    torch.set_num_threads(1)
+    float_model = load_float_model(args.model)
+    quantized_model = quantize_model(float_model)
+    output = args.output or quantized_path(args.model)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        torch.jit.save(quantized_model, output)
+    print(f"Saved int8 model: {output}")
+
+    if args.states:
+        states = np.load(args.states)
+    else:
+        logging.disable(logging.INFO)
+        states = record_states(float_model, args.record_hands)
+        logging.disable(logging.NOTSET)
+        if args.save_states:
+            np.save(args.save_states, states)
+    print_report(compare_models(float_model, quantized_model, states))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantize a DQN model to int8 and compare it with the float model")
+    parser.add_argument("model", type=str, help="Path of the float .pth model")
+    parser.add_argument("--output", type=str, default=None, help="Path of the int8 model (default <model>_int8.pt)")
+    parser.add_argument("--states", type=str, default=None, help="Recorded states (.npy) to compare on")
+    parser.add_argument("--record-hands", type=int, default=RECORD_HANDS, help="Self-play hands to record states from when --states is not given")
+    parser.add_argument("--save-states", type=str, default=None, help="Save the recorded states (.npy) for later runs")
+    main(parser.parse_args())
@@ -5,8 +5,8 @@ import torch.nn as nn
 import torch.optim as optim
 import torch.cuda
 import random
-from collections import deque
-from metrics import q_value, epsilon, action_taken, bet_size_metric
+from replay_buffer import ReplayBuffer, PrioritizedReplayBuffer, MemmapReplayBuffer
+from metrics import q_value, epsilon, action_taken, bet_size_metric, metrics_accumulator, timed
 
 
 class DQN(nn.Module):
@@ -64,31 +64,45 @@ class DQNAgent:
     for stable learning.
     """
 
-    def __init__(self, state_size, action_size):
+    def __init__(self, state_size, action_size, prioritized=False, replay_path=None, replay_capacity=10000):
         """
         Initialize the DQN Agent.
 
         Args:
             state_size (int): The size of the state space.
             action_size (int): The number of possible actions.
+            prioritized (bool): Sample replay memory in proportion to TD error
+                instead of uniformly.
+            replay_path (Optional[str]): Directory of a disk-backed replay store,
+                reopened if it already exists.
+            replay_capacity (int): Maximum number of transitions remembered.
         """
         self.name = ""
         self.state_size = state_size  # Dimension of poker game state (cards, pot, etc.)
         self.action_size = action_size  # Number of possible actions (fold, call, raise)
         self.batch_size = 128
-        self.memory = deque(maxlen=10000)  # Experience replay buffer, crucial for stable learning in poker
         self.gamma = 0.95    # Discount rate for future rewards, important for long-term strategy
         self.epsilon = 1.0   # Start with 100% exploration to learn diverse poker situations
         self.epsilon_min = 0.01  # Minimum exploration to always adapt to opponent's strategy
         self.epsilon_decay = 0.995  # Gradually reduce exploration to exploit learned poker knowledge
         self.learning_rate = 0.001  # Small learning rate for stable improvement of poker strategy
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")  # GPU acceleration for faster learning
+        # Experience replay buffer, crucial for stable learning in poker. The
+        # prioritized variant replays rare high-error spots (big pots, all-ins) more often
+        if replay_path and prioritized:
+            raise ValueError("Prioritized replay is not supported with a disk-backed replay store")
+        if replay_path:
+            self.memory = MemmapReplayBuffer(replay_path, replay_capacity, state_size, self.device)
+        else:
+            replay_buffer = PrioritizedReplayBuffer if prioritized else ReplayBuffer
+            self.memory = replay_buffer(replay_capacity, state_size, self.device)
         self.model = DQN(state_size, action_size).to(self.device)  # Main network for action selection
         self.target_model = DQN(state_size, action_size).to(self.device)  # Target network for stable Q-learning
         self.optimizer = optim.Adam(self.model.parameters(), lr=self.learning_rate)  # Adam optimizer works well for poker's noisy rewards
         self.min_bet = 2
         self.ev_weight = 0.5
 
+    @timed("remember")
     def remember(self, state, action, reward, next_state, done):
         """
         Store a transition in the replay memory.
@@ -103,14 +117,27 @@ class DQNAgent:
             done (bool): Whether the episode has ended.
         """
         # Store experiences to learn from diverse poker situations
-        state = torch.FloatTensor(state).to(self.device) if not isinstance(state, torch.Tensor) else state.to(self.device)
-        next_state = torch.FloatTensor(next_state).to(self.device) if not isinstance(next_state, torch.Tensor) else next_state.to(self.device)
-        action = torch.LongTensor([action]).to(self.device)
-        reward = torch.FloatTensor([reward]).to(self.device)
-        done = torch.FloatTensor([done]).to(self.device)
+        state = torch.as_tensor(state, dtype=torch.float32, device=self.device)
+        next_state = torch.as_tensor(next_state, dtype=torch.float32, device=self.device)
+        self.memory.add(state, action, reward, next_state, done)
+
+    @timed("remember")
+    def remember_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Store a batch of transitions in the replay memory.
 
-        self.memory.append((state, action, reward, next_state, done))
+        Args:
+            states (torch.Tensor): (N, state_size) states.
+            actions (Sequence[int]): The actions taken.
+            rewards (Sequence[float]): The rewards received.
+            next_states (torch.Tensor): (N, state_size) resulting states.
+            dones (Sequence[bool]): Whether each episode has ended.
+        """
+        self.memory.add_batch(
+            *(torch.as_tensor(t, dtype=torch.float32, device=self.device) for t in (states, actions, rewards, next_states, dones))
+        )
 
+    @timed("act")
     def act(self, state, valid_actions, max_bet, min_bet):
         """
         Choose an action using an epsilon-greedy policy.
@@ -124,42 +151,84 @@ class DQNAgent:
             min_bet (float): Minimum allowed bet size.
 
         Returns:
-            Tuple[int, Optional[float]]: The chosen action and bet size (if applicable).
+            Tuple[int, Optional[float], Dict]: The chosen action, the bet size (if applicable)
+            and diagnostics from the forward pass that chose it: the raw network output
+            "q_values", "max_q" over the valid actions and whether the action was "explored".
+            Callers use these instead of running the network again.
         """
         state_tensor = torch.FloatTensor(state).unsqueeze(0).to(self.device)
         with torch.no_grad():
-            q_values = self.model(state_tensor)
+            q_values = self.model(state_tensor)[0].cpu().numpy()
 
         action_map = {"fold": 0, "check": 1, "call": 2, "bet": 3}
         valid_action_indices = [action_map[action] for action in valid_actions]
-        
-        if not isinstance(state, torch.Tensor):
-            state = torch.FloatTensor(state).to(self.device)
-        elif state.device != self.device:
-            state = state.to(self.device)
-        if np.random.rand() <= self.epsilon:
+
+        explored = np.random.rand() <= self.epsilon
+        if explored:
             # Exploration: randomly try actions to discover new poker strategies
             action = random.choice(valid_action_indices)
         else:
-            combined_values = q_values[0, self.action_size] + self.ev_weight * q_values[0, -self.action_size:]
+            # Exploitation: choose best action based on learned Q-values and EVs
+            combined_values = q_values[self.action_size] + self.ev_weight * q_values[-self.action_size:]
             valid_values = combined_values[valid_action_indices]
-            action = valid_action_indices[valid_values.argmax().item()]
+            action = valid_action_indices[valid_values.argmax()]
 
+        player = 'oop' if self.name == 'OOP' else 'ip'
         bet_size = None
         if action == 3 and "bet" in valid_actions:
-            bet_fraction = q_values[0, self.action_size].item()
+            bet_fraction = float(q_values[self.action_size])
             bet_size = max(min_bet, min(min_bet + bet_fraction * (max_bet - min_bet), max_bet))
             bet_size = round(bet_size, 0)
-            bet_size_metric.labels(player='oop' if self.name == 'OOP' else 'ip', street="agent_decision").observe(bet_size)  
+            metrics_accumulator.observe(bet_size_metric, bet_size, player=player, street="agent_decision")
+
+        max_q = float(q_values[valid_action_indices].max())
+        metrics_accumulator.set(q_value, max_q, player=player)
+        metrics_accumulator.set(epsilon, self.epsilon, player=player)
 
+        diagnostics = {"q_values": q_values, "max_q": max_q, "explored": explored}
+        return action, bet_size, diagnostics
 
-        max_q_values = q_values[0, valid_action_indices].max().item()
-        q_value.labels(player='oop' if self.name == 'OOP' else 'ip').set(max_q_values)
-        epsilon.labels(player='oop' if self.name == 'OOP' else 'ip').set(self.epsilon)
-        # Exploitation: choose best action based on learned Q-values
-        ##print(f"ABOUT TO RETURN BET SIZE: {bet_size}")
-        return action, bet_size
+    @timed("act_batch")
+    def act_batch(self, states, valid_mask, max_bets, min_bets):
+        """
+        Choose actions for a batch of states with a single forward pass.
 
+        Actions and bet sizes are chosen as in act, but for every row at once.
+
+        Args:
+            states (torch.Tensor): (N, state_size) encoded states.
+            valid_mask (torch.Tensor): (N, action_size) boolean mask of valid actions.
+            max_bets (torch.Tensor): (N,) maximum bet for each state.
+            min_bets (torch.Tensor): (N,) minimum bet for each state.
+
+        Returns:
+            tuple: (actions, bet_sizes) tensors of shape (N,), left on the agent's
+            device so a tensor environment never copies them back to the host.
+        """
+        states = states.to(self.device)
+        valid_mask = valid_mask.to(self.device)
+        max_bets = max_bets.to(self.device)
+        min_bets = min_bets.to(self.device)
+        with torch.no_grad():
+            q_values = self.model(states)
+
+        # Exploitation: best valid action by learned Q-values and EVs
+        combined_values = q_values[:, self.action_size:self.action_size + 1] + self.ev_weight * q_values[:, -self.action_size:]
+        actions = combined_values.masked_fill(~valid_mask, float("-inf")).argmax(dim=1)
+
+        # Exploration: a uniformly random valid action for each exploring row
+        explore = torch.rand(len(states), device=self.device) <= self.epsilon
+        if explore.any():
+            actions[explore] = torch.multinomial(valid_mask[explore].float(), 1).squeeze(1)
+
+        bet_fraction = q_values[:, self.action_size]
+        bet_sizes = torch.maximum(torch.minimum(min_bets + bet_fraction * (max_bets - min_bets), max_bets), min_bets)
+        bet_sizes = torch.where(actions == 3, torch.round(bet_sizes), torch.zeros_like(bet_sizes))
+
+        metrics_accumulator.set(epsilon, self.epsilon, player='oop' if self.name == 'OOP' else 'ip')
+        return actions, bet_sizes
+
+    @timed("replay")
     def replay(self, batch_size):
         """
         Train the model using experiences from the replay memory.
@@ -176,15 +245,8 @@ class DQNAgent:
         if len(self.memory) < self.batch_size:
             return
 
-        minibatch = random.sample(self.memory, self.batch_size)  # Random sampling breaks correlation between consecutive hands
-        states, actions, rewards, next_states, dones = zip(*minibatch)
-
-        # Convert to tensors for batch processing
-        states = torch.stack(states)
-        actions = torch.LongTensor(actions).to(self.device)
-        rewards = torch.FloatTensor(rewards).to(self.device)
-        next_states = torch.stack(next_states)
-        dones = torch.FloatTensor(dones).to(self.device)
+        # Random sampling breaks correlation between consecutive hands
+        (states, actions, rewards, next_states, dones), indices, weights = self.memory.sample_weighted(self.batch_size)
 
         # Compute current Q-values and target Q-values
         current_output = self.model(states)
@@ -196,15 +258,19 @@ class DQNAgent:
             next_q = next_output[:, :self.action_size]
             target_q = rewards + (1 - dones) * self.gamma * torch.max(next_q, dim=1)[0]
 
-        # Compute Losses
-        q_loss = nn.MSELoss()(current_q.gather(1, actions.unsqueeze(1)).squeeze(), target_q)
-        ev_loss = nn.MSELoss()(current_ev.gather(1, actions.unsqueeze(1)).squeeze(), rewards)
+        # Compute Losses, weighted to correct for prioritized sampling
+        td_errors = target_q - current_q.gather(1, actions.unsqueeze(1)).squeeze(1)
+        ev_errors = rewards - current_ev.gather(1, actions.unsqueeze(1)).squeeze(1)
+        q_loss = (weights * td_errors ** 2).mean()
+        ev_loss = (weights * ev_errors ** 2).mean()
         total_loss = q_loss + ev_loss
 
         # MSE loss helps the model learn to accurately predict action values in poker
         self.optimizer.zero_grad()
         total_loss.backward()
         self.optimizer.step()
+        metrics_accumulator.end_learner_step()
+        self.memory.update_priorities(indices, td_errors)
 
         # Decay epsilon to gradually shift from exploration to exploitation
         if self.epsilon > self.epsilon_min:
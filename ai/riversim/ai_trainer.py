@@ -5,7 +5,9 @@ import logging
 import numpy as np
 from agent import DQNAgent
 from phevaluator import evaluate_omaha_cards
-from logging_config import setup_logging
+from logging_config import setup_logging, hand_logger, start_hand_logging
+from cards import NUM_CARDS, CARD_ENCODING, cards_to_str, encode_cards
+from scenario_bank import OOP_WINS, IP_WINS, SPLIT_POT
 import torch
 from metrics import (
     episode_reward,
@@ -20,6 +22,8 @@ from metrics import (
     loss,
     bet_size_metric,
     update_bet_size,
+    metrics_accumulator,
+    timed,
 )
 
 CONST_100bb = 200
@@ -39,7 +43,7 @@ class Player:
         players (list): A class variable to keep track of all players.
         name (str): The name of the player.
         chips (int): The number of chips the player has.
-        hand (list): The player's current hand of cards.
+        hand (np.ndarray): The player's current hand as uint8 card ids.
     """
 
     players = []
@@ -55,7 +59,7 @@ class Player:
         Player.players.append(self)
         self.name: str = name
         self.chips: int = chips
-        self.hand: List[str] = []
+        self.hand: np.ndarray = np.empty(0, dtype=np.uint8)
 
     @classmethod
     def get_players(cls):
@@ -69,7 +73,8 @@ class Player:
 
     def reset_hands(self):
         """Reset the hands of all players."""
-        [player.hand.clear() for player in Player.get_players()]
+        for player in Player.get_players():
+            player.hand = np.empty(0, dtype=np.uint8)
 
     def reset_chips(self):
         """Reset the chips of all players to the initial amount."""
@@ -95,6 +100,7 @@ class HumanPlayer(Player):
         Returns:
             str or tuple: The chosen action, or a tuple of action and bet size if betting.
         """
+        print(f"Your hand: {cards_to_str(self.hand)}")
         print(f"Valid actions: {valid_actions}")
         print(f"Maximum Bet: {max_bet}")
         while True:
@@ -112,23 +118,34 @@ class Deck:
     Represents a deck of cards in the poker game.
 
     Attributes:
-        cards (list): A list of all cards in the deck.
+        cards (np.ndarray): The 52 card ids (see cards.py) in deal order.
+        position (int): Index of the next card to deal.
     """
 
     def __init__(self):
         """Initialize a new deck with all 52 cards."""
-        # fmt: off
-        self.cards = [
-            "2c", "3c", "4c", "5c", "6c", "7c", "8c", "9c", "Tc", "Jc", "Qc", "Kc", "Ac", 
-            "2d", "3d", "4d", "5d", "6d", "7d", "8d", "9d", "Td", "Jd", "Qd", "Kd", "Ad", 
-            "2h", "3h", "4h", "5h", "6h", "7h", "8h", "9h", "Th", "Jh", "Qh", "Kh", "Ah", 
-            "2s", "3s", "4s", "5s", "6s", "7s", "8s", "9s", "Ts", "Js", "Qs", "Ks", "As",
-        ]
-        # fmt: on
+        self.cards = np.arange(NUM_CARDS, dtype=np.uint8)
+        self.position = 0
 
     def shuffle(self):
-        """Shuffle the deck using a cryptographically secure random number generator."""
-        secrets.SystemRandom().shuffle(self.cards)
+        """Shuffle the deck with a generator seeded from a cryptographically secure source."""
+        rng = np.random.default_rng(secrets.randbits(128))
+        self.cards = rng.permutation(NUM_CARDS).astype(np.uint8)
+        self.position = 0
+
+    def deal(self, num_cards):
+        """
+        Deal the next cards from the deck.
+
+        Args:
+            num_cards (int): The number of cards to deal.
+
+        Returns:
+            np.ndarray: The dealt card ids.
+        """
+        cards = self.cards[self.position : self.position + num_cards]
+        self.position += num_cards
+        return cards
 
 
 class PokerGame:
@@ -143,7 +160,7 @@ class PokerGame:
         ip_player (Player): The in-position player.
         oop_agent (DQNAgent): The DQN agent for the out-of-position player.
         ip_agent (DQNAgent): The DQN agent for the in-position player.
-        community_cards (list): The community cards on the table.
+        community_cards (np.ndarray): The community cards on the table as uint8 card ids.
         pot (int): The current pot size.
         current_bet (int): The current bet amount.
         num_actions (int): The number of actions taken in the current hand.
@@ -155,7 +172,7 @@ class PokerGame:
         is_allin (bool): Whether a player has gone all-in.
     """
 
-    def __init__(self, human_position=None, oop_agent=None, ip_agent=None):
+    def __init__(self, human_position=None, oop_agent=None, ip_agent=None, scenario_bank=None):
         """
         Initialize a new poker game.
 
@@ -163,8 +180,11 @@ class PokerGame:
             human_position (str, optional): The position of the human player ('oop' or 'ip').
             oop_agent (DQNAgent, optional): A pre-initialized agent for the OOP player.
             ip_agent (DQNAgent, optional): A pre-initialized agent for the IP player.
+            scenario_bank (ScenarioBank, optional): Precomputed river spots to play instead of dealing new ones.
         """
         self.deck = Deck()
+        self.scenario_bank = scenario_bank
+        self.showdown_winner = None
 
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
@@ -178,11 +198,19 @@ class PokerGame:
             self.oop_player = Player(name="OOP", chips=200)
             self.ip_player = Player(name="IP", chips=200)
 
-        self.initialize_game_state()
-
         self.state_size = 7 + (5 * 2) + (2 * 4 * 2)
         self.action_size = 4  # check, call, bet, fold
 
+        # The state encoding is written in place into one preallocated buffer.
+        # Board and hand slots change only when cards are dealt, the first 7
+        # floats are refreshed at each decision.
+        self.state_buffer = np.zeros(self.state_size, dtype=np.float32)
+        self.state_tensor = torch.from_numpy(self.state_buffer)
+        self.oop_hand_encoding = np.zeros(8, dtype=np.float32)
+        self.ip_hand_encoding = np.zeros(8, dtype=np.float32)
+
+        self.initialize_game_state()
+
         # Initialize DQN agents
         if oop_agent:
             self.oop_agent = oop_agent
@@ -209,7 +237,7 @@ class PokerGame:
 
     def initialize_game_state(self):
         """Initialize or reset the game state to start a new hand."""
-        self.community_cards = []
+        self.community_cards = np.empty(0, dtype=np.uint8)
         self.hand_over = False
         self.current_bet = 0
         self.num_actions = 0
@@ -223,7 +251,8 @@ class PokerGame:
     def deal_cards(self):
         """Deal cards to both players."""
         for player in [self.oop_player, self.ip_player]:
-            player.hand = [self.deck.cards.pop() for _ in range(4)]
+            player.hand = self.deck.deal(4)
+        self.update_card_encoding()
 
     def start_new_hand(self):
         """
@@ -250,6 +279,9 @@ class PokerGame:
         """
         self.initialize_game_state()
         self.reset_hands()
+        if self.scenario_bank is not None:
+            return self.start_bank_scenario(self.scenario_bank.sample())
+        self.showdown_winner = None
         self.deck.shuffle()
         self.pot = random.randrange(4,396, 4)
         player_chips = int((400 - self.pot) / 2)
@@ -261,6 +293,31 @@ class PokerGame:
         self.deal_cards()
         return self.get_game_state()
 
+    def start_bank_scenario(self, spot):
+        """
+        Set up a river scenario from a precomputed spot.
+
+        The deck is arranged to deal the spot's hands and board, and the
+        showdown winner is taken from the spot instead of evaluated.
+
+        Args:
+            spot (np.void): A SPOT_DTYPE record, see scenario_bank.py.
+
+        Returns:
+            dict: The initial game state for the river scenario.
+        """
+        self.deck.cards = np.concatenate((spot["oop_hand"], spot["ip_hand"], spot["board"]))
+        self.deck.position = 0
+        self.pot = int(spot["pot"])
+        self.oop_player.chips = int(spot["oop_stack"])
+        self.ip_player.chips = int(spot["ip_stack"])
+        committed = self.pot / 2
+        self.ip_committed = committed
+        self.oop_committed = committed
+        self.showdown_winner = int(spot["winner"])
+        self.deal_cards()
+        return self.get_game_state()
+
     def play_hand(self):
         """
         Play a complete hand of poker.
@@ -268,7 +325,8 @@ class PokerGame:
         Returns:
             tuple: A tuple containing the final game state, OOP reward, and IP reward.
         """
-        logging.info("Starting new hand")
+        start_hand_logging()
+        hand_logger.info("Starting new hand")
         print("Starting new hand")
         game_state = self.start_new_river_scenario()
 
@@ -287,25 +345,30 @@ class PokerGame:
 
         final_state = self.get_state_representation()
         oop_reward, ip_reward = self.calculate_rewards(game_state)
-        logging.info(f"OOP Reward: {oop_reward}")
-        logging.info(f"IP Reward: {ip_reward}")
-
-        for state, action, valid_actions, bet_size, max_bet in oop_experiences:
-            self.oop_agent.remember(state, action, oop_reward, final_state, True)
-        for state, action, valid_actions, bet_size, max_bet in ip_experiences:
-            self.ip_agent.remember(state, action, ip_reward, final_state, True)
-
-        loss.labels(player="oop").set(self.oop_loss if self.oop_loss is not None else 0)
-        loss.labels(player="ip").set(self.ip_loss if self.ip_loss is not None else 0)
-
-        episode_reward.labels(player="oop").set(oop_reward)
-        episode_reward.labels(player="ip").set(ip_reward)
-
-        player_chips.labels(player="oop").set(self.oop_player.chips)
-        player_chips.labels(player="ip").set(self.ip_player.chips)
-        pot_size.set(self.pot)
-        community_cards.set(len(self.community_cards))
-        episodes_completed.inc()
+        hand_logger.info("OOP Reward: %s", oop_reward)
+        hand_logger.info("IP Reward: %s", ip_reward)
+
+        for agent, experiences, reward in (
+            (self.oop_agent, oop_experiences, oop_reward),
+            (self.ip_agent, ip_experiences, ip_reward),
+        ):
+            if experiences:
+                states, actions, valid_actions, bet_sizes, max_bets = zip(*experiences)
+                n = len(states)
+                agent.remember_batch(torch.stack(states), actions, [reward] * n, final_state.expand(n, -1), [True] * n)
+
+        metrics_accumulator.set(loss, self.oop_loss if self.oop_loss is not None else 0, player="oop")
+        metrics_accumulator.set(loss, self.ip_loss if self.ip_loss is not None else 0, player="ip")
+
+        metrics_accumulator.set(episode_reward, oop_reward, player="oop")
+        metrics_accumulator.set(episode_reward, ip_reward, player="ip")
+
+        metrics_accumulator.set(player_chips, self.oop_player.chips, player="oop")
+        metrics_accumulator.set(player_chips, self.ip_player.chips, player="ip")
+        metrics_accumulator.set(pot_size, self.pot)
+        metrics_accumulator.set(community_cards, len(self.community_cards))
+        metrics_accumulator.inc(episodes_completed)
+        metrics_accumulator.end_hand()
 
         return game_state, oop_reward, ip_reward
 
@@ -314,15 +377,16 @@ class PokerGame:
         Get the hand of the human player, if any.
 
         Returns:
-            list or None: The hand of the human player, or None if no human player.
+            list or None: The hand of the human player as card strings, or None if no human player.
         """
         if isinstance(self.oop_player, HumanPlayer):
-            return self.oop_player.hand
+            return cards_to_str(self.oop_player.hand)
         elif isinstance(self.ip_player, HumanPlayer):
-            return self.ip_player.hand
+            return cards_to_str(self.ip_player.hand)
         else:
             return None
 
+    @timed("showdown")
     def determine_showdown_winner(self):
         """
         Determine the winner of the hand at showdown.
@@ -330,24 +394,19 @@ class PokerGame:
         Returns:
             dict: The updated game state after determining the winner.
         """
-        logging.info("Determining Showdown Winner")
-        print(f"\nIP Tables: {self.ip_player.hand}")
-        print(f"\nOOP Tables: {self.oop_player.hand}\n")
+        hand_logger.info("Determining Showdown Winner")
+        print(f"\nIP Tables: {cards_to_str(self.ip_player.hand)}")
+        print(f"\nOOP Tables: {cards_to_str(self.oop_player.hand)}\n")
         updated_state = self.get_game_state()
-        # fmt: off
-        ip_rank = evaluate_omaha_cards(
-            self.community_cards[0], self.community_cards[1], self.community_cards[2], self.community_cards[3], self.community_cards[4],
-            self.ip_player.hand[0], self.ip_player.hand[1], self.ip_player.hand[2], self.ip_player.hand[3],
-        )
-        oop_rank = evaluate_omaha_cards(
-            self.community_cards[0], self.community_cards[1], self.community_cards[2], self.community_cards[3], self.community_cards[4],
-            self.oop_player.hand[0], self.oop_player.hand[1], self.oop_player.hand[2], self.oop_player.hand[3],
-        )
-        # fmt: on
+        winner = self.showdown_winner
+        if winner is None:
+            ip_rank = self.get_hand_strength(self.ip_player.hand)
+            oop_rank = self.get_hand_strength(self.oop_player.hand)
+            winner = IP_WINS if ip_rank < oop_rank else (OOP_WINS if oop_rank < ip_rank else SPLIT_POT)
 
-        if ip_rank < oop_rank:
+        if winner == IP_WINS:
             updated_state["ip_player"]["chips"] += self.pot
-        elif oop_rank < ip_rank:
+        elif winner == OOP_WINS:
             updated_state["oop_player"]["chips"] += self.pot
         else:
             updated_state["ip_player"]["chips"] += self.pot / 2
@@ -384,7 +443,7 @@ class PokerGame:
         Returns:
             tuple: A tuple containing the updated game state and the experiences of both players.
         """
-        logging.info("Dealing flop")
+        hand_logger.info("Dealing flop")
         self.deal_community_cards(3)
         return self.postflop_betting(street="flop")
 
@@ -395,7 +454,7 @@ class PokerGame:
         Returns:
             tuple: A tuple containing the updated game state and the experiences of both players.
         """
-        logging.info("Dealing Turn")
+        hand_logger.info("Dealing Turn")
         self.deal_community_cards(1)
         return self.postflop_betting(street="turn")
 
@@ -406,7 +465,7 @@ class PokerGame:
         Returns:
             tuple: A tuple containing the updated game state and the experiences of both players.
         """
-        logging.info("Dealing River")
+        hand_logger.info("Dealing River")
         self.deal_community_cards(1)
         return self.postflop_betting(street="river")
 
@@ -417,18 +476,20 @@ class PokerGame:
         Args:
             num_cards (int): The number of cards to deal.
         """
-        self.community_cards.extend([self.deck.cards.pop() for _ in range(num_cards)])
+        self.community_cards = np.concatenate((self.community_cards, self.deck.deal(num_cards)))
+        self.state_buffer[7:17] = encode_cards(self.community_cards, 5)
 
     def reset_hands(self):
         """
         Reset the game state for a new hand, including the deck, community cards, and player hands.
         """
-        logging.info("Resetting Hands")
+        hand_logger.info("Resetting Hands")
         self.deck = Deck()
-        self.community_cards = []
+        self.community_cards = np.empty(0, dtype=np.uint8)
         self.pot = 0
-        self.oop_player.hand = []
-        self.ip_player.hand = []
+        self.oop_player.hand = np.empty(0, dtype=np.uint8)
+        self.ip_player.hand = np.empty(0, dtype=np.uint8)
+        self.update_card_encoding()
         self.current_bet = 0
         self.num_actions = 0
         self.last_action = None
@@ -475,7 +536,7 @@ class PokerGame:
         """
         return {
             "pot": self.pot,
-            "community_cards": self.community_cards,
+            "community_cards": cards_to_str(self.community_cards),
             "current_player": self.current_player.name,
             "current_bet": self.current_bet,
             "last_action": self.last_action,
@@ -503,14 +564,30 @@ class PokerGame:
         """
         return {
             "oop_player": {
-                "hand": self.oop_player.hand,
+                "hand": cards_to_str(self.oop_player.hand),
             },
             "ip_player": {
-                "hand": self.ip_player.hand,
+                "hand": cards_to_str(self.ip_player.hand),
             },
         }
 
-    def get_player_action(self, valid_actions, max_bet, min_bet):
+    def format_game_state(self, state):
+        """
+        Convert the cards in a game state to strings for logs and display.
+
+        Args:
+            state (dict): A game state from get_game_state.
+
+        Returns:
+            dict: A copy of the state with card ids replaced by card strings.
+        """
+        formatted = dict(state)
+        formatted["community_cards"] = cards_to_str(state["community_cards"])
+        for player in ("oop_player", "ip_player"):
+            formatted[player] = dict(state[player], hand=cards_to_str(state[player]["hand"]))
+        return formatted
+
+    def get_player_action(self, valid_actions, max_bet, min_bet, state=None):
         """
         Get the action for the current player, either from a human player or an AI agent.
 
@@ -518,35 +595,35 @@ class PokerGame:
             valid_actions (list): A list of valid actions for the current player.
             max_bet (int): The maximum bet amount allowed.
             min_bet (int): The minimum bet amount allowed.
+            state (Optional[torch.FloatTensor]): The already encoded state. If None, it is encoded here.
 
         Returns:
             str or tuple: The chosen action, or a tuple of the action and bet size for betting actions.
         """
-        logging.info(f"Getting {self.current_player.name}'s Action: ({valid_actions})")
+        hand_logger.info("Getting %s's Action: (%s)", self.current_player.name, valid_actions)
         if isinstance(self.current_player, HumanPlayer):
             return self.current_player.get_action(valid_actions, max_bet)
         else:
-            state = self.get_state_representation(current_player=self.current_player)
+            if state is None:
+                state = self.encode_state(self.current_player)
             if self.current_player == self.oop_player:
-                action, bet_size = self.oop_agent.act(state, valid_actions, max_bet, min_bet)
+                action, bet_size, diagnostics = self.oop_agent.act(state, valid_actions, max_bet, min_bet)
                 player = "oop"
-                agent = self.oop_agent
             else:
-                action, bet_size = self.ip_agent.act(state, valid_actions, max_bet, min_bet)
+                action, bet_size, diagnostics = self.ip_agent.act(state, valid_actions, max_bet, min_bet)
                 player = "ip"
-                agent = self.ip_agent
 
             action_map = {0: "fold", 1: "check", 2: "call", 3: "bet"}
             chosen_action = action_map[action]
 
-            q_value.labels(player).set(np.max(agent.model(state.to(agent.device)).cpu().data.numpy()))
-            epsilon.labels(player).set(agent.epsilon)
+            # The agent records its Q-value and epsilon gauges from the forward pass it already ran
+            hand_logger.info("Q-values: %s (explored: %s)", diagnostics["q_values"], diagnostics["explored"])
             print(f"Player: {player}\nAction: {chosen_action}")
-            action_taken.labels(player_action=f"{player}_{chosen_action}").inc()
+            metrics_accumulator.inc(action_taken, player_action=f"{player}_{chosen_action}")
 
         if chosen_action == "bet":
-            logging.info(f"Bet size: {bet_size}")
-            logging.info(f"Bet Max: {max_bet}")
+            hand_logger.info("Bet size: %s", bet_size)
+            hand_logger.info("Bet Max: %s", max_bet)
             return chosen_action, min(bet_size, max_bet)
         return chosen_action
 
@@ -574,9 +651,7 @@ class PokerGame:
             int: The maximum bet size allowed.
         """
         max_bet = 0
-        state = self.get_game_state()
-
-        current_bet = state["current_bet"]
+        current_bet = self.current_bet
         player_chips = self.current_player.chips
 
         if current_bet == 0:
@@ -587,6 +662,7 @@ class PokerGame:
 
         return min(max_bet, player_chips)
 
+    @timed("postflop_betting")
     def postflop_betting(self, street):
         """
         Handle the postflop betting round for a given street (flop, turn, or river).
@@ -597,7 +673,7 @@ class PokerGame:
         Returns:
             tuple: A tuple containing the updated game state and the experiences of both players.
         """
-        logging.info("Starting Postflop Betting")
+        hand_logger.info("Starting Postflop Betting")
         state = self.get_game_state()
         initial_pot = state["pot"]
         self.current_bet = 0
@@ -610,15 +686,13 @@ class PokerGame:
         ip_experiences = []
 
         while True:
-            state = self.get_game_state()
-            state_representation = self.get_state_representation()
-
-            logging.info(f"Current State: {state}")
-            print(f"\nCommunity Cards: {state['community_cards']}")
+            if hand_logger.isEnabledFor(logging.INFO):
+                hand_logger.info("Current State: %s", self.format_game_state(self.get_game_state()))
+            print(f"\nCommunity Cards: {cards_to_str(self.community_cards)}")
             print(f"Your Hand: {self.get_player_hand()}")
-            print( f"IP Chips: {state[self.ip_player.name.lower() + '_player']['chips']}")
-            print( f"OOP Chips: {state[self.oop_player.name.lower() + '_player']['chips']}")
-            print(f"Pot: {state['pot']}")
+            print( f"IP Chips: {self.ip_player.chips}")
+            print( f"OOP Chips: {self.oop_player.chips}")
+            print(f"Pot: {self.pot}")
 
             if self.hand_over or self.num_active_players == 1:
                 self.current_player.chips += self.pot
@@ -635,15 +709,16 @@ class PokerGame:
                 return game_state, (oop_experiences, ip_experiences)
 
             valid_actions, min_bet = self.get_valid_postflop_actions()
-            print(f"{state['current_player']} Valid Actions: {valid_actions}")
+            print(f"{self.current_player.name} Valid Actions: {valid_actions}")
             max_bet = self.calculate_max_postflop_bet_size(initial_pot)
-            print(f"{state['current_player']} max Bet: {max_bet}")
-            action = self.get_player_action(valid_actions, max_bet, min_bet)
+            print(f"{self.current_player.name} max Bet: {max_bet}")
+            state_representation = self.get_state_representation(current_player=self.current_player)
+            action = self.get_player_action(valid_actions, max_bet, min_bet, state_representation)
 
             if isinstance(action, tuple):
                 action, bet_size = action
                 print(f"Action: {action} Bet Size: {bet_size}")
-                logging.info(f"Received bet size: {bet_size}")
+                hand_logger.info("Received bet size: %s", bet_size)
             else:
                 bet_size = None
             action_int = self.action_to_int(action)
@@ -672,7 +747,7 @@ class PokerGame:
             action (str): The action taken by the player.
             bet_size (Optional[int]): The size of the bet, if applicable.
         """
-        logging.info(f"Processing Postflop Action: {action}")
+        hand_logger.info("Processing Postflop Action: %s", action)
 
         if action == "check":
             self.handle_postflop_check()
@@ -711,30 +786,28 @@ class PokerGame:
         Args:
             bet_size (int): The size of the bet.
         """
-        logging.info(
-            f"Handling postflop bet of {bet_size} for {self.current_player.name}"
-        )
+        hand_logger.info("Handling postflop bet of %s for %s", bet_size, self.current_player.name)
 
         if self.current_player.name == self.ip_player.name:
             self.current_player.chips -= bet_size
             self.pot += bet_size
             self.ip_committed += bet_size
             self.current_bet = bet_size
-            bet_size_metric.labels(player="ip", street="postflop").observe(bet_size)
+            metrics_accumulator.observe(bet_size_metric, bet_size, player="ip", street="postflop")
             update_bet_size("ip", bet_size, self.pot)
         else:
             self.current_player.chips -= bet_size
             self.pot += bet_size
             self.oop_committed += bet_size
             self.current_bet = bet_size
-            bet_size_metric.labels(player="oop", street="postflop").observe(bet_size)
+            metrics_accumulator.observe(bet_size_metric, bet_size, player="oop", street="postflop")
             update_bet_size("oop", bet_size, self.pot)
 
     def handle_postflop_call(self):
         """
         Handle a call action in the postflop betting round.
         """
-        logging.info("Handling postflop CALL for {self.current_player.name}")
+        hand_logger.info("Handling postflop CALL for %s", self.current_player.name)
         if self.current_player.name == self.oop_player.name:
             call_amount = int(self.oop_committed - self.ip_committed)
         else:
@@ -762,7 +835,7 @@ class PokerGame:
         """
         Handle a check action in the postflop betting round.
         """
-        logging.info(f"Handling postflop CHECK for {self.current_player.name}")
+        hand_logger.info("Handling postflop CHECK for %s", self.current_player.name)
         self.num_actions += 1
         self.last_action = "check"
 
@@ -770,7 +843,7 @@ class PokerGame:
         """
         Handle a fold action in the postflop betting round.
         """
-        logging.info(f"Handling postflop FOLD for {self.current_player.name}")
+        hand_logger.info("Handling postflop FOLD for %s", self.current_player.name)
         self.num_active_players -= 1
         self.hand_over = True
 
@@ -804,6 +877,42 @@ class PokerGame:
 
         return state_size
 
+    def encode_state(self, current_player=None):
+        """
+        Refresh the preallocated state encoding from the game attributes.
+
+        No state dict is built. The returned tensor shares memory with
+        state_buffer and is overwritten by the next call, so callers that keep
+        it must clone it.
+
+        Args:
+            current_player (Optional[Player]): The player whose hand is encoded.
+
+        Returns:
+            torch.FloatTensor: The shared state tensor.
+        """
+        buffer = self.state_buffer
+        buffer[:7] = (
+            self.pot,
+            len(self.community_cards),
+            self.current_bet,
+            self.oop_player.chips,
+            self.ip_player.chips,
+            self.oop_committed,
+            self.ip_committed,
+        )
+        if current_player == self.oop_player:
+            buffer[17:25] = self.oop_hand_encoding
+        else:
+            buffer[17:25] = self.ip_hand_encoding
+        return self.state_tensor
+
+    def update_card_encoding(self):
+        """Re-encode the board and both hands, called whenever cards change."""
+        self.state_buffer[7:17] = encode_cards(self.community_cards, 5)
+        self.oop_hand_encoding[:] = encode_cards(self.oop_player.hand, 4)
+        self.ip_hand_encoding[:] = encode_cards(self.ip_player.hand, 4)
+
     def get_state_representation(self, state=None, current_player=None):
         """
         Get a numerical representation of the game state for the DQN.
@@ -816,67 +925,54 @@ class PokerGame:
             torch.FloatTensor: A tensor representing the game state.
         """
         if state is None:
-            state = self.get_game_state()
-        representation = [
-            float(state["pot"]),
-            float(len(state["community_cards"])),
-            float(state["current_bet"]),
-            float(state["oop_player"]["chips"]),
-            float(state["ip_player"]["chips"]),
-            float(state["oop_player"]["committed"]),
-            float(state["ip_player"]["committed"]),
-        ]
-        # Add encoded representations of community cards and player hands
-        community_cards = state["community_cards"] + [""] * (
-            5 - len(state["community_cards"])
+            # Snapshot of the preallocated encoding, safe to keep in replay memory
+            return self.encode_state(current_player).clone()
+        representation = np.zeros(self.state_size, dtype=np.float32)
+        representation[:7] = (
+            state["pot"],
+            len(state["community_cards"]),
+            state["current_bet"],
+            state["oop_player"]["chips"],
+            state["ip_player"]["chips"],
+            state["oop_player"]["committed"],
+            state["ip_player"]["committed"],
         )
-        for card in community_cards:
-            representation.extend(self.encode_card(card))
-
+        # Add encoded representations of community cards and player hands,
+        # the last 8 slots stay zero
+        representation[7:17] = encode_cards(state["community_cards"], 5)
         if current_player == self.oop_player:
-            for card in state["oop_player"]["hand"]:
-                representation.extend(self.encode_card(card))
-            representation.extend([0, 0] * 4)
+            representation[17:25] = encode_cards(state["oop_player"]["hand"], 4)
         else:
-            for card in state["ip_player"]["hand"]:
-                representation.extend(self.encode_card(card))
-            representation.extend([0, 0] * 4)
-
-        assert len(representation) == self.state_size, f"State size mismatch: expected { self.state_size }"
+            representation[17:25] = encode_cards(state["ip_player"]["hand"], 4)
 
-        return torch.FloatTensor(representation)
+        return torch.from_numpy(representation)
 
     def encode_card(self, card):
         """
-        Encode a card as a tuple of integers.
+        Encode a card as a pair of numbers.
 
         Args:
-            card (str): A string representation of a card (e.g., "Ah" for Ace of hearts).
+            card (int): A card id (see cards.py), or None for an empty slot.
 
         Returns:
-            tuple: A tuple of two integers representing the rank and suit of the card.
+            np.ndarray: The rank (2-14) and suit (0-3) of the card.
         """
-        if not card:
+        if card is None:
             return [0, 0]
-        # Simple encoding: rank (2-14) and suit (0-3)
-        ranks = "23456789TJQKA"
-        suits = "cdhs"
-        return (ranks.index(card[0]) + 2, suits.index(card[1]))
+        return CARD_ENCODING[card]
 
     def get_hand_strength(self, hand):
         """
         Calculate the strength of a hand using the phevaluator library.
 
         Args:
-            hand (list): A list of four cards representing an Omaha hand.
+            hand (np.ndarray): The four card ids of an Omaha hand.
 
         Returns:
             int: The hand rank as calculated by the phevaluator.
         """
-        hand_rank = evaluate_omaha_cards(
-            self.community_cards[0], self.community_cards[1], self.community_cards[2], self.community_cards[3], self.community_cards[4],
-            hand[0], hand[1], hand[2], hand[3]
-        )
+        # Card ids are phevaluator ids, so they are passed straight through
+        hand_rank = evaluate_omaha_cards(*self.community_cards.tolist(), *hand.tolist())
 
         return hand_rank
 
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Cards are integers 0..51 encoded as rank * 4 + suit. These are the same ids
+# phevaluator uses, so card arrays can be passed to it without translation.
+RANKS = "23456789TJQKA"
+SUITS = "cdhs"
+NUM_CARDS = 52
+
+# Static lookup tables indexed by card id
+CARD_RANK = (np.arange(NUM_CARDS) // 4).astype(np.uint8)
+CARD_SUIT = (np.arange(NUM_CARDS) % 4).astype(np.uint8)
+# Per-card DQN encoding: rank (2-14) and suit (0-3)
+CARD_ENCODING = np.stack([CARD_RANK + 2, CARD_SUIT], axis=1).astype(np.float32)
+CARD_STRINGS = [RANKS[r] + SUITS[s] for r, s in zip(CARD_RANK, CARD_SUIT)]
+CARD_IDS = {card: i for i, card in enumerate(CARD_STRINGS)}
+
+
+def card_to_str(card):
+    """
+    Convert a card id to its string form, e.g. 50 -> "Ah".
+
+    Args:
+        card (int): The card id.
+
+    Returns:
+        str: The two character card string.
+    """
+    return CARD_STRINGS[card]
+
+
+def cards_to_str(cards):
+    """
+    Convert a sequence of card ids to a list of card strings.
+
+    Args:
+        cards (Iterable[int]): Card ids, e.g. a uint8 hand or board array.
+
+    Returns:
+        list: The card strings.
+    """
+    return [CARD_STRINGS[card] for card in cards]
+
+
+def str_to_card(card):
+    """
+    Convert a card string to its id, e.g. "Ah" -> 50.
+
+    Args:
+        card (str): The two character card string.
+
+    Returns:
+        int: The card id.
+    """
+    return CARD_IDS[card]
+
+
+def encode_cards(cards, num_slots):
+    """
+    Encode card ids as flattened (rank, suit) pairs, zero padded to num_slots cards.
+
+    Args:
+        cards (np.ndarray): Card ids.
+        num_slots (int): Number of card slots in the encoding.
+
+    Returns:
+        np.ndarray: A float32 array of length 2 * num_slots.
+    """
+    encoded = np.zeros((num_slots, 2), dtype=np.float32)
+    encoded[: len(cards)] = CARD_ENCODING[cards]
+    return encoded.ravel()
@@ -1,6 +1,22 @@
 from prometheus_client import Gauge, Counter, Histogram
+from collections import defaultdict
+import functools
+import os
+import threading
+import time
 import psutil
 
+# Per-decision metric updates are accumulated locally and pushed to
+# prometheus_client every METRICS_FLUSH_HANDS hands or METRICS_FLUSH_SECONDS
+METRICS_FLUSH_HANDS = 100
+METRICS_FLUSH_SECONDS = 5.0
+
+# Per-phase wall time of training hands, see timed(). Phases nest, e.g. act
+# runs inside preflop_betting, so each histogram is inclusive of the phases
+# below it. POKER_PHASE_TIMING=0 turns the timers off.
+PHASE_TIMING = os.environ.get("POKER_PHASE_TIMING", "1") != "0"
+PHASE_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 1.0)
+
 # AI Performance Metrics
 episode_reward = Gauge('episode_reward', 'Reward for the current episode', ['player'])
 cumulative_reward = Gauge('cumulative_reward', 'Total reward across all episodes', ['player'])
@@ -27,7 +43,13 @@ gpu_usage = Gauge('gpu_usage', 'Current GPU usage percentage')
 
 # Training Progress Metrics
 episodes_completed = Counter('episodes_completed', 'Number of completed episodes')
-training_time = Histogram('training_time', 'Time taken for training')
+hands_per_second = Gauge('hands_per_second', 'Hands finished per second since the last metrics flush')
+learner_steps_per_second = Gauge('learner_steps_per_second', 'Learner gradient steps per second since the last metrics flush')
+
+# Profiling Metrics
+phase_duration = Histogram('phase_duration_seconds', 'Wall time per training phase', ['phase'], buckets=PHASE_BUCKETS)
+
+phase_timing = PHASE_TIMING
 
 def update_system_metrics():
     cpu_usage.set(psutil.cpu_percent())
@@ -37,6 +59,183 @@ def update_system_metrics():
     gpu_usage.set(0)
 
 
-def update_bet_size(player, bet_amount, pot_size):
+def set_phase_timing(enabled):
+    """
+    Turn the phase timers on or off for the whole process.
+
+    Args:
+        enabled (bool): Whether timed() phases are recorded.
+    """
+    global phase_timing
+    phase_timing = bool(enabled)
+
+
+class timed:
+    """
+    Record the wall time of a phase into phase_duration.
+
+    Used as a context manager, ``with timed("showdown"):``, or as a decorator,
+    ``@timed("act")``. Durations go through metrics_accumulator, so a timed
+    phase costs two perf_counter calls and a list append. When phase timing
+    is off, decorated functions are called directly.
+    """
+
+    __slots__ = ("phase", "start")
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.start = None
+
+    def __enter__(self):
+        if phase_timing:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            metrics_accumulator.observe(phase_duration, time.perf_counter() - self.start, phase=self.phase)
+            self.start = None
+
+    def __call__(self, fn):
+        phase = self.phase
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not phase_timing:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics_accumulator.observe(phase_duration, time.perf_counter() - start, phase=phase)
+
+        return wrapper
+
+
+def update_bet_size(player, bet_amount, pot_size, accumulator=None):
     bet_pct = (bet_amount / pot_size) * 100
-    bet_size_pct.labels(player=player).observe(bet_pct)
+    (accumulator or metrics_accumulator).observe(bet_size_pct, bet_pct, player=player)
+
+
+class MetricsAccumulator:
+    """
+    Buffer metric updates and apply them to prometheus_client in batches.
+
+    Counter increments are summed, gauges keep their last value and histogram
+    observations are queued, each keyed by metric and label values. The
+    .labels() lookups and metric locks are then paid once per flush rather
+    than once per decision.
+
+    Updates may come from several threads, e.g. a logging handler running on
+    a checkpoint writer thread, so the buffers are guarded by one lock. A
+    flush swaps the buffers out under the lock and applies them to
+    prometheus_client after releasing it.
+    """
+
+    def __init__(self, flush_hands=METRICS_FLUSH_HANDS, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.flush_hands = flush_hands
+        self.flush_seconds = flush_seconds
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.observations = defaultdict(list)
+        self.hands = 0
+        self.learner_steps = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def inc(self, metric, amount=1, **labels):
+        with self.lock:
+            self.counters[metric, tuple(labels.items())] += amount
+
+    def set(self, metric, value, **labels):
+        with self.lock:
+            self.gauges[metric, tuple(labels.items())] = value
+
+    def observe(self, metric, value, **labels):
+        with self.lock:
+            self.observations[metric, tuple(labels.items())].append(value)
+
+    def end_hand(self, num_hands=1):
+        """
+        Count finished hands and flush when a hand or time threshold is reached.
+
+        Args:
+            num_hands (int): Number of hands that just finished.
+        """
+        with self.lock:
+            self.hands += num_hands
+            due = self.hands >= self.flush_hands or time.monotonic() - self.last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def end_learner_step(self, num_steps=1):
+        """
+        Count learner gradient steps for learner_steps_per_second and flush
+        on the same thresholds as end_hand, so learner-only runs publish too.
+
+        Args:
+            num_steps (int): Number of steps that just finished.
+        """
+        with self.lock:
+            self.learner_steps += num_steps
+            due = self.hands >= self.flush_hands or time.monotonic() - self.last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Apply every buffered update to prometheus_client."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.last_flush
+            counters, self.counters = self.counters, defaultdict(float)
+            gauges, self.gauges = self.gauges, {}
+            observations, self.observations = self.observations, defaultdict(list)
+            hands, self.hands = self.hands, 0
+            learner_steps, self.learner_steps = self.learner_steps, 0
+            self.last_flush = now
+
+        # Rates over the interval since the last flush, left as they were when nothing was counted
+        if hands and elapsed > 0:
+            hands_per_second.set(hands / elapsed)
+        if learner_steps and elapsed > 0:
+            learner_steps_per_second.set(learner_steps / elapsed)
+        for (metric, labels), amount in counters.items():
+            labeled_metric(metric, labels).inc(amount)
+        for (metric, labels), value in gauges.items():
+            labeled_metric(metric, labels).set(value)
+        for (metric, labels), values in observations.items():
+            child = labeled_metric(metric, labels)
+            for value in values:
+                child.observe(value)
+
+
+class DisabledMetrics:
+    """
+    Stands in for a MetricsAccumulator where updates should be dropped, e.g.
+    for hands replayed from history, which are not live play.
+    """
+
+    def inc(self, metric, amount=1, **labels):
+        pass
+
+    def set(self, metric, value, **labels):
+        pass
+
+    def observe(self, metric, value, **labels):
+        pass
+
+    def end_hand(self, num_hands=1):
+        pass
+
+    def end_learner_step(self, num_steps=1):
+        pass
+
+    def flush(self):
+        pass
+
+
+def labeled_metric(metric, labels):
+    return metric.labels(**dict(labels)) if labels else metric
+
+
+metrics_accumulator = MetricsAccumulator()
@@ -0,0 +1,332 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+import torch
+from agent import DQN, DQNAgent
+
+# Registry of saved models.
+#
+# models/index.json records each .pth file's position, street, creation time,
+# training hands, SHA-256 and size. Lookups are answered from the index; the
+# directory is only rescanned by refresh(), and a file is only re-hashed when
+# its size or modification time changed. Loaded networks are kept in an LRU
+# cache keyed by file hash, so play mode, evaluation and the game server share
+# one copy of each model in memory. Int8 copies written by quantize.py are
+# loaded with quantized=True.
+
+MODELS_DIR = "./models"
+INDEX_FILE = "index.json"
+MODEL_CACHE_SIZE = 8  # Networks kept in memory
+QUANTIZED_SUFFIX = "_int8.pt"
+
+STATE_SIZE = 7 + (5 * 2) + 2 * 4 * 2
+ACTION_SIZE = 4
+
+POSITIONS = ("oop", "ip")
+STREETS = ("preflop", "flop", "turn", "river")
+STREET_PATTERN = re.compile(r"(?:^|_)(" + "|".join(STREETS) + r")(?:_|$)")
+
+registries = {}
+registries_lock = threading.Lock()
+
+
+class InferenceAgent(DQNAgent):
+    """
+    DQNAgent that only acts, sharing a cached network.
+
+    It has no target network, optimizer or replay memory, and acts greedily.
+    Experiences handed to it are dropped.
+    """
+
+    def __init__(self, model, device, state_size=STATE_SIZE, action_size=ACTION_SIZE):
+        """
+        Initialize the agent.
+
+        Args:
+            model (torch.nn.Module): A network in eval mode. It may be shared with other agents.
+            device (torch.device): The device the network runs on.
+            state_size (int): The size of the state space.
+            action_size (int): The number of possible actions.
+        """
+        self.name = None
+        self.state_size = state_size
+        self.action_size = action_size
+        self.epsilon = 0.0
+        self.min_bet = 2
+        self.ev_weight = 0.5
+        self.model = model
+        self.device = device
+
+    def remember(self, state, action, reward, next_state, done):
+        pass
+
+    def remember_batch(self, states, actions, rewards, next_states, dones):
+        pass
+
+
+def file_sha256(path):
+    """
+    Hash a file in chunks.
+
+    Args:
+        path (str): The file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_model_name(filename):
+    """
+    Infer the position and street from a model filename.
+
+    Args:
+        filename (str): e.g. "oop_dqn_model_20240101_120000.pth" or "ip_river_gen1.pth".
+
+    Returns:
+        tuple: (position, street), either may be None.
+    """
+    stem = os.path.splitext(filename)[0].lower()
+    position = stem.split("_", 1)[0]
+    street = STREET_PATTERN.search(stem)
+    return (position if position in POSITIONS else None), (street.group(1) if street else None)
+
+
+class ModelRegistry:
+    """
+    Metadata index and LRU cache of the models in one directory.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, cache_size=MODEL_CACHE_SIZE):
+        """
+        Open the registry, reading the index and picking up new or changed files.
+
+        Args:
+            models_dir (str): Directory holding the .pth files.
+            cache_size (int): Number of loaded networks kept in memory.
+        """
+        self.models_dir = models_dir
+        self.index_path = os.path.join(models_dir, INDEX_FILE)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.entries = json.load(f)
+        self.refresh()
+
+    def save_index(self):
+        # Written to a temporary file first so readers never see a partial index
+        os.makedirs(self.models_dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def describe(self, filename, **metadata):
+        """
+        Build the index entry of a file, hashing it.
+
+        Args:
+            filename (str): File name within the models directory.
+            **metadata: Known fields (position, street, training_hands) that
+                override what the filename implies.
+
+        Returns:
+            dict: The index entry.
+        """
+        path = os.path.join(self.models_dir, filename)
+        stat = os.stat(path)
+        position, street = parse_model_name(filename)
+        entry = {
+            "name": filename,
+            "position": position,
+            "street": street,
+            "created": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+            "training_hands": None,
+            "sha256": file_sha256(path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+        entry.update((key, value) for key, value in metadata.items() if value is not None)
+        return entry
+
+    def refresh(self):
+        """
+        Sync the index with the directory.
+
+        Only files that are new, or whose size or modification time changed,
+        are hashed. Entries of deleted files are dropped.
+        """
+        with self.lock:
+            present = {}
+            if os.path.isdir(self.models_dir):
+                present = {e.name: e.stat() for e in os.scandir(self.models_dir) if e.name.endswith(".pth")}
+
+            changed = False
+            for filename in list(self.entries):
+                if filename not in present:
+                    del self.entries[filename]
+                    changed = True
+            for filename, stat in present.items():
+                entry = self.entries.get(filename)
+                if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+                    # Keep what a previous register() recorded about this file
+                    known = {} if entry is None else {
+                        key: entry[key] for key in ("position", "street", "training_hands")
+                    }
+                    self.entries[filename] = self.describe(filename, **known)
+                    changed = True
+            if changed:
+                self.save_index()
+
+    def register(self, path, position=None, street=None, training_hands=None):
+        """
+        Add a newly saved model to the index.
+
+        Args:
+            path (str): The saved file, inside the models directory.
+            position (str, optional): "oop" or "ip".
+            street (str, optional): The street the model plays, None for all.
+            training_hands (int, optional): Hands the model was trained on.
+
+        Returns:
+            dict: The index entry.
+        """
+        filename = os.path.basename(path)
+        with self.lock:
+            entry = self.describe(filename, position=position, street=street, training_hands=training_hands)
+            self.entries[filename] = entry
+            self.save_index()
+        return entry
+
+    def list(self, position=None, street=None):
+        """
+        List indexed models, oldest first.
+
+        Args:
+            position (str, optional): Only models for this position.
+            street (str, optional): Only models for this street.
+
+        Returns:
+            list: Index entries.
+        """
+        entries = sorted(self.entries.values(), key=lambda entry: (entry["created"], entry["name"]))
+        return [
+            entry
+            for entry in entries
+            if (position is None or entry["position"] == position) and (street is None or entry["street"] == street)
+        ]
+
+    def get(self, name):
+        """
+        Return the index entry of a model.
+
+        Args:
+            name (str): The file name.
+
+        Returns:
+            dict: The index entry.
+        """
+        if name not in self.entries:
+            raise KeyError(f"No model named {name} in {self.models_dir}")
+        return self.entries[name]
+
+    def path(self, name):
+        return os.path.join(self.models_dir, self.get(name)["name"])
+
+    def quantized_path(self, name):
+        return os.path.splitext(self.path(name))[0] + QUANTIZED_SUFFIX
+
+    @staticmethod
+    def device(device=None, quantized=False):
+        if quantized:
+            # Dynamically quantized kernels only exist for the CPU
+            return torch.device("cpu")
+        if device is None:
+            return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        return torch.device(device)
+
+    def load_network(self, name, device=None, quantized=False):
+        """
+        Return the model's network in eval mode, loading it on a cache miss.
+
+        Args:
+            name (str): The file name.
+            device (torch.device, optional): Defaults to CUDA when available.
+            quantized (bool): Load the int8 copy written by quantize.py, on the CPU.
+
+        Returns:
+            torch.nn.Module: The shared network. Callers must not train it.
+        """
+        device = self.device(device, quantized)
+        entry = self.get(name)
+        key = (entry["sha256"], str(device), quantized)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        if quantized:
+            path = self.quantized_path(name)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No int8 copy of {name}, create it with quantize.py")
+            model = torch.jit.load(path, map_location=device)
+        else:
+            model = DQN(STATE_SIZE, ACTION_SIZE)
+            model.load_state_dict(torch.load(self.path(name), map_location=device, weights_only=True))
+            model.to(device)
+            model.requires_grad_(False)
+        model.eval()
+        logging.info(f"Loaded {'int8 ' if quantized else ''}model {name} on {device}")
+
+        with self.lock:
+            self.cache[key] = model
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return model
+
+    def load(self, name, device=None, quantized=False):
+        """
+        Return an acting-only agent for a model.
+
+        Each call returns a new agent, so agents can be seated at different
+        tables, while the network itself comes from the cache.
+
+        Args:
+            name (str): The file name.
+            device (torch.device, optional): Defaults to CUDA when available.
+            quantized (bool): Act with the int8 copy written by quantize.py, on the CPU.
+
+        Returns:
+            InferenceAgent: The agent.
+        """
+        return InferenceAgent(self.load_network(name, device, quantized), self.device(device, quantized))
+
+
+def get_registry(models_dir=MODELS_DIR):
+    """
+    Return the process-wide registry of a directory, opening it on first use.
+
+    Args:
+        models_dir (str): Directory holding the .pth files.
+
+    Returns:
+        ModelRegistry: The registry.
+    """
+    key = os.path.abspath(models_dir)
+    with registries_lock:
+        if key not in registries:
+            registries[key] = ModelRegistry(models_dir)
+        return registries[key]
@@ -0,0 +1,545 @@
+import json
+import os
+import numpy as np
+import torch
+
+# Prioritized replay (Schaul et al.): transitions are sampled with probability
+# priority ** PRIORITY_ALPHA and corrected with importance-sampling weights whose
+# exponent anneals from PRIORITY_BETA to 1 over PRIORITY_BETA_STEPS samples
+PRIORITY_ALPHA = 0.6
+PRIORITY_BETA = 0.4
+PRIORITY_BETA_STEPS = 100_000
+PRIORITY_EPSILON = 1e-3  # Keeps zero-error transitions sampleable
+
+# Disk-backed replay: rows live in .npy segment files opened with np.memmap
+SEGMENT_SIZE = 1_000_000  # Rows per segment file
+MEMMAP_FLUSH_EVERY = 100_000  # Transitions between automatic metadata saves
+
+
+class ReplayBuffer:
+    """
+    Fixed-capacity ring buffer of transitions in one preallocated tensor.
+
+    Each row holds [state, next_state, action, reward, done], so sampling a
+    minibatch is a single gather followed by column views. When full, new
+    transitions overwrite the oldest ones.
+    """
+
+    def __init__(self, capacity, state_size, device):
+        """
+        Initialize the buffer.
+
+        Args:
+            capacity (int): Maximum number of transitions kept.
+            state_size (int): The size of the state representation.
+            device (torch.device): Device the storage lives on.
+        """
+        self.capacity = capacity
+        self.state_size = state_size
+        self.device = device
+        self.storage = torch.zeros((capacity, 2 * state_size + 3), dtype=torch.float32, device=device)
+        self.position = 0
+        self.size = 0
+
+        # Column layout of a row
+        self.next_state_start = state_size
+        self.action_col = 2 * state_size
+        self.reward_col = self.action_col + 1
+        self.done_col = self.action_col + 2
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        """
+        Store one transition.
+
+        Args:
+            state (torch.Tensor): The state.
+            action (int): The action taken.
+            reward (float): The reward received.
+            next_state (torch.Tensor): The resulting state.
+            done (bool): Whether the episode ended.
+        """
+        row = self.storage[self.position]
+        row[: self.next_state_start] = state
+        row[self.next_state_start : self.action_col] = next_state
+        row[self.action_col] = action
+        row[self.reward_col] = reward
+        row[self.done_col] = done
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Store a batch of transitions.
+
+        Args:
+            states (torch.Tensor): (N, state_size) states.
+            actions (torch.Tensor): (N,) actions taken.
+            rewards (torch.Tensor): (N,) rewards.
+            next_states (torch.Tensor): (N, state_size) resulting states.
+            dones (torch.Tensor): (N,) episode-ended flags.
+        """
+        n = len(states)
+        if n == 0:
+            return
+        if n > self.capacity:
+            # Only the newest transitions would survive anyway
+            states, actions, rewards, next_states, dones = (
+                t[-self.capacity :] for t in (states, actions, rewards, next_states, dones)
+            )
+            n = self.capacity
+
+        rows = torch.empty((n, self.storage.shape[1]), dtype=torch.float32, device=self.device)
+        rows[:, : self.next_state_start] = states
+        rows[:, self.next_state_start : self.action_col] = next_states
+        rows[:, self.action_col] = actions
+        rows[:, self.reward_col] = rewards
+        rows[:, self.done_col] = dones
+
+        first = min(n, self.capacity - self.position)
+        self.storage[self.position : self.position + first] = rows[:first]
+        self.storage[: n - first] = rows[first:]
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def split(self, rows):
+        """
+        Split stored rows into their transition fields.
+
+        Args:
+            rows (torch.Tensor): (N, row_size) rows of the storage.
+
+        Returns:
+            tuple: (states, actions, rewards, next_states, dones).
+        """
+        return (
+            rows[:, : self.next_state_start],
+            rows[:, self.action_col].long(),
+            rows[:, self.reward_col],
+            rows[:, self.next_state_start : self.action_col],
+            rows[:, self.done_col],
+        )
+
+    def sample(self, batch_size):
+        """
+        Sample a minibatch uniformly, with replacement.
+
+        Args:
+            batch_size (int): The number of transitions.
+
+        Returns:
+            tuple: (states, actions, rewards, next_states, dones) tensors.
+        """
+        indices = torch.randint(0, self.size, (batch_size,), device=self.device)
+        return self.split(self.storage[indices])
+
+    def sample_weighted(self, batch_size):
+        """
+        Sample a minibatch along with its storage indices and loss weights.
+
+        Uniform sampling needs no correction, so every weight is 1.
+
+        Args:
+            batch_size (int): The number of transitions.
+
+        Returns:
+            tuple: (transitions, indices, weights), where transitions is the
+            tuple returned by sample.
+        """
+        indices = torch.randint(0, self.size, (batch_size,), device=self.device)
+        weights = torch.ones(batch_size, device=self.device)
+        return self.split(self.storage[indices]), indices, weights
+
+    def update_priorities(self, indices, td_errors):
+        """Uniform sampling ignores TD errors."""
+
+    def transitions(self):
+        """
+        Return every stored transition, oldest first.
+
+        Returns:
+            tuple: (states, actions, rewards, next_states, dones) tensors.
+        """
+        if self.size < self.capacity:
+            rows = self.storage[: self.size]
+        else:
+            rows = torch.roll(self.storage, -self.position, dims=0)
+        return self.split(rows)
+
+    def flush(self):
+        """In-memory buffers have nothing to persist."""
+
+    def state_dict(self):
+        """
+        Return a copy of the buffer's contents for a checkpoint.
+
+        Returns:
+            dict: CPU copies of the stored rows and the ring position.
+        """
+        return {"storage": self.storage[: self.size].cpu().clone(), "position": self.position, "size": self.size}
+
+    def load_state_dict(self, state):
+        """
+        Restore contents returned by state_dict.
+
+        Args:
+            state (dict): The saved buffer state.
+        """
+        if state["size"] > self.capacity:
+            raise ValueError(f"Saved replay memory holds {state['size']} transitions, capacity is {self.capacity}")
+        self.storage[: state["size"]] = state["storage"].to(self.device)
+        self.position = state["position"]
+        self.size = state["size"]
+
+    def clear(self):
+        self.position = 0
+        self.size = 0
+
+
+class SumTree:
+    """
+    Array-based binary tree where each node holds the sum of its children.
+
+    Leaves hold priorities. Updates and prefix-sum lookups walk one path per
+    item, O(log n), and are vectorized over a batch of items.
+    """
+
+    def __init__(self, capacity):
+        self.leaf_count = 1 << max(0, (capacity - 1).bit_length())
+        self.tree = np.zeros(2 * self.leaf_count, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        """
+        Set leaf priorities and refresh the sums above them.
+
+        Args:
+            indices (np.ndarray): Leaf indices.
+            priorities (np.ndarray): New priorities.
+        """
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaf_count
+        self.tree[nodes] = priorities
+        # Parents are recomputed from both children, so repeated indices are harmless
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """
+        Find the leaves whose cumulative priority range contains each value.
+
+        Args:
+            values (np.ndarray): Prefix sums in [0, total()).
+
+        Returns:
+            np.ndarray: Leaf indices.
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaf_count:
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+        return nodes - self.leaf_count
+
+    def clear(self):
+        self.tree[:] = 0.0
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Ring buffer that samples transitions in proportion to their TD error.
+
+    New transitions get the highest priority seen so far, so each is sampled
+    at least once soon after it is stored.
+    """
+
+    def __init__(self, capacity, state_size, device, alpha=PRIORITY_ALPHA, beta=PRIORITY_BETA, beta_steps=PRIORITY_BETA_STEPS):
+        """
+        Initialize the buffer.
+
+        Args:
+            capacity (int): Maximum number of transitions kept.
+            state_size (int): The size of the state representation.
+            device (torch.device): Device the storage lives on.
+            alpha (float): How strongly priorities skew sampling, 0 is uniform.
+            beta (float): Initial importance-sampling exponent.
+            beta_steps (int): Samples over which beta anneals to 1.
+        """
+        super().__init__(capacity, state_size, device)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = (1.0 - beta) / beta_steps
+        self.max_priority = 1.0
+        self.rng = np.random.default_rng()
+
+    def add(self, state, action, reward, next_state, done):
+        index = self.position
+        super().add(state, action, reward, next_state, done)
+        self.tree.update([index], self.max_priority ** self.alpha)
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        n = min(len(states), self.capacity)
+        if n == 0:
+            return
+        indices = (self.position + np.arange(n)) % self.capacity
+        super().add_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(indices, self.max_priority ** self.alpha)
+
+    def sample_weighted(self, batch_size):
+        """
+        Sample a minibatch in proportion to priority.
+
+        The priority mass is split into batch_size equal segments and one
+        transition is drawn from each.
+
+        Args:
+            batch_size (int): The number of transitions.
+
+        Returns:
+            tuple: (transitions, indices, weights). weights are the
+            importance-sampling corrections, normalized to a maximum of 1.
+        """
+        total = self.tree.total()
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+
+        probabilities = self.tree.tree[indices + self.tree.leaf_count] / total
+        weights = (self.size * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        indices = torch.from_numpy(indices).to(self.device)
+        weights = torch.as_tensor(weights, dtype=torch.float32, device=self.device)
+        return self.split(self.storage[indices]), indices, weights
+
+    def sample(self, batch_size):
+        return self.sample_weighted(batch_size)[0]
+
+    def update_priorities(self, indices, td_errors):
+        """
+        Set the priorities of sampled transitions from their new TD errors.
+
+        Args:
+            indices (torch.Tensor): Storage indices returned by sample_weighted.
+            td_errors (torch.Tensor): TD errors of those transitions.
+        """
+        priorities = np.abs(td_errors.detach().cpu().numpy().astype(np.float64)) + PRIORITY_EPSILON
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices.cpu().numpy(), priorities ** self.alpha)
+
+    def state_dict(self):
+        state = super().state_dict()
+        state.update(tree=self.tree.tree.copy(), max_priority=self.max_priority, beta=self.beta)
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.tree.tree[:] = state["tree"]
+        self.max_priority = state["max_priority"]
+        self.beta = state["beta"]
+
+    def clear(self):
+        super().clear()
+        self.tree.clear()
+        self.max_priority = 1.0
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    """
+    Ring buffer stored on disk in np.memmap segment files.
+
+    Rows use the same layout as ReplayBuffer, split across .npy files of
+    segment_size rows each, so capacity is bounded by disk rather than RAM.
+    The write position and fill level are saved to meta.json by flush(), and
+    constructing the buffer on an existing directory reopens it as it was
+    left, without reading the rows.
+    """
+
+    def __init__(self, path, capacity, state_size, device, segment_size=SEGMENT_SIZE):
+        """
+        Open or create the buffer.
+
+        Args:
+            path (str): Directory holding the segment files and meta.json.
+            capacity (int): Maximum number of transitions kept.
+            state_size (int): The size of the state representation.
+            device (torch.device): Device sampled minibatches are moved to.
+            segment_size (int): Rows per segment file.
+        """
+        self.path = path
+        self.capacity = capacity
+        self.state_size = state_size
+        self.device = device
+        self.segment_size = segment_size
+        self.row_size = 2 * state_size + 3
+        self.next_state_start = state_size
+        self.action_col = 2 * state_size
+        self.reward_col = self.action_col + 1
+        self.done_col = self.action_col + 2
+        self.position = 0
+        self.size = 0
+        self.unflushed = 0
+
+        os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            layout = (meta["capacity"], meta["state_size"], meta["segment_size"])
+            if layout != (capacity, state_size, segment_size):
+                raise ValueError(
+                    f"Replay store at {path} has capacity, state_size, segment_size {layout}, "
+                    f"expected {(capacity, state_size, segment_size)}"
+                )
+            self.position = meta["position"]
+            self.size = meta["size"]
+
+        self.segments = [None] * -(-capacity // segment_size)
+
+    def segment(self, i):
+        """
+        Return segment i, opening or creating its file on first use.
+
+        Args:
+            i (int): Segment index.
+
+        Returns:
+            np.memmap: (rows, row_size) float32 view of the file.
+        """
+        if self.segments[i] is None:
+            filename = os.path.join(self.path, f"segment_{i:05d}.npy")
+            rows = min(self.segment_size, self.capacity - i * self.segment_size)
+            if os.path.exists(filename):
+                self.segments[i] = np.load(filename, mmap_mode="r+")
+            else:
+                self.segments[i] = np.lib.format.open_memmap(
+                    filename, mode="w+", dtype=np.float32, shape=(rows, self.row_size)
+                )
+        return self.segments[i]
+
+    def write_rows(self, rows):
+        """
+        Write rows at the current position, wrapping around and across segments.
+
+        Args:
+            rows (np.ndarray): (N, row_size) float32 rows, N <= capacity.
+        """
+        written = 0
+        while written < len(rows):
+            position = (self.position + written) % self.capacity
+            segment, offset = divmod(position, self.segment_size)
+            data = self.segment(segment)
+            count = min(len(rows) - written, len(data) - offset, self.capacity - position)
+            data[offset : offset + count] = rows[written : written + count]
+            written += count
+
+        self.position = (self.position + len(rows)) % self.capacity
+        self.size = min(self.size + len(rows), self.capacity)
+        self.unflushed += len(rows)
+        if self.unflushed >= MEMMAP_FLUSH_EVERY:
+            self.flush()
+
+    def read_rows(self, indices):
+        """
+        Gather rows by index, reading each touched segment once.
+
+        Args:
+            indices (np.ndarray): Row indices.
+
+        Returns:
+            torch.Tensor: (len(indices), row_size) rows on the buffer's device.
+        """
+        rows = np.empty((len(indices), self.row_size), dtype=np.float32)
+        segments = indices // self.segment_size
+        for segment in np.unique(segments):
+            mask = segments == segment
+            rows[mask] = self.segment(segment)[indices[mask] - segment * self.segment_size]
+        return torch.from_numpy(rows).to(self.device)
+
+    def add(self, state, action, reward, next_state, done):
+        row = np.empty((1, self.row_size), dtype=np.float32)
+        row[0, : self.next_state_start] = torch.as_tensor(state).cpu().numpy()
+        row[0, self.next_state_start : self.action_col] = torch.as_tensor(next_state).cpu().numpy()
+        row[0, self.action_col] = action
+        row[0, self.reward_col] = reward
+        row[0, self.done_col] = done
+        self.write_rows(row)
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        n = len(states)
+        if n == 0:
+            return
+        fields = [torch.as_tensor(t).cpu().numpy()[-self.capacity :] for t in (states, actions, rewards, next_states, dones)]
+        states, actions, rewards, next_states, dones = fields
+        rows = np.empty((len(states), self.row_size), dtype=np.float32)
+        rows[:, : self.next_state_start] = states
+        rows[:, self.next_state_start : self.action_col] = next_states
+        rows[:, self.action_col] = actions
+        rows[:, self.reward_col] = rewards
+        rows[:, self.done_col] = dones
+        self.write_rows(rows)
+
+    def sample(self, batch_size):
+        return self.sample_weighted(batch_size)[0]
+
+    def sample_weighted(self, batch_size):
+        indices = np.random.randint(0, self.size, batch_size)
+        weights = torch.ones(batch_size, device=self.device)
+        return self.split(self.read_rows(indices)), torch.from_numpy(indices).to(self.device), weights
+
+    def transitions(self):
+        if self.size < self.capacity:
+            indices = np.arange(self.size)
+        else:
+            indices = (self.position + np.arange(self.capacity)) % self.capacity
+        return self.split(self.read_rows(indices))
+
+    def flush(self):
+        """
+        Write dirty pages to disk and save the position and fill level.
+        """
+        for data in self.segments:
+            if data is not None:
+                data.flush()
+        meta = {
+            "capacity": self.capacity,
+            "state_size": self.state_size,
+            "segment_size": self.segment_size,
+            "position": self.position,
+            "size": self.size,
+        }
+        # Written to a temporary file first so a crash never leaves a torn meta.json
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        self.unflushed = 0
+
+    def state_dict(self):
+        """
+        Flush the rows to disk and return only the ring position.
+
+        Rows written after the checkpoint overwrite the oldest ones on disk,
+        so a restore rewinds the position but not the rows themselves.
+
+        Returns:
+            dict: The position and fill level.
+        """
+        self.flush()
+        return {"position": self.position, "size": self.size}
+
+    def load_state_dict(self, state):
+        self.position = state["position"]
+        self.size = state["size"]
+        self.flush()
+
+    def clear(self):
+        super().clear()
+        self.flush()
@@ -0,0 +1,225 @@
+import argparse
+import os
+import time
+import zipfile
+import numpy as np
+from cards import NUM_CARDS
+from hand_evaluator import evaluate_omaha_batch
+
+# Precomputed river scenarios.
+#
+# A bank is a .npz file with one "spots" array of SPOT_DTYPE records: the
+# board, both hands, the pot, both stacks and the showdown winner. Building a
+# bank deals and evaluates millions of spots in vectorized chunks, so the
+# river trainer only has to pick a record per episode instead of shuffling a
+# deck, drawing a pot and evaluating both hands at showdown.
+#
+# Banks are written uncompressed by default: a stored .npz member is a plain
+# .npy file inside the zip, which open_bank memory-maps, so a bank of any
+# size opens instantly and spots are paged in as they are sampled.
+# Compressed banks are smaller to ship but are read fully into memory.
+#
+#   python3 ./scenario_bank.py --spots 4000000
+
+BANK_FILE = "./scenarios/river_bank.npz"
+BANK_SPOTS = 2_000_000  # Spots in a default bank
+GENERATE_CHUNK = 65536  # Spots dealt and evaluated at a time
+SAMPLE_BLOCK = 4096  # Spot indices drawn at a time
+TOTAL_CHIPS = 400  # Pot plus both stacks, as in start_new_river_scenario
+
+OOP_WINS = 0
+IP_WINS = 1
+SPLIT_POT = 2
+
+SPOT_DTYPE = np.dtype(
+    [
+        ("board", "u1", 5),
+        ("oop_hand", "u1", 4),
+        ("ip_hand", "u1", 4),
+        ("pot", "<u2"),
+        ("oop_stack", "<u2"),
+        ("ip_stack", "<u2"),
+        ("winner", "i1"),
+    ]
+)
+
+
+def generate_spots(count, rng):
+    """
+    Deal and evaluate river spots.
+
+    Pots are drawn like start_new_river_scenario does, a multiple of 4 from
+    4 to 392, with the remaining chips split evenly between the stacks.
+
+    Args:
+        count (int): Number of spots.
+        rng (np.random.Generator): Random source.
+
+    Returns:
+        np.ndarray: (count,) SPOT_DTYPE records.
+    """
+    spots = np.empty(count, dtype=SPOT_DTYPE)
+    # The first 13 cards of a random permutation per spot: 4 + 4 hole cards and the board
+    cards = np.argsort(rng.random((count, NUM_CARDS)), axis=1)[:, :13].astype(np.uint8)
+    spots["oop_hand"] = cards[:, 0:4]
+    spots["ip_hand"] = cards[:, 4:8]
+    spots["board"] = cards[:, 8:13]
+
+    pots = rng.integers(1, 99, size=count) * 4
+    spots["pot"] = pots
+    spots["oop_stack"] = (TOTAL_CHIPS - pots) // 2
+    spots["ip_stack"] = (TOTAL_CHIPS - pots) // 2
+
+    # Lower ranks are stronger
+    oop_rank = evaluate_omaha_batch(spots["board"], spots["oop_hand"])
+    ip_rank = evaluate_omaha_batch(spots["board"], spots["ip_hand"])
+    spots["winner"] = np.where(oop_rank < ip_rank, OOP_WINS, np.where(ip_rank < oop_rank, IP_WINS, SPLIT_POT))
+    return spots
+
+
+def build_bank(path=BANK_FILE, spots=BANK_SPOTS, seed=None, compressed=False):
+    """
+    Generate a bank and write it as a .npz file.
+
+    Args:
+        path (str): The .npz file to write.
+        spots (int): Number of spots.
+        seed (int, optional): Seed of the deals, for reproducible banks.
+        compressed (bool): Write a compressed bank, which cannot be memory-mapped.
+
+    Returns:
+        int: The number of spots written.
+    """
+    rng = np.random.default_rng(seed)
+    bank = np.empty(spots, dtype=SPOT_DTYPE)
+    for start in range(0, spots, GENERATE_CHUNK):
+        stop = min(start + GENERATE_CHUNK, spots)
+        bank[start:stop] = generate_spots(stop - start, rng)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Written under a temporary name so a reader never opens a partial bank
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        (np.savez_compressed if compressed else np.savez)(f, spots=bank)
+    os.replace(tmp_path, path)
+    return spots
+
+
+def stored_member_offset(f, info):
+    """
+    Return the file offset of an uncompressed zip member's data.
+
+    Args:
+        f (file): The zip file, opened in binary mode.
+        info (zipfile.ZipInfo): The member.
+
+    Returns:
+        int: Offset of the first byte of the member's data.
+    """
+    # The local header's name and extra field lengths can differ from the central directory's
+    f.seek(info.header_offset + 26)
+    name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+    return info.header_offset + 30 + int(name_length) + int(extra_length)
+
+
+def open_bank(path=BANK_FILE):
+    """
+    Open a bank's spots, memory-mapped when the bank is uncompressed.
+
+    Args:
+        path (str): The .npz file.
+
+    Returns:
+        np.ndarray: (N,) SPOT_DTYPE records, an np.memmap for uncompressed banks.
+    """
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo("spots.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        with np.load(path) as bank:
+            spots = bank["spots"]
+    else:
+        with open(path, "rb") as f:
+            f.seek(stored_member_offset(f, info))
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            offset = f.tell()
+        spots = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+    if spots.dtype != SPOT_DTYPE:
+        raise ValueError(f"{path} holds {spots.dtype} records, expected {SPOT_DTYPE}")
+    return spots
+
+
+class ScenarioBank:
+    """
+    Uniform sampling of river spots from a bank.
+
+    Attributes:
+        spots (np.ndarray): The bank's SPOT_DTYPE records.
+    """
+
+    def __init__(self, path=BANK_FILE, seed=None):
+        """
+        Open a bank.
+
+        Args:
+            path (str): The .npz file written by build_bank.
+            seed (int, optional): Seed of the sampling.
+        """
+        self.path = path
+        self.spots = open_bank(path)
+        if len(self.spots) == 0:
+            raise ValueError(f"{path} holds no spots")
+        self.rng = np.random.default_rng(seed)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.position = 0
+
+    def __len__(self):
+        return len(self.spots)
+
+    def sample(self):
+        """
+        Draw one spot uniformly, with replacement.
+
+        Returns:
+            np.void: A SPOT_DTYPE record, copied out of the bank.
+        """
+        if self.position == len(self.indices):
+            # Indices are drawn in blocks to keep the generator call off the per-episode path
+            self.indices = self.rng.integers(len(self.spots), size=SAMPLE_BLOCK)
+            self.position = 0
+        spot = self.spots[self.indices[self.position]].copy()
+        self.position += 1
+        return spot
+
+    def sample_batch(self, count):
+        """
+        Draw count spots uniformly, with replacement.
+
+        Args:
+            count (int): Number of spots.
+
+        Returns:
+            np.ndarray: (count,) SPOT_DTYPE records, copied out of the bank.
+        """
+        # Sorted indices read a memory-mapped bank front to back; the spots are independent either way
+        return self.spots[np.sort(self.rng.integers(len(self.spots), size=count))]
+
+
+def main(args):
+    start = time.time()
+    spots = build_bank(args.output, args.spots, args.seed, args.compressed)
+    elapsed = time.time() - start
+    size = os.path.getsize(args.output)
+    print(f"Wrote {spots} spots to {args.output} ({size / 2**20:.1f} MiB) in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a bank of precomputed river scenarios")
+    parser.add_argument("--spots", type=int, default=BANK_SPOTS, help="Number of spots")
+    parser.add_argument("--output", type=str, default=BANK_FILE, help="The .npz file to write")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a reproducible bank")
+    parser.add_argument("--compressed", action="store_true", help="Compress the bank; it is then loaded into memory instead of memory-mapped")
+    main(parser.parse_args())
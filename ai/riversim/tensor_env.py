@@ -0,0 +1,306 @@
+import logging
+import numpy as np
+import torch
+from agent import DQNAgent
+from ai_trainer import CONST_100bb, MINIMUM_BET_INCREMENT
+from cards import CARD_ENCODING
+from scenario_bank import OOP_WINS, IP_WINS, generate_spots
+
+# Seats
+OOP = 0
+IP = 1
+
+# Actions, same indices as PokerGame.action_to_int
+FOLD = 0
+CHECK = 1
+CALL = 2
+BET = 3
+
+BOARD_SIZE = 5  # Every decision is on the river
+
+
+class TensorRiverEnv:
+    """
+    Lockstep self-play over B river games held in tensors.
+
+    Every per-game quantity (pot, chips, committed amounts, current bet,
+    current player) is a tensor on one device, and each call to `step`
+    advances every unfinished game by one decision with masked tensor ops:
+    one forward pass per agent and no Python loop over games.
+
+    Betting follows PokerGame.postflop_betting on the river: OOP acts first,
+    check/bet when unopened, call/bet/fold facing a bet and call/fold once a
+    player is all-in. Bets are sized by the agent's bet head between the
+    minimum bet and the pot-limit maximum, and a bet adds to what the player
+    has already committed. The round closes on a call or after two checks.
+
+    Games start from precomputed spots (see scenario_bank.py), so showdowns
+    are resolved from the spots' winner vector without evaluating any hand.
+    A fold awards the pot to the opponent once; PokerGame.play_hand also runs
+    the showdown after a fold, which this environment does not reproduce.
+    """
+
+    def __init__(self, num_games, oop_agent=None, ip_agent=None, scenario_bank=None, device=None, seed=None):
+        """
+        Initialize the environment.
+
+        Args:
+            num_games (int): Number of river games played in lockstep.
+            oop_agent (DQNAgent, optional): Agent for the out-of-position seat.
+            ip_agent (DQNAgent, optional): Agent for the in-position seat.
+            scenario_bank (ScenarioBank, optional): Bank to sample spots from.
+                Without one, spots are dealt and evaluated by generate_spots.
+            device (str or torch.device, optional): Device of the game tensors,
+                the OOP agent's device by default.
+            seed (int, optional): Seed for dealing spots without a bank.
+        """
+        self.num_games = num_games
+        self.state_size = 7 + (5 * 2) + 2 * 4 * 2
+        self.action_size = 4
+        self.rng = np.random.default_rng(seed)
+        self.scenario_bank = scenario_bank
+
+        # Default agents remember about one round of decisions
+        self.oop_agent = oop_agent or DQNAgent(self.state_size, self.action_size, replay_capacity=num_games)
+        self.ip_agent = ip_agent or DQNAgent(self.state_size, self.action_size, replay_capacity=num_games)
+        self.oop_agent.name = "OOP"
+        self.ip_agent.name = "IP"
+        self.device = torch.device(device) if device is not None else self.oop_agent.device
+        self.card_encoding = torch.from_numpy(CARD_ENCODING).to(self.device)
+
+        b = num_games
+        self.board_encoding = torch.zeros((b, 10), dtype=torch.float32, device=self.device)
+        self.hand_encoding = torch.zeros((b, 2, 8), dtype=torch.float32, device=self.device)
+        self.winner = torch.zeros(b, dtype=torch.int8, device=self.device)
+        self.pot = torch.zeros(b, dtype=torch.float32, device=self.device)
+        self.chips = torch.zeros((b, 2), dtype=torch.float32, device=self.device)
+        self.committed = torch.zeros((b, 2), dtype=torch.float32, device=self.device)
+        self.current_bet = torch.zeros(b, dtype=torch.float32, device=self.device)
+        self.initial_pot = torch.zeros(b, dtype=torch.float32, device=self.device)
+        self.num_actions = torch.zeros(b, dtype=torch.int16, device=self.device)
+        self.current_player = torch.zeros(b, dtype=torch.int64, device=self.device)
+        self.active = torch.zeros(b, dtype=torch.bool, device=self.device)
+
+        self.experiences = []
+
+        logging.info(f"TensorRiverEnv initialized with {num_games} games on {self.device}")
+
+    def as_tensor(self, values, dtype=torch.float32):
+        return torch.from_numpy(np.ascontiguousarray(values)).to(self.device, dtype)
+
+    def reset(self, spots=None):
+        """
+        Start B new river games.
+
+        Args:
+            spots (np.ndarray, optional): (B,) SPOT_DTYPE records to play. By
+                default they are sampled from the bank, or dealt without one.
+        """
+        b = self.num_games
+        if spots is None:
+            spots = self.scenario_bank.sample_batch(b) if self.scenario_bank is not None else generate_spots(b, self.rng)
+
+        board = self.as_tensor(spots["board"], torch.int64)
+        hands = self.as_tensor(np.stack((spots["oop_hand"], spots["ip_hand"]), axis=1), torch.int64)
+        self.board_encoding[:] = self.card_encoding[board].reshape(b, -1)
+        self.hand_encoding[:] = self.card_encoding[hands].reshape(b, 2, -1)
+        self.winner[:] = self.as_tensor(spots["winner"], torch.int8)
+
+        pot = self.as_tensor(spots["pot"])
+        self.pot[:] = pot
+        self.chips[:, OOP] = self.as_tensor(spots["oop_stack"])
+        self.chips[:, IP] = self.as_tensor(spots["ip_stack"])
+        self.committed[:] = (pot / 2).unsqueeze(1)
+        self.current_bet[:] = 0
+        self.initial_pot[:] = pot
+        self.num_actions[:] = 0
+        self.current_player[:] = OOP
+        self.active[:] = True
+        self.experiences = []
+
+    def get_state_representation(self, rows, seat):
+        """
+        Build the 33-float state encoding for a set of games.
+
+        Args:
+            rows (torch.Tensor): Indices of the games to encode.
+            seat (torch.Tensor): Seat (OOP or IP) whose hole cards are included, per row.
+
+        Returns:
+            torch.Tensor: (len(rows), state_size) float tensor on the environment's device.
+        """
+        states = torch.zeros((len(rows), self.state_size), dtype=torch.float32, device=self.device)
+        states[:, 0] = self.pot[rows]
+        states[:, 1] = BOARD_SIZE
+        states[:, 2] = self.current_bet[rows]
+        states[:, 3:5] = self.chips[rows]
+        states[:, 5:7] = self.committed[rows]
+        states[:, 7:17] = self.board_encoding[rows]
+        states[:, 17:25] = self.hand_encoding[rows, seat]
+        # The remaining 8 slots stay zero, matching PokerGame.encode_state
+        return states
+
+    def get_valid_actions(self, rows):
+        """
+        Compute valid action masks and bet bounds for the player to act.
+
+        Args:
+            rows (torch.Tensor): Indices of the games to evaluate.
+
+        Returns:
+            tuple: (valid_mask (k, 4) bool, max_bet (k,), min_bet (k,)).
+        """
+        seat = self.current_player[rows]
+        chips = self.chips[rows, seat]
+        current_bet = self.current_bet[rows]
+        allin = (self.chips[rows] <= 0).any(dim=1)
+        unopened = current_bet == 0
+
+        valid = torch.empty((len(rows), self.action_size), dtype=torch.bool, device=self.device)
+        valid[:, CHECK] = ~allin & unopened
+        valid[:, BET] = ~allin
+        valid[:, CALL] = allin | ~unopened
+        valid[:, FOLD] = allin | ~unopened
+
+        min_bet = torch.clamp(torch.minimum(current_bet * 2, chips), min=MINIMUM_BET_INCREMENT)
+        pot_limit = torch.where(unopened, self.initial_pot[rows], 3 * current_bet + self.initial_pot[rows])
+        max_bet = torch.minimum(pot_limit, chips)
+        return valid, max_bet, min_bet
+
+    def step(self):
+        """
+        Advance every active game by one decision.
+
+        Returns:
+            int: Number of games still active after the step.
+        """
+        rows = torch.nonzero(self.active).squeeze(1)
+        if len(rows) == 0:
+            return 0
+
+        seat = self.current_player[rows]
+        valid, max_bet, min_bet = self.get_valid_actions(rows)
+        states = self.get_state_representation(rows, seat)
+
+        actions = torch.empty(len(rows), dtype=torch.int64, device=self.device)
+        bet_sizes = torch.zeros(len(rows), dtype=torch.float32, device=self.device)
+        for player, agent in ((OOP, self.oop_agent), (IP, self.ip_agent)):
+            sel = torch.nonzero(seat == player).squeeze(1)
+            if len(sel) == 0:
+                continue
+            agent_actions, agent_bets = agent.act_batch(states[sel], valid[sel], max_bet[sel], min_bet[sel])
+            actions[sel] = agent_actions.to(self.device)
+            bet_sizes[sel] = agent_bets.to(self.device, torch.float32)
+
+        self.experiences.append((rows, seat, states, actions))
+        # As in get_player_action, a bet never exceeds the maximum
+        self.apply_actions(rows, seat, actions, torch.minimum(bet_sizes, max_bet))
+
+        return int(self.active.sum())
+
+    def apply_actions(self, rows, seat, actions, bet_sizes):
+        """
+        Apply one action per game and close the games whose betting ended.
+
+        Args:
+            rows (torch.Tensor): Games that acted.
+            seat (torch.Tensor): Seat that acted in each game.
+            actions (torch.Tensor): Chosen action per game.
+            bet_sizes (torch.Tensor): Bet size per game, used for bets.
+        """
+        opp = 1 - seat
+        is_bet = actions == BET
+        is_call = actions == CALL
+        is_fold = actions == FOLD
+
+        # A call matches the opponent's commitment. Stacks are equal in every
+        # spot, so the caller can always cover it, as handle_postflop_call assumes.
+        to_call = self.committed[rows, opp] - self.committed[rows, seat]
+        amount = torch.where(is_bet, bet_sizes, torch.where(is_call, to_call, torch.zeros_like(to_call)))
+        self.chips[rows, seat] -= amount
+        self.committed[rows, seat] += amount
+        self.pot[rows] += amount
+        self.current_bet[rows] = torch.where(is_bet, bet_sizes, self.current_bet[rows])
+        # Bets do not count as actions, so a raised round only closes on a call
+        self.num_actions[rows] += (is_call | (actions == CHECK)).to(torch.int16)
+        self.current_player[rows] = opp
+
+        # Folds end the game immediately; the opponent takes the pot
+        folded = rows[is_fold]
+        self.chips[folded, opp[is_fold]] += self.pot[folded]
+        self.pot[folded] = 0
+        self.active[folded] = False
+
+        settled = self.committed[rows, OOP] == self.committed[rows, IP]
+        closed = ~is_fold & settled & (is_call | (self.num_actions[rows] >= 2))
+        self.determine_showdown_winner(rows[closed])
+
+    def determine_showdown_winner(self, rows):
+        """
+        Award the pot for games that reached showdown, from the precomputed winners.
+
+        Args:
+            rows (torch.Tensor): Games going to showdown.
+        """
+        if len(rows) == 0:
+            return
+        winner = self.winner[rows]
+        # Split pots give each player half
+        oop_share = torch.where(
+            winner == OOP_WINS, 1.0, torch.where(winner == IP_WINS, 0.0, 0.5)
+        )
+        self.chips[rows, OOP] += self.pot[rows] * oop_share
+        self.chips[rows, IP] += self.pot[rows] * (1 - oop_share)
+        self.pot[rows] = 0
+        self.active[rows] = False
+
+    def calculate_rewards(self):
+        """
+        Zero-sum rewards per game, computed as in PokerGame.calculate_rewards.
+
+        Returns:
+            tuple: (oop_rewards, ip_rewards) tensors of shape (B,).
+        """
+        oop_reward = self.chips[:, OOP] - CONST_100bb
+        ip_reward = self.chips[:, IP] - CONST_100bb
+        total_reward = oop_reward + ip_reward
+        return oop_reward - total_reward / 2, ip_reward - total_reward / 2
+
+    def play(self, spots=None):
+        """
+        Play B games to completion and store every decision in the agents' memories.
+
+        Args:
+            spots (np.ndarray, optional): (B,) SPOT_DTYPE records to play, see reset.
+
+        Returns:
+            tuple: (oop_rewards, ip_rewards) tensors of shape (B,).
+        """
+        self.reset(spots)
+        while self.step():
+            pass
+
+        rewards = self.calculate_rewards()
+        all_rows = torch.arange(self.num_games, device=self.device)
+        for player, agent in ((OOP, self.oop_agent), (IP, self.ip_agent)):
+            sel = [seat == player for _, seat, _, _ in self.experiences]
+            games = torch.cat([rows[s] for (rows, _, _, _), s in zip(self.experiences, sel)])
+            if len(games) == 0:
+                continue
+            states = torch.cat([states[s] for (_, _, states, _), s in zip(self.experiences, sel)])
+            actions = torch.cat([actions[s] for (_, _, _, actions), s in zip(self.experiences, sel)])
+            final_states = self.get_state_representation(all_rows, torch.full_like(all_rows, player))
+            # Shuffled so that a replay memory smaller than a round keeps a uniform
+            # sample of it rather than only the latest decisions
+            order = torch.randperm(len(games), device=self.device)
+            games, states, actions = games[order], states[order], actions[order]
+            agent.remember_batch(
+                states,
+                actions,
+                rewards[player][games],
+                final_states[games],
+                torch.ones(len(games), device=self.device),
+            )
+
+        logging.info(f"Played {self.num_games} tensor river games")
+        return rewards
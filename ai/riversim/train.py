@@ -4,13 +4,16 @@ import sys
 import os
 from ai_trainer import PokerGame, HumanPlayer
 from agent import DQNAgent
+from model_registry import get_registry
+from scenario_bank import ScenarioBank
+from tensor_env import TensorRiverEnv
 import time
 from logging_config import setup_logging
 import logging
 import torch.cuda
 import datetime
 from prometheus_client import start_http_server
-from metrics import loss as loss_metric, winrate, episode_reward, cumulative_reward, player_chips, pot_size, community_cards, episodes_completed, action_taken, q_value, epsilon, update_system_metrics
+from metrics import loss as loss_metric, winrate, episode_reward, cumulative_reward, player_chips, pot_size, community_cards, episodes_completed, action_taken, q_value, epsilon, update_system_metrics, metrics_accumulator
 
 setup_logging()
 
@@ -36,11 +39,9 @@ def list_available_models():
     List all available model files in the models directory.
 
     Returns:
-        list: A list of filenames of available models.
+        list: A list of filenames of available models, served from the model registry's index.
     """
-    models_dir = "./models"
-    models = [f for f in os.listdir(models_dir) if f.endswith('.pth')]
-    return models
+    return [entry["name"] for entry in get_registry().list()]
 
 def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True):
     """
@@ -79,7 +80,7 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
             oop_loss = game.oop_agent.replay(batch_size)
             if oop_loss is not None:
                 game.oop_loss = oop_loss
-                loss_metric.labels(player='oop').set(oop_loss)
+                metrics_accumulator.set(loss_metric, oop_loss, player='oop')
         else:
             game.oop_loss = None
 
@@ -87,7 +88,7 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
             ip_loss = game.ip_agent.replay(batch_size)
             if ip_loss is not None:
                 game.ip_loss = ip_loss
-                loss_metric.labels(player='ip').set(ip_loss)
+                metrics_accumulator.set(loss_metric, ip_loss, player='ip')
         else:
             game.ip_loss = None
 
@@ -99,12 +100,12 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
                 game.ip_agent.update_target_model()
 
         # Update metrics
-        cumulative_reward.labels(player='oop').set(oop_cumulative_reward)
-        cumulative_reward.labels(player='ip').set(ip_cumulative_reward)
-        player_chips.labels(player='oop').set(game_state['oop_player']['chips'])
-        player_chips.labels(player='ip').set(game_state['ip_player']['chips'])
-        pot_size.set(game_state['pot'])
-        community_cards.set(len(game_state['community_cards']))
+        metrics_accumulator.set(cumulative_reward, oop_cumulative_reward, player='oop')
+        metrics_accumulator.set(cumulative_reward, ip_cumulative_reward, player='ip')
+        metrics_accumulator.set(player_chips, game_state['oop_player']['chips'], player='oop')
+        metrics_accumulator.set(player_chips, game_state['ip_player']['chips'], player='ip')
+        metrics_accumulator.set(pot_size, game_state['pot'])
+        metrics_accumulator.set(community_cards, len(game_state['community_cards']))
 
 
         # Progress Report
@@ -125,15 +126,76 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
 
             update_system_metrics()
 
+    metrics_accumulator.flush()
+    print("\nTraining Complete!")
+
+    if train_oop:
+        save_model(game.oop_agent, "oop", episodes)
+    if train_ip:
+        save_model(game.ip_agent, "ip", episodes)
+
+
+def train_dqn_tensor(env, episodes, batch_size=128, train_ip=True, train_oop=True):
+    """
+    Train the DQN agents on a TensorRiverEnv, a round of env.num_games games at a time.
+
+    Args:
+        env (TensorRiverEnv): The tensor river environment.
+        episodes (int): The number of games to train for.
+        batch_size (int, optional): The batch size for training. Defaults to 128.
+        train_ip (bool, optional): Whether to train the in-position agent. Defaults to True.
+        train_oop (bool, optional): Whether to train the out-of-position agent. Defaults to True.
+    """
+    logging.info(f"Starting tensor DQN training for PLO with {env.num_games} games per round...")
+
+    oop_cumulative_reward = 0
+    ip_cumulative_reward = 0
+    oop_loss = None
+    ip_loss = None
+    # Roughly one learner step per minibatch worth of new experiences
+    replays_per_round = max(1, env.num_games // batch_size)
+    rounds = max(1, episodes // env.num_games)
+
+    for r in range(rounds):
+        oop_rewards, ip_rewards = env.play()
+        oop_cumulative_reward += float(oop_rewards.sum())
+        ip_cumulative_reward += float(ip_rewards.sum())
+        metrics_accumulator.inc(episodes_completed, env.num_games)
+        metrics_accumulator.end_hand(env.num_games)
+
+        for _ in range(replays_per_round):
+            if train_oop and len(env.oop_agent.memory) > batch_size:
+                oop_loss = env.oop_agent.replay(batch_size)
+            if train_ip and len(env.ip_agent.memory) > batch_size:
+                ip_loss = env.ip_agent.replay(batch_size)
+
+        if train_oop:
+            env.oop_agent.update_target_model()
+            if oop_loss is not None:
+                loss_metric.labels(player='oop').set(oop_loss)
+        if train_ip:
+            env.ip_agent.update_target_model()
+            if ip_loss is not None:
+                loss_metric.labels(player='ip').set(ip_loss)
+
+        games_played = (r + 1) * env.num_games
+        cumulative_reward.labels(player='oop').set(oop_cumulative_reward)
+        cumulative_reward.labels(player='ip').set(ip_cumulative_reward)
+        winrate.labels(player='oop').set(oop_cumulative_reward / games_played * 100)
+        winrate.labels(player='ip').set(ip_cumulative_reward / games_played * 100)
+        logging.info(f"Episode: {games_played}/{episodes}")
+        update_system_metrics()
+
+    metrics_accumulator.flush()
     print("\nTraining Complete!")
 
     if train_oop:
-        save_model(game.oop_agent, "oop")
+        save_model(env.oop_agent, "oop", rounds * env.num_games)
     if train_ip:
-        save_model(game.ip_agent, "ip")
+        save_model(env.ip_agent, "ip", rounds * env.num_games)
 
 
-def main(mode='train', hands=10, train_oop=True, train_ip=True):
+def main(mode='train', hands=10, train_oop=True, train_ip=True, prioritized=False, scenario_bank=None, tensor_games=0):
     """
     Main function to either train the model or play against AI.
 
@@ -142,6 +204,11 @@ def main(mode='train', hands=10, train_oop=True, train_ip=True):
         hands (int, optional): Number of hands to train on. Defaults to 10.
         train_oop (bool, optional): Whether to train the out-of-position agent. Defaults to True.
         train_ip (bool, optional): Whether to train the in-position agent. Defaults to True.
+        prioritized (bool, optional): Use prioritized experience replay for the agents being trained. Defaults to False.
+        scenario_bank (str, optional): A bank built by scenario_bank.py to sample training spots from
+            instead of dealing them. Defaults to None.
+        tensor_games (int, optional): Play this many river games per round in a TensorRiverEnv
+            instead of one hand at a time. Defaults to 0, the hand-at-a-time PokerGame.
     """
     if torch.cuda.is_available():
         torch.backends.cudnn.benchmark = True
@@ -158,9 +225,7 @@ def main(mode='train', hands=10, train_oop=True, train_ip=True):
             print(f"{i+1}. {model}")
 
         model_choice = int(input("\nEnter the number of the model: "))
-        chosen_model = f"./models/{models[model_choice-1]}"
-
-        ai_agent = load_model(chosen_model)
+        ai_agent = get_registry().load(models[model_choice-1])
         game = PokerGame(human_position=position, 
                          oop_agent=ai_agent if position == 'ip' else None,
                          ip_agent=ai_agent if position == 'oop' else None)
@@ -193,11 +258,22 @@ def main(mode='train', hands=10, train_oop=True, train_ip=True):
             ip_agent = load_model(ip_model_path)
             ip_agent.model.eval()
 
+        if prioritized:
+            state_size = 7 + (5*2) + 2*4*2
+            action_size = 4
+            oop_agent = oop_agent or DQNAgent(state_size, action_size, prioritized=True)
+            ip_agent = ip_agent or DQNAgent(state_size, action_size, prioritized=True)
+
         start_time = time.time()
-        game = PokerGame()
+        bank = ScenarioBank(scenario_bank) if scenario_bank else None
         num_episodes = episode_choice
         batch_size = 128
-        train_dqn_poker(game, num_episodes, batch_size)
+        if tensor_games:
+            env = TensorRiverEnv(tensor_games, oop_agent=oop_agent, ip_agent=ip_agent, scenario_bank=bank)
+            train_dqn_tensor(env, num_episodes, batch_size, train_ip=train_ip, train_oop=train_oop)
+        else:
+            game = PokerGame(oop_agent=oop_agent, ip_agent=ip_agent, scenario_bank=bank)
+            train_dqn_poker(game, num_episodes, batch_size)
         end_time = time.time()
         print(f"Total Time: {end_time - start_time:.2f} seconds")
 
@@ -218,17 +294,20 @@ def play_against_ai(game):
         if play_again != 'y':
             break
         
-def save_model(agent, position):
+def save_model(agent, position, training_hands=None):
     """
-    Save the trained model to a file.
+    Save the trained model to a file and add it to the model registry.
 
     Args:
         agent (DQNAgent): The agent whose model is to be saved.
         position (str): The position of the agent ('oop' or 'ip').
+        training_hands (int, optional): Hands the model was trained on.
     """
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"./models/{position}_dqn_model_{timestamp}.pth"
     torch.save(agent.model.state_dict(), filename)
+    agent.memory.flush()
+    get_registry().register(filename, position, street="river", training_hands=training_hands)
     print(f"Saved {position} model: {filename}")
 
 if __name__ == "__main__":
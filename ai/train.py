@@ -3,14 +3,20 @@ import argparse
 import sys
 import os
 from ai_trainer import PokerGame, HumanPlayer
+from batched_game import BatchedPokerGame
+from actor_learner import SYNC_EVERY, SEATS, start_actors, stop_actors, publish_weights, next_message, ingest_experiences, make_learner_agents
 from agent import DQNAgent
+from model_registry import get_registry
+from hand_history import HandHistoryWriter
+from offline import offline_batches
+from checkpoint import CHECKPOINT_DIR, CHECKPOINT_EVERY, CheckpointWriter, training_state, load_checkpoint, latest_checkpoint
 import time
-from logging_config import setup_logging
+from logging_config import setup_logging, set_log_sample_rate
 import logging
 import torch.cuda
 import datetime
 from prometheus_client import start_http_server
-from metrics import loss as loss_metric, winrate, episode_reward, cumulative_reward, player_chips, pot_size, community_cards, episodes_completed, action_taken, q_value, epsilon, update_system_metrics
+from metrics import set_phase_timing, loss as loss_metric, winrate, episode_reward, cumulative_reward, player_chips, pot_size, community_cards, episodes_completed, action_taken, q_value, epsilon, update_system_metrics, metrics_accumulator
 
 setup_logging()
 
@@ -23,11 +29,30 @@ def load_model(model_path):
     return agent
 
 def list_available_models():
-    models_dir = "./models"
-    models = [f for f in os.listdir(models_dir) if f.endswith('.pth')]
-    return models
-
-def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True):
+    return [entry["name"] for entry in get_registry().list()]
+
+def resume_training(resume, checkpoint_dir, agents):
+    """
+    Restore a checkpoint into the agents if resuming.
+
+    Args:
+        resume (str or None): A checkpoint path, "latest" for the newest one in
+            checkpoint_dir, or None to start from scratch.
+        checkpoint_dir (str): Directory searched for "latest".
+        agents (dict): DQNAgent per seat.
+
+    Returns:
+        tuple: (first episode, progress totals saved with the checkpoint).
+    """
+    if not resume:
+        return 0, {}
+    path = latest_checkpoint(checkpoint_dir) if resume == "latest" else resume
+    if path is None:
+        raise FileNotFoundError(f"No checkpoint found in {checkpoint_dir}")
+    return load_checkpoint(path, agents)
+
+
+def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True, checkpoint_every=CHECKPOINT_EVERY, checkpoint_dir=CHECKPOINT_DIR, resume=None):
     logging.info("Starting DQN training for PLO...")
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -39,11 +64,13 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
     game.oop_agent.device = device
     game.ip_agent.device = device
 
-    oop_cumulative_reward = 0
-    ip_cumulative_reward = 0
-
+    agents = {"oop": game.oop_agent, "ip": game.ip_agent}
+    start, progress = resume_training(resume, checkpoint_dir, agents)
+    oop_cumulative_reward = progress.get("oop_cumulative_reward", 0)
+    ip_cumulative_reward = progress.get("ip_cumulative_reward", 0)
+    writer = CheckpointWriter(checkpoint_dir) if checkpoint_every else None
 
-    for e in range(episodes):
+    for e in range(start, episodes):
         game_state, oop_reward, ip_reward = game.play_hand()
 
         oop_cumulative_reward += oop_reward
@@ -54,7 +81,7 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
             oop_loss = game.oop_agent.replay(batch_size)
             if oop_loss is not None:
                 game.oop_loss = oop_loss
-                loss_metric.labels(player='oop').set(oop_loss)
+                metrics_accumulator.set(loss_metric, oop_loss, player='oop')
         else:
             game.oop_loss = None
 
@@ -62,7 +89,7 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
             ip_loss = game.ip_agent.replay(batch_size)
             if ip_loss is not None:
                 game.ip_loss = ip_loss
-                loss_metric.labels(player='ip').set(ip_loss)
+                metrics_accumulator.set(loss_metric, ip_loss, player='ip')
         else:
             game.ip_loss = None
 
@@ -74,12 +101,12 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
                 game.ip_agent.update_target_model()
 
         # Update metrics
-        cumulative_reward.labels(player='oop').set(oop_cumulative_reward)
-        cumulative_reward.labels(player='ip').set(ip_cumulative_reward)
-        player_chips.labels(player='oop').set(game_state['oop_player']['chips'])
-        player_chips.labels(player='ip').set(game_state['ip_player']['chips'])
-        pot_size.set(game_state['pot'])
-        community_cards.set(len(game_state['community_cards']))
+        metrics_accumulator.set(cumulative_reward, oop_cumulative_reward, player='oop')
+        metrics_accumulator.set(cumulative_reward, ip_cumulative_reward, player='ip')
+        metrics_accumulator.set(player_chips, game_state['oop_player']['chips'], player='oop')
+        metrics_accumulator.set(player_chips, game_state['ip_player']['chips'], player='ip')
+        metrics_accumulator.set(pot_size, game_state['pot'])
+        metrics_accumulator.set(community_cards, len(game_state['community_cards']))
 
 
         # Progress Report
@@ -100,12 +127,198 @@ def train_dqn_poker(game, episodes, batch_size=32, train_ip=True, train_oop=True
 
             update_system_metrics()
 
+        # Snapshot after the hand, the writer thread does the slow part
+        if writer and (e + 1) % checkpoint_every == 0:
+            writer.save(training_state(agents, e + 1, oop_cumulative_reward=oop_cumulative_reward, ip_cumulative_reward=ip_cumulative_reward))
+
+    if writer:
+        writer.close()
+    metrics_accumulator.flush()
     print("\nTraining Complete!")
 
     if train_oop:
-        save_model(game.oop_agent, "oop")
+        save_model(game.oop_agent, "oop", episodes)
     if train_ip:
-        save_model(game.ip_agent, "ip")
+        save_model(game.ip_agent, "ip", episodes)
+
+
+def train_dqn_poker_batched(game, episodes, batch_size=32, train_ip=True, train_oop=True, checkpoint_every=CHECKPOINT_EVERY, checkpoint_dir=CHECKPOINT_DIR, resume=None):
+    logging.info(f"Starting batched DQN training for PLO with {game.num_hands} hands per round...")
+
+    agents = {"oop": game.oop_agent, "ip": game.ip_agent}
+    start, progress = resume_training(resume, checkpoint_dir, agents)
+    oop_cumulative_reward = progress.get("oop_cumulative_reward", 0)
+    ip_cumulative_reward = progress.get("ip_cumulative_reward", 0)
+    if "deal_rng" in progress:
+        game.rng.bit_generator.state = progress["deal_rng"]
+    writer = CheckpointWriter(checkpoint_dir) if checkpoint_every else None
+    # Roughly one learner step per minibatch worth of new experiences
+    replays_per_round = max(1, game.num_hands // batch_size)
+    rounds = max(1, episodes // game.num_hands)
+
+    for r in range(start // game.num_hands, rounds):
+        oop_rewards, ip_rewards = game.play_hands()
+        oop_cumulative_reward += float(oop_rewards.sum())
+        ip_cumulative_reward += float(ip_rewards.sum())
+        metrics_accumulator.inc(episodes_completed, game.num_hands)
+        metrics_accumulator.end_hand(game.num_hands)
+
+        game.oop_loss = None
+        game.ip_loss = None
+        for _ in range(replays_per_round):
+            if train_oop and len(game.oop_agent.memory) > batch_size:
+                game.oop_loss = game.oop_agent.replay(batch_size)
+            if train_ip and len(game.ip_agent.memory) > batch_size:
+                game.ip_loss = game.ip_agent.replay(batch_size)
+
+        if train_oop:
+            game.oop_agent.update_target_model()
+            if game.oop_loss is not None:
+                loss_metric.labels(player='oop').set(game.oop_loss)
+        if train_ip:
+            game.ip_agent.update_target_model()
+            if game.ip_loss is not None:
+                loss_metric.labels(player='ip').set(game.ip_loss)
+
+        hands_played = (r + 1) * game.num_hands
+        cumulative_reward.labels(player='oop').set(oop_cumulative_reward)
+        cumulative_reward.labels(player='ip').set(ip_cumulative_reward)
+        winrate.labels(player='oop').set(oop_cumulative_reward / hands_played * 100)
+        winrate.labels(player='ip').set(ip_cumulative_reward / hands_played * 100)
+        logging.info(f"Episode: {hands_played}/{episodes}")
+        update_system_metrics()
+
+        if writer and hands_played % checkpoint_every < game.num_hands:
+            writer.save(training_state(
+                agents, hands_played,
+                oop_cumulative_reward=oop_cumulative_reward,
+                ip_cumulative_reward=ip_cumulative_reward,
+                deal_rng=game.rng.bit_generator.state,
+            ))
+
+    if writer:
+        writer.close()
+    print("\nTraining Complete!")
+
+    if train_oop:
+        save_model(game.oop_agent, "oop", rounds * game.num_hands)
+    if train_ip:
+        save_model(game.ip_agent, "ip", rounds * game.num_hands)
+
+
+def train_dqn_poker_actor_learner(episodes, num_actors, batch_size=32, train_ip=True, train_oop=True, oop_agent=None, ip_agent=None):
+    logging.info(f"Starting actor/learner DQN training for PLO with {num_actors} actors...")
+
+    agents = make_learner_agents(oop_agent, ip_agent)
+    trained = {"oop": train_oop, "ip": train_ip}
+    pool = start_actors(num_actors, agents)
+
+    cumulative_rewards = {"oop": 0.0, "ip": 0.0}
+    hands_played = 0
+    last_sync = 0
+    losses = {"oop": None, "ip": None}
+
+    try:
+        while hands_played < episodes:
+            message = next_message(pool)
+            if message is None:
+                raise RuntimeError("An actor stopped before training finished")
+            experiences, num_hands, oop_reward, ip_reward = message
+            cumulative_rewards["oop"] += oop_reward
+            cumulative_rewards["ip"] += ip_reward
+
+            for seat in SEATS:
+                if trained[seat] and experiences[seat] is not None:
+                    ingest_experiences(agents[seat], experiences[seat])
+            del message, experiences
+
+            # One learner step per hand played, as in train_dqn_poker
+            for hand in range(hands_played, hands_played + num_hands):
+                for seat in SEATS:
+                    if trained[seat] and len(agents[seat].memory) > batch_size:
+                        seat_loss = agents[seat].replay(batch_size)
+                        if seat_loss is not None:
+                            losses[seat] = seat_loss
+                            metrics_accumulator.set(loss_metric, seat_loss, player=seat)
+                    if trained[seat] and hand % 10 == 0:
+                        agents[seat].update_target_model()
+            hands_played += num_hands
+
+            if hands_played - last_sync >= SYNC_EVERY:
+                publish_weights(agents, pool["shared_models"], pool["shared_epsilons"], pool["weights_version"])
+                last_sync = hands_played
+
+            metrics_accumulator.inc(episodes_completed, num_hands)
+            for seat in SEATS:
+                metrics_accumulator.set(cumulative_reward, cumulative_rewards[seat], player=seat)
+                metrics_accumulator.set(winrate, cumulative_rewards[seat] / hands_played * 100, player=seat)
+            metrics_accumulator.end_hand(num_hands)
+
+            if hands_played % 1000 < num_hands:
+                logging.info(f"Episode: {hands_played}/{episodes}")
+                for seat in SEATS:
+                    if trained[seat] and losses[seat] is not None:
+                        logging.info(f"{seat.upper()} Loss: {losses[seat]:.4f}")
+                update_system_metrics()
+    finally:
+        stop_actors(pool)
+
+    metrics_accumulator.flush()
+    print("\nTraining Complete!")
+
+    for seat in SEATS:
+        if trained[seat]:
+            save_model(agents[seat], seat, hands_played)
+
+
+def train_dqn_offline(history_dir, hands=0, batch_size=32, train_ip=True, train_oop=True, target_update_every=10, seed=None):
+    """
+    Train from recorded hand histories instead of self-play.
+
+    Args:
+        history_dir (str): Directory written by --record-hands.
+        hands (int): Recorded hands to replay, passing over the histories
+            again as needed. 0 replays each hand once.
+        batch_size (int): Transitions per gradient step.
+        train_ip (bool): Train the IP model.
+        train_oop (bool): Train the OOP model.
+        target_update_every (int): Gradient steps between target network updates.
+        seed (int, optional): Seed of the replay order.
+    """
+    logging.info("Starting offline DQN training for PLO...")
+
+    state_size = 7 + (5*2) + 2*4*2
+    action_size = 4
+    agents = {seat: DQNAgent(state_size, action_size) for seat in SEATS}
+    trained = {"oop": train_oop, "ip": train_ip}
+    steps = {seat: 0 for seat in SEATS}
+    losses = {seat: None for seat in SEATS}
+
+    batches, replayer = offline_batches(history_dir, hands, batch_size, seed)
+    for seat, batch in batches:
+        if not trained[seat]:
+            continue
+        agent = agents[seat]
+        states, actions, rewards, next_states, dones = (tensor.to(agent.device) for tensor in batch)
+        losses[seat], _ = agent.learn(states, actions, rewards, next_states, dones)
+        steps[seat] += 1
+        # agent.learn flushes the accumulator, including the replay thread's phase timings
+        metrics_accumulator.set(loss_metric, losses[seat], player=seat)
+        if steps[seat] % target_update_every == 0:
+            agent.update_target_model()
+
+        if steps[seat] % 1000 == 0:
+            logging.info(f"{seat.upper()} step {steps[seat]}, hands replayed {replayer.replayed}, loss {losses[seat]:.4f}")
+
+    metrics_accumulator.flush()
+    if replayer.diverged:
+        logging.warning(f"{replayer.diverged} of {replayer.replayed} recorded hands did not replay as recorded and were skipped")
+    print("\nTraining Complete!")
+    print(f"Hands replayed: {replayer.replayed}, gradient steps: {steps}")
+
+    for seat in SEATS:
+        if trained[seat]:
+            save_model(agents[seat], seat, replayer.replayed - replayer.diverged)
 
 
 def main(args):
@@ -115,8 +328,14 @@ def main(args):
         torch.cuda.empty_cache()
 
     mode = args.mode
+    if args.log_sample_rate:
+        set_log_sample_rate(args.log_sample_rate)
+    if args.no_phase_timing:
+        set_phase_timing(False)
 
     if mode == 'play':
+        # Log every hand played against a human
+        set_log_sample_rate(1)
         position = input("Enter 'oop' or 'ip': ")
 
         print("\nAvailable Models:")
@@ -125,14 +344,16 @@ def main(args):
             print(f"{i+1}. {model}")
 
         model_choice = int(input("\nEnter the number of the model: "))
-        chosen_model = f"./models/{models[model_choice-1]}"
-
-        ai_agent = load_model(chosen_model)
+        ai_agent = get_registry().load(models[model_choice-1], quantized=args.quantized)
         game = PokerGame(human_position=position, 
                          oop_agent=ai_agent if position == 'ip' else None,
                          ip_agent=ai_agent if position == 'oop' else None)
 
         play_against_ai(game)
+    elif mode == 'offline':
+        start_time = time.time()
+        train_dqn_offline(args.history, args.hands, 128, args.train_ip, args.train_oop)
+        print(f"Total Time: {time.time() - start_time:.2f} seconds")
     else:
         episode_choice = args.hands
         train_oop = args.train_oop
@@ -160,11 +381,33 @@ def main(args):
             ip_agent = load_model(ip_model_path)
             ip_agent.model.eval()
 
+        if args.prioritized or args.replay_dir:
+            # Seats without a loaded model learn with the requested replay memory,
+            # a disk-backed store under replay_dir/<seat> survives restarts
+            state_size = 7 + (5*2) + 2*4*2
+            action_size = 4
+            replay_paths = {seat: os.path.join(args.replay_dir, seat) if args.replay_dir else None for seat in ("oop", "ip")}
+            oop_agent = oop_agent or DQNAgent(state_size, action_size, args.prioritized, replay_paths["oop"], args.replay_capacity)
+            ip_agent = ip_agent or DQNAgent(state_size, action_size, args.prioritized, replay_paths["ip"], args.replay_capacity)
+
         start_time = time.time()
-        game = PokerGame()
         num_episodes = episode_choice
         batch_size = 128
-        train_dqn_poker(game, num_episodes, batch_size)
+        checkpointing = {"checkpoint_every": args.checkpoint_every, "checkpoint_dir": args.checkpoint_dir, "resume": args.resume}
+        if args.actors:
+            train_dqn_poker_actor_learner(num_episodes, args.actors, batch_size, train_ip, train_oop, oop_agent, ip_agent)
+        elif args.batched:
+            game = BatchedPokerGame(args.batched, oop_agent, ip_agent)
+            train_dqn_poker_batched(game, num_episodes, batch_size, **checkpointing)
+        else:
+            game = PokerGame(oop_agent=oop_agent, ip_agent=ip_agent)
+            if args.record_hands:
+                game.recorder = HandHistoryWriter(args.record_hands)
+            try:
+                train_dqn_poker(game, num_episodes, batch_size, **checkpointing)
+            finally:
+                if game.recorder is not None:
+                    game.recorder.close()
         end_time = time.time()
         print(f"Total Time: {end_time - start_time:.2f} seconds")
 
@@ -179,23 +422,42 @@ def play_against_ai(game):
         if play_again != 'y':
             break
         
-def save_model(agent, position):
+def save_model(agent, position, training_hands=None):
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"./models/{position}_dqn_model_{timestamp}.pth"
     torch.save(agent.model.state_dict(), filename)
+    agent.memory.flush()
+    get_registry().register(filename, position, training_hands=training_hands)
     print(f"Saved {position} model: {filename}")
 
 if __name__ == "__main__":
     start_http_server(8000)
     parser = argparse.ArgumentParser(description="PLO model DQN")
-    parser.add_argument("--mode", type=str, choices=['train', 'play'], required=True, help="'Play' or 'Train'")
+    parser.add_argument("--mode", type=str, choices=['train', 'play', 'offline'], required=True, help="'Play', 'Train' or 'Offline' (train from --history)")
     parser.add_argument("--hands", type=int, required=True, help="Number of hands to train on")
     parser.add_argument("--train_ip", action="store_true", help="Train an IP model")
     parser.add_argument("--train_oop", action="store_true", help="Train an OOP model")
+    parser.add_argument("--batched", type=int, default=0, help="Self-play this many hands in lockstep per round")
+    parser.add_argument("--actors", type=int, default=0, help="Self-play in this many actor processes feeding one learner")
+    parser.add_argument("--prioritized", action="store_true", help="Use prioritized experience replay")
+    parser.add_argument("--replay-dir", type=str, default=None, help="Keep replay memory on disk in this directory, reopened on the next run")
+    parser.add_argument("--replay-capacity", type=int, default=10000, help="Transitions kept in replay memory per seat")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="Hands between full training checkpoints, 0 disables them")
+    parser.add_argument("--checkpoint-dir", type=str, default=CHECKPOINT_DIR, help="Directory for training checkpoints")
+    parser.add_argument("--resume", type=str, nargs="?", const="latest", default=None, help="Resume from a checkpoint file, or the latest one in --checkpoint-dir")
+    parser.add_argument("--quantized", action="store_true", help="Play against the int8 copy of the model made by quantize.py")
+    parser.add_argument("--record-hands", type=str, default=None, help="Append a binary history of every self-play hand to this directory")
+    parser.add_argument("--history", type=str, default=None, help="Hand history directory to train from in offline mode")
+    parser.add_argument("--no-phase-timing", action="store_true", help="Do not record per-phase durations (phase_duration_seconds)")
+    parser.add_argument("--log-sample-rate", type=int, default=0, help="Log 1 in N hands (default POKER_LOG_SAMPLE_RATE or 1000)")
 
     args = parser.parse_args()
      
     if args.mode == 'train' and args.hands is None:
         parser.error("--hands is required in training mode.")
+    if args.mode == 'offline' and not args.history:
+        parser.error("--history is required in offline mode.")
+    if args.resume and args.actors:
+        parser.error("--resume is not supported with --actors.")
     main(args)
 
@@ -1,7 +1,7 @@
 import torch
 import os
 from cli_game import PokerGame, HumanPlayer
-from agent import DQNAgent
+from model_registry import get_registry
 import time
 from logging_config import setup_logging
 import logging
@@ -10,18 +10,8 @@ import datetime
 
 setup_logging()
 
-def load_model(model_path):
-    state_size = 7 + (5*2) + 2*4*2
-    action_size = 4
-    agent = DQNAgent(state_size, action_size)
-    agent.model.load_state_dict(torch.load(model_path))
-    agent.model.eval()
-    return agent
-
 def list_available_models():
-    models_dir = "./models"
-    models = [f for f in os.listdir(models_dir) if f.endswith('.pth')]
-    return models
+    return [entry["name"] for entry in get_registry().list()]
 
 
 def main():
@@ -41,9 +31,7 @@ def main():
             print(f"{i+1}. {model}")
 
         model_choice = int(input("\nEnter the number of the model: "))
-        chosen_model = f"./models/{models[model_choice-1]}"
-
-        ai_agent = load_model(chosen_model)
+        ai_agent = get_registry().load(models[model_choice-1])
         game = PokerGame(human_position=position, 
                          oop_agent=ai_agent if position == 'ip' else None,
                          ip_agent=ai_agent if position == 'oop' else None)
@@ -63,9 +51,7 @@ def main():
             for i, model in enumerate(models):
                 print(f"{i+1}. {model}")
             model_choice = int(input("\nEnter the number of the OOP model to use: "))
-            oop_model_path = f"./models/{models[model_choice-1]}"
-            oop_agent = load_model(oop_model_path)
-            oop_agent.model.eval()
+            oop_agent = get_registry().load(models[model_choice-1])
 
         if not train_ip:
             print("\nAvailable IP Models:")
@@ -73,12 +59,10 @@ def main():
             for i, model in enumerate(models):
                 print(f"{i+1}. {model}")
             model_choice = int(input("\nEnter the number of the IP model to use: "))
-            ip_model_path = f"./models/{models[model_choice-1]}"
-            ip_agent = load_model(ip_model_path)
-            ip_agent.model.eval()
+            ip_agent = get_registry().load(models[model_choice-1])
 
         start_time = time.time()
-        game = PokerGame()
+        game = PokerGame(oop_agent=oop_agent, ip_agent=ip_agent)
         num_episodes = episode_choice
         batch_size = 32
         train_dqn_poker(game, num_episodes, batch_size)
@@ -100,6 +84,7 @@ def save_model(agent, position):
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"./models/{position}_dqn_model_{timestamp}.pth"
     torch.save(agent.model.state_dict(), filename)
+    get_registry().register(filename, position)
     print(f"Saved {position} model: {filename}")
 
 if __name__ == "__main__":
@@ -4,7 +4,8 @@ import sys
 import numpy as np
 from agent import DQNAgent
 from phevaluator import evaluate_omaha_cards
-from logging_config import setup_logging
+from logging_config import setup_logging, hand_logger, start_hand_logging
+from cards import NUM_CARDS, CARD_ENCODING, cards_to_str, encode_cards
 import torch
 
 CONST_100bb = 200
@@ -23,14 +24,15 @@ class Player:
         Player.players.append(self)
         self.name: str = name
         self.chips: int = chips
-        self.hand = []
+        self.hand = np.empty(0, dtype=np.uint8)
 
     @classmethod
     def get_players(cls):
         return cls.players
 
     def reset_hands():
-        [player.hand.clear() for player in Player.get_players()]
+        for player in Player.get_players():
+            player.hand = np.empty(0, dtype=np.uint8)
 
     def reset_chips():
         for player in Player.get_players():
@@ -39,6 +41,7 @@ class Player:
 
 class HumanPlayer(Player):
     def get_action(self, valid_actions, max_bet):
+        print(f"Your hand: {cards_to_str(self.hand)}")
         print(f"Maximum Bet: {max_bet}")
         while True:
             action = input(f"Choose an action {valid_actions}: ")
@@ -52,17 +55,19 @@ class HumanPlayer(Player):
 
 class Deck:
     def __init__(self):
-        # fmt: off
-        self.cards = [
-            "2c", "3c", "4c", "5c", "6c", "7c", "8c", "9c", "Tc", "Jc", "Qc", "Kc", "Ac", 
-            "2d", "3d", "4d", "5d", "6d", "7d", "8d", "9d", "Td", "Jd", "Qd", "Kd", "Ad", 
-            "2h", "3h", "4h", "5h", "6h", "7h", "8h", "9h", "Th", "Jh", "Qh", "Kh", "Ah", 
-            "2s", "3s", "4s", "5s", "6s", "7s", "8s", "9s", "Ts", "Js", "Qs", "Ks", "As",
-        ]
-        # fmt: on
+        # Card ids 0..51, see cards.py
+        self.cards = np.arange(NUM_CARDS, dtype=np.uint8)
+        self.position = 0
 
     def shuffle(self):
-        secrets.SystemRandom().shuffle(self.cards)
+        rng = np.random.default_rng(secrets.randbits(128))
+        self.cards = rng.permutation(NUM_CARDS).astype(np.uint8)
+        self.position = 0
+
+    def deal(self, num_cards):
+        cards = self.cards[self.position : self.position + num_cards]
+        self.position += num_cards
+        return cards
 
 
 class PokerGame:
@@ -84,7 +89,7 @@ class PokerGame:
         self.initialize_game_state()
 
         # Initialize DQN agents
-        self.state_size = calculate_state_size()
+        self.state_size = self.calculate_state_size()
         self.action_size = 4  # check, call, bet, fold
 
         if oop_agent:
@@ -121,51 +126,40 @@ class PokerGame:
             num_float_values + (num_community_cards * card_encoding_size) +
             (num_hand_cards * num_players * card_encoding_size)
         )
+        return state_size
 
     def get_state_representation(self, state=None, current_player=None):
         # Convert the game state to a numerical representation for the DQN
         if state is None:
             state = self.get_game_state()
-        representation = [
-            float(state["pot"]),
-            float(len(state["community_cards"])),
-            float(state["current_bet"]),
-            float(state["oop_player"]["chips"]),
-            float(state["ip_player"]["chips"]),
-            float(state["oop_player"]["committed"]),
-            float(state["ip_player"]["committed"]),
-        ]
-        # Add encoded representations of community cards and player hands
-        community_cards = state["community_cards"] + [""] * (
-            5 - len(state["community_cards"])
+        representation = np.zeros(self.state_size, dtype=np.float32)
+        representation[:7] = (
+            state["pot"],
+            len(state["community_cards"]),
+            state["current_bet"],
+            state["oop_player"]["chips"],
+            state["ip_player"]["chips"],
+            state["oop_player"]["committed"],
+            state["ip_player"]["committed"],
         )
-        for card in community_cards:
-            representation.extend(self.encode_card(card))
-
+        # Add encoded representations of community cards and player hands,
+        # the last 8 slots stay zero
+        representation[7:17] = encode_cards(state["community_cards"], 5)
         if current_player == self.oop_player:
-            for card in state["oop_player"]["hand"]:
-                representation.extend(self.encode_card(card))
-            representation.extend([0,0] * 4)
+            representation[17:25] = encode_cards(state["oop_player"]["hand"], 4)
         else:
-            for card in state["ip_player"]["hand"]:
-                representation.extend(self.encode_card(card))
-            representation.extend([0,0] * 4)
-
-        assert len(representation) == self.state_size, f"State size { self.state_size }"
-        # representation.extend([0, 0] * (self.state_size - len(representation)))
+            representation[17:25] = encode_cards(state["ip_player"]["hand"], 4)
 
-        return torch.FloatTensor(representation)
+        return torch.from_numpy(representation)
 
     def encode_card(self, card):
-        if not card:
+        if card is None:
             return [0, 0]
         # Simple encoding: rank (2-14) and suit (0-3)
-        ranks = "23456789TJQKA"
-        suits = "cdhs"
-        return (ranks.index(card[0]) + 2, suits.index(card[1]))
+        return CARD_ENCODING[card]
 
     def initialize_game_state(self):
-        self.community_cards = []
+        self.community_cards = np.empty(0, dtype=np.uint8)
         self.pot = 3
         self.hand_over = False
         self.current_bet = 2
@@ -181,9 +175,12 @@ class PokerGame:
 
     def deal_cards(self):
         for player in [self.oop_player, self.ip_player]:
-            player.hand = [self.deck.cards.pop() for _ in range(4)]
+            player.hand = self.deck.deal(4)
 
     def start_new_hand(self):
+        # Decides whether this hand's hand_logger records are emitted
+        start_hand_logging()
+        hand_logger.info("Starting new hand")
         self.initialize_game_state()
         self.reset_hands()
         self.deck.shuffle()
@@ -194,7 +191,6 @@ class PokerGame:
         return self.get_game_state()
 
     def play_hand(self):
-        logging.info("Starting new hand")
         game_state = self.start_new_hand()
 
         print(f"Your hand: {self.get_player_hand()}")
@@ -239,27 +235,21 @@ class PokerGame:
 
     def get_player_hand(self):
         if isinstance(self.oop_player, HumanPlayer):
-            return self.oop_player.hand
+            return cards_to_str(self.oop_player.hand)
         elif isinstance(self.ip_player, HumanPlayer):
-            return self.ip_player.hand
+            return cards_to_str(self.ip_player.hand)
         else:
             return None
 
     def determine_showdown_winner(self):
-        logging.info("Determining Showdown Winner")
-        print(f"\nIP Tables: {self.ip_player.hand}")
-        print(f"\nOOP Tables: {self.oop_player.hand}\n")
+        hand_logger.info("Determining Showdown Winner")
+        print(f"\nIP Tables: {cards_to_str(self.ip_player.hand)}")
+        print(f"\nOOP Tables: {cards_to_str(self.oop_player.hand)}\n")
         updated_state = self.get_game_state()
-        # fmt: off
-        ip_rank = evaluate_omaha_cards(
-            self.community_cards[0], self.community_cards[1], self.community_cards[2], self.community_cards[3], self.community_cards[4],
-            self.ip_player.hand[0], self.ip_player.hand[1], self.ip_player.hand[2], self.ip_player.hand[3],
-        )
-        oop_rank = evaluate_omaha_cards(
-            self.community_cards[0], self.community_cards[1], self.community_cards[2], self.community_cards[3], self.community_cards[4],
-            self.oop_player.hand[0], self.oop_player.hand[1], self.oop_player.hand[2], self.oop_player.hand[3],
-        )
-        # fmt: on
+        # Card ids are phevaluator ids, so they are passed straight through
+        board = self.community_cards.tolist()
+        ip_rank = evaluate_omaha_cards(*board, *self.ip_player.hand.tolist())
+        oop_rank = evaluate_omaha_cards(*board, *self.oop_player.hand.tolist())
 
         if ip_rank < oop_rank:
             print(f"{updated_state['ip_player']['name']} wins {self.pot}")
@@ -291,30 +281,30 @@ class PokerGame:
         return oop_reward, ip_reward
 
     def deal_flop(self):
-        logging.info("Dealing flop")
+        hand_logger.info("Dealing flop")
         self.deal_community_cards(3)
         return self.postflop_betting(street="flop")
 
     def deal_turn(self):
-        logging.info("Dealing Turn")
+        hand_logger.info("Dealing Turn")
         self.deal_community_cards(1)
         return self.postflop_betting(street="turn")
 
     def deal_river(self):
-        logging.info("Dealing River")
+        hand_logger.info("Dealing River")
         self.deal_community_cards(1)
         return self.postflop_betting(street="river")
 
     def deal_community_cards(self, num_cards):
-        self.community_cards.extend([self.deck.cards.pop() for _ in range(num_cards)])
+        self.community_cards = np.concatenate((self.community_cards, self.deck.deal(num_cards)))
 
     def reset_hands(self):
-        logging.info("Resetting Hands")
+        hand_logger.info("Resetting Hands")
         self.deck = Deck()
-        self.community_cards = []
+        self.community_cards = np.empty(0, dtype=np.uint8)
         self.pot = 0
-        self.oop_player.hand = []
-        self.ip_player.hand = []
+        self.oop_player.hand = np.empty(0, dtype=np.uint8)
+        self.ip_player.hand = np.empty(0, dtype=np.uint8)
         self.current_bet = 2
         self.num_actions = 0
         self.last_action = None
@@ -349,7 +339,7 @@ class PokerGame:
     def get_public_game_state(self):
         return {
             "pot": self.pot,
-            "community_cards": self.community_cards,
+            "community_cards": cards_to_str(self.community_cards),
             "current_player": self.current_player.name,
             "current_bet": self.current_bet,
             "last_action": self.last_action,
@@ -371,15 +361,23 @@ class PokerGame:
     def get_private_game_state(self):
         return {
             "oop_player": {
-                "hand": self.oop_player.hand,
+                "hand": cards_to_str(self.oop_player.hand),
             },
             "ip_player": {
-                "hand": self.ip_player.hand,
+                "hand": cards_to_str(self.ip_player.hand),
             },
         }
 
+    def format_game_state(self, state):
+        # Card strings are only produced here, for logs and display
+        formatted = dict(state)
+        formatted["community_cards"] = cards_to_str(state["community_cards"])
+        for player in ("oop_player", "ip_player"):
+            formatted[player] = dict(state[player], hand=cards_to_str(state[player]["hand"]))
+        return formatted
+
     def get_player_action(self, valid_actions, max_bet, min_bet):
-        logging.info(f"Getting {self.current_player.name}'s Action: ({valid_actions})")
+        hand_logger.info("Getting %s's Action: (%s)", self.current_player.name, valid_actions)
         if isinstance(self.current_player, HumanPlayer):
             return self.current_player.get_action(valid_actions, max_bet)
         else:
@@ -397,15 +395,15 @@ class PokerGame:
             chosen_action = action_map[action]
 
         if chosen_action == "bet":
-            logging.info(f"Bet size: {bet_size}")
-            logging.info(f"Bet Max: {max_bet}")
+            hand_logger.info("Bet size: %s", bet_size)
+            hand_logger.info("Bet Max: %s", max_bet)
             return chosen_action, min(bet_size, max_bet)
         return chosen_action
 
     def preflop_betting(self):
         self.current_bet, self.num_actions = 2, 0
 
-        logging.info("starting preflop betting")
+        hand_logger.info("Starting Preflop Betting")
 
         while True:
             game_state = self.get_game_state()
@@ -425,8 +423,9 @@ class PokerGame:
                 game_state["message"] = "preflop betting complete"
                 return game_state
 
-            logging.info(f"current state: {game_state}")
-            print(f"\ncommunity cards: {game_state['community_cards']}")
+            if hand_logger.isEnabledFor(logging.INFO):
+                hand_logger.info("Current State: %s", self.format_game_state(game_state))
+            print(f"\ncommunity cards: {cards_to_str(game_state['community_cards'])}")
             print(f"pot: {game_state['pot']}")
             print(f"your hand: {self.get_player_hand()}")
             print( f"ip chips: {game_state[self.ip_player.name.lower() + '_player']['chips']}")
@@ -529,7 +528,7 @@ class PokerGame:
         return min(max_bet, player_chips)
 
     def handle_preflop_bet(self, bet_size=None):
-        logging.info(f"Handling preflop bet for {self.current_player.name}")
+        hand_logger.info("Handling preflop bet for %s", self.current_player.name)
         is_allin, bet_amount = self.calculate_preflop_bet_size()
         # logging.info(f"\n\nis_allin: {is_allin}  bet_amount: {bet_amount}\n\n")
         print(f"bet amount: {bet_amount}")
@@ -556,7 +555,7 @@ class PokerGame:
         self.last_action = "bet"
 
     def handle_preflop_call(self):
-        logging.info(f"Handling preflop call for {self.current_player.name}")
+        hand_logger.info("Handling preflop call for %s", self.current_player.name)
         if self.current_player == self.ip_player and self.num_actions == 0:
             self.current_player.chips -= 1
             self.ip_committed += 1
@@ -574,7 +573,7 @@ class PokerGame:
         self.last_action = "call"
 
     def handle_preflop_check(self):
-        logging.info(f"Handling preflop check from {self.current_player.name}")
+        hand_logger.info("Handling preflop check from %s", self.current_player.name)
         if self.current_player == self.oop_player and self.last_action == "call":
             self.num_actions += 1
             self.last_action = "check"
@@ -595,19 +594,20 @@ class PokerGame:
     def postflop_betting(self, street):
         state = self.get_game_state()
         initial_pot = state["pot"]
-        logging.info("Starting Postflop Betting")
+        hand_logger.info("Starting Postflop Betting")
         self.current_bet = 0
         self.num_actions = 0
         self.current_player = self.oop_player
 
         oop_committed = 0
         ip_committed = 0
-        print(f"Community Cards: {state['community_cards']}")
+        print(f"Community Cards: {cards_to_str(state['community_cards'])}")
 
         while True:
             state = self.get_game_state()
 
-            logging.info(f"Current State: {state}")
+            if hand_logger.isEnabledFor(logging.INFO):
+                hand_logger.info("Current State: %s", self.format_game_state(state))
 
             if self.hand_over or self.num_active_players == 1:
                 self.current_player.chips += self.pot
@@ -630,7 +630,7 @@ class PokerGame:
             if isinstance(action, tuple):
                 action, bet_size = action
                 print(f"Received bet size: {bet_size}")
-                logging.info(f"Received bet size: {bet_size}")
+                hand_logger.info("Received bet size: %s", bet_size)
             else:
                 bet_size = None
             action_int = self.action_to_int(action)
@@ -658,7 +658,7 @@ class PokerGame:
         return self.get_public_game_state()
 
     def process_preflop_action(self, action, bet_size=None):
-        logging.info(f"Processing preflop action: {action}")
+        hand_logger.info("Processing preflop action: %s", action)
         # This method will be called from the server to process each action
         # print(f"Processing action: {action}")
 
@@ -678,7 +678,7 @@ class PokerGame:
         self.switch_players()
 
     def process_postflop_action(self, action, bet_size=None):
-        logging.info(f"Processing Postflop Action: {action}")
+        hand_logger.info("Processing Postflop Action: %s", action)
         # print(f"Bet Size: {bet_size}")
 
         if action == "check":
@@ -707,9 +707,7 @@ class PokerGame:
         return valid_actions, min_bet
 
     def handle_postflop_bet(self, bet_size=MINIMUM_BET_INCREMENT):
-        logging.info(
-            f"Handling postflop bet of {bet_size} for {self.current_player.name}"
-        )
+        hand_logger.info("Handling postflop bet of %s for %s", bet_size, self.current_player.name)
 
         print(f"Handline postflop bet of {bet_size} for {self.current_player.name}")
 
@@ -725,7 +723,7 @@ class PokerGame:
             self.current_bet = bet_size
 
     def handle_postflop_call(self):
-        logging.info("Handling postflop CALL for {self.current_player.name}")
+        hand_logger.info("Handling postflop CALL for %s", self.current_player.name)
         print(f"Handling postflop CALL for {self.current_player.name}")
         if self.current_player.name == self.oop_player.name:
             call_amount = self.oop_committed - self.ip_committed
@@ -760,13 +758,13 @@ class PokerGame:
         self.last_action = "call"
 
     def handle_postflop_check(self):
-        logging.info(f"Handling postflop CHECK for {self.current_player.name}")
+        hand_logger.info("Handling postflop CHECK for %s", self.current_player.name)
         print(f"Handling postflop CHECK for {self.current_player.name}")
         self.num_actions += 1
         self.last_action = "check"
 
     def handle_fold(self):
-        logging.info(f"Handling postflop FOLD for {self.current_player.name}")
+        hand_logger.info("Handling postflop FOLD for %s", self.current_player.name)
         print(f"Handling postflop FOLD for {self.current_player.name}")
         self.num_active_players -= 1
         self.hand_over = True
@@ -0,0 +1,184 @@
+import time
+import warnings
+from typing import Tuple
+import numpy as np
+import torch
+import torch.nn as nn
+
+# Compiled, inference-only action selection.
+#
+# MaskedPolicy wraps a DQN with the greedy action choice and bet sizing, so
+# masking invalid actions, the argmax and the bet clamp all run inside one
+# TorchScript graph. InferencePolicy freezes that graph and runs it under
+# torch.inference_mode. The intra-op thread count is process-wide, so it is
+# only changed when asked; a dedicated inference process should pin it to
+# INFERENCE_THREADS, which keeps batch-of-one latency low and predictable.
+
+INFERENCE_THREADS = 1  # Intra-op threads, more only pays off for large batches
+ACTION_IDS = {"fold": 0, "check": 1, "call": 2, "bet": 3}
+BET_ACTION = ACTION_IDS["bet"]
+
+
+class MaskedPolicy(nn.Module):
+    """
+    DQN plus greedy valid-action selection and bet sizing, scriptable as one graph.
+    """
+
+    def __init__(self, model, action_size):
+        super().__init__()
+        self.model = model
+        self.action_size = action_size
+        self.bet_action = BET_ACTION
+
+    def forward(self, states, valid_mask, bet_range) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Args:
+            states (torch.Tensor): (N, state_size) encoded states.
+            valid_mask (torch.Tensor): (N, action_size) boolean mask of valid actions.
+            bet_range (torch.Tensor): (N, 2) minimum and maximum bet.
+
+        Returns:
+            tuple: (actions, bet_sizes, q_values). bet_sizes are 0 where the action is not a bet.
+        """
+        q_values = self.model(states)
+        action_q = q_values[:, : self.action_size].masked_fill(~valid_mask, float("-inf"))
+        actions = action_q.argmax(dim=1)
+
+        min_bets = bet_range[:, 0]
+        max_bets = bet_range[:, 1]
+        bet_sizes = torch.round(torch.clamp(min_bets + q_values[:, -1] * (max_bets - min_bets), min_bets, max_bets))
+        bet_sizes = torch.where(actions == self.bet_action, bet_sizes, torch.zeros_like(bet_sizes))
+        return actions, bet_sizes, q_values
+
+
+class InferencePolicy:
+    """
+    Greedy acting with a frozen TorchScript copy of a DQN.
+    """
+
+    def __init__(self, model, action_size=4, num_threads=None):
+        """
+        Compile the policy.
+
+        Args:
+            model (DQN): The network. It is compiled as it is now, later
+                weight updates are not picked up.
+            action_size (int): The number of possible actions.
+            num_threads (int, optional): Intra-op threads torch uses in this
+                process. None leaves the current setting unchanged.
+        """
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        self.device = next(model.parameters()).device
+        self.action_size = action_size
+        policy = MaskedPolicy(model, action_size).eval()
+        # Frozen so the weights are constants of the graph
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            self.policy = torch.jit.freeze(torch.jit.script(policy))
+        self.masks = {}
+        # The first calls run the graph optimizer, so they are made here
+        with torch.inference_mode():
+            for batch in (1, 2):
+                self.policy(
+                    torch.zeros((batch, self.state_size(model)), device=self.device),
+                    torch.ones((batch, action_size), dtype=torch.bool, device=self.device),
+                    torch.ones((batch, 2), device=self.device),
+                )
+
+    @staticmethod
+    def state_size(model):
+        return next(model.parameters()).shape[1]
+
+    def valid_mask(self, valid_actions):
+        """
+        Return the (1, action_size) mask of a list of valid actions, cached per list.
+        """
+        key = tuple(valid_actions)
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = torch.zeros((1, self.action_size), dtype=torch.bool, device=self.device)
+            mask[0, [ACTION_IDS[action] for action in valid_actions]] = True
+            self.masks[key] = mask
+        return mask
+
+    def act(self, state, valid_actions, max_bet, min_bet):
+        """
+        Choose the greedy valid action for one state.
+
+        Args:
+            state (torch.Tensor or np.ndarray): The encoded state.
+            valid_actions (list): Names of the valid actions.
+            max_bet (float): The maximum bet.
+            min_bet (float): The minimum bet.
+
+        Returns:
+            tuple: (action, bet_size), bet_size None unless the action is a bet.
+        """
+        with torch.inference_mode():
+            states = torch.as_tensor(state, dtype=torch.float32, device=self.device).reshape(1, -1)
+            bet_range = torch.tensor([[min_bet, max_bet]], dtype=torch.float32, device=self.device)
+            actions, bet_sizes, _ = self.policy(states, self.valid_mask(valid_actions), bet_range)
+            action = int(actions[0])
+            return action, (float(bet_sizes[0]) if action == BET_ACTION else None)
+
+    def act_batch(self, states, valid_mask, max_bets, min_bets):
+        """
+        Choose greedy valid actions for a batch of states.
+
+        Args:
+            states (torch.Tensor): (N, state_size) encoded states.
+            valid_mask (torch.Tensor): (N, action_size) boolean mask of valid actions.
+            max_bets (torch.Tensor): (N,) maximum bet for each state.
+            min_bets (torch.Tensor): (N,) minimum bet for each state.
+
+        Returns:
+            tuple: (actions, bet_sizes) as NumPy arrays of shape (N,).
+        """
+        with torch.inference_mode():
+            bet_range = torch.stack((torch.as_tensor(min_bets), torch.as_tensor(max_bets)), dim=1)
+            actions, bet_sizes, _ = self.policy(
+                torch.as_tensor(states, dtype=torch.float32).to(self.device),
+                torch.as_tensor(valid_mask, dtype=torch.bool).to(self.device),
+                bet_range.to(self.device, torch.float32),
+            )
+            return actions.cpu().numpy(), bet_sizes.cpu().numpy()
+
+
+def benchmark_latency(decisions=5000, state_size=33, action_size=4):
+    """
+    Time single decisions with DQNAgent.act and with InferencePolicy.act.
+
+    Args:
+        decisions (int): Decisions timed per path.
+        state_size (int): The size of the state representation.
+        action_size (int): The number of possible actions.
+
+    Returns:
+        dict: {path: (p50, p99)} latencies in microseconds.
+    """
+    from agent import DQNAgent
+
+    agent = DQNAgent(state_size, action_size)
+    agent.epsilon = 0.0
+    agent.model.eval()
+    policy = InferencePolicy(agent.model, action_size, num_threads=INFERENCE_THREADS)
+
+    rng = np.random.default_rng(0)
+    states = [torch.from_numpy(rng.random(state_size, dtype=np.float32) * 100) for _ in range(decisions)]
+    valid_actions = [["check", "bet"], ["call", "bet", "fold"]]
+
+    results = {}
+    for path, act in (("DQNAgent.act", agent.act), ("InferencePolicy.act", policy.act)):
+        latencies = np.empty(decisions)
+        for i, state in enumerate(states):
+            start = time.perf_counter()
+            act(state, valid_actions[i % 2], 100, 4)
+            latencies[i] = time.perf_counter() - start
+        results[path] = tuple(np.percentile(latencies, (50, 99)) * 1e6)
+    return results
+
+
+if __name__ == "__main__":
+    for path, (p50, p99) in benchmark_latency().items():
+        print(f"{path:<22} p50 {p50:7.1f} us   p99 {p99:7.1f} us")
@@ -0,0 +1,209 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import torch
+from inference_policy import ACTION_IDS, InferencePolicy
+from model_registry import get_registry
+
+# Micro-batching inference for AI opponents.
+#
+# Tables submit action requests from their own threads (or event loops, via
+# asyncio.wrap_future). A worker thread takes the first waiting request,
+# collects more until it has max_batch of them or max_wait has passed, runs
+# one forward pass over the whole batch and resolves each request's future.
+# With hundreds of tables this replaces hundreds of batch-of-one forwards per
+# tick with a handful of batched ones.
+
+INFERENCE_MAX_BATCH = 256  # Requests per forward pass
+INFERENCE_MAX_WAIT = 0.002  # Seconds to wait for a batch to fill
+
+services = {}
+services_lock = threading.Lock()
+
+
+class InferenceRequest:
+    __slots__ = ("state", "valid_mask", "max_bet", "min_bet", "future")
+
+    def __init__(self, state, valid_mask, max_bet, min_bet):
+        self.state = state
+        self.valid_mask = valid_mask
+        self.max_bet = max_bet
+        self.min_bet = min_bet
+        self.future = Future()
+
+
+class InferenceService:
+    """
+    Batches action requests for one network across many tables.
+    """
+
+    def __init__(self, model, max_batch=INFERENCE_MAX_BATCH, max_wait=INFERENCE_MAX_WAIT):
+        """
+        Start the worker thread.
+
+        Args:
+            model (torch.nn.Module): The network, in eval mode. Its last output
+                is the bet fraction, the ones before it the action Q-values.
+            max_batch (int): Most requests answered by one forward pass.
+            max_wait (float): Seconds the first request of a batch may wait for others.
+        """
+        self.model = model
+        # Leaves the process's intra-op threads as they are, batches use them all
+        self.policy = InferencePolicy(model)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="inference-service", daemon=True)
+        self.thread.start()
+
+    def submit(self, state, valid_actions, max_bet, min_bet):
+        """
+        Queue an action request.
+
+        Args:
+            state (torch.Tensor or np.ndarray): The encoded state.
+            valid_actions (list): Names of the valid actions.
+            max_bet (float): The maximum bet.
+            min_bet (float): The minimum bet.
+
+        Returns:
+            Future: Resolves to (action, bet_size) as returned by DQNAgent.act.
+        """
+        valid_mask = np.zeros(len(ACTION_IDS), dtype=bool)
+        valid_mask[[ACTION_IDS[action] for action in valid_actions]] = True
+        request = InferenceRequest(torch.as_tensor(state, dtype=torch.float32), valid_mask, max_bet, min_bet)
+        self.requests.put(request)
+        return request.future
+
+    def act(self, state, valid_actions, max_bet, min_bet):
+        """
+        Submit a request and wait for its result.
+
+        Returns:
+            tuple: (action, bet_size).
+        """
+        return self.submit(state, valid_actions, max_bet, min_bet).result()
+
+    def collect(self):
+        """
+        Wait for a request, then gather more until the batch is full or max_wait passes.
+
+        Returns:
+            list: The batch, empty if the service was closed.
+        """
+        first = self.requests.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self.requests.get_nowait() if timeout <= 0 else self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def run(self):
+        while self.running:
+            batch = self.collect()
+            if not batch:
+                break
+            try:
+                results = self.infer(batch)
+            except Exception as e:
+                logging.exception("Inference batch failed")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+    def infer(self, batch):
+        """
+        Run one forward pass and pick each request's greedy valid action.
+
+        Args:
+            batch (list): InferenceRequests.
+
+        Returns:
+            list: (action, bet_size) per request.
+        """
+        actions, bet_sizes = self.policy.act_batch(
+            torch.stack([request.state for request in batch]),
+            torch.from_numpy(np.stack([request.valid_mask for request in batch])),
+            torch.tensor([request.max_bet for request in batch], dtype=torch.float32),
+            torch.tensor([request.min_bet for request in batch], dtype=torch.float32),
+        )
+        return [
+            (int(action), float(bet_size) if action == ACTION_IDS["bet"] else None)
+            for action, bet_size in zip(actions, bet_sizes)
+        ]
+
+    def close(self):
+        """
+        Answer the requests already queued and stop the worker.
+        """
+        self.requests.put(None)
+        self.thread.join()
+        self.running = False
+
+
+class ServedAgent:
+    """
+    Drop-in replacement for a DQNAgent at a table, acting through an InferenceService.
+    """
+
+    def __init__(self, service):
+        """
+        Args:
+            service (InferenceService): The shared service.
+        """
+        self.name = None
+        self.service = service
+        self.model = service.model
+
+    def submit(self, state, valid_actions, max_bet, min_bet):
+        """
+        Queue a decision without waiting for it, for tables on an event loop.
+
+        Returns:
+            Future: Resolves to (action, bet_size).
+        """
+        return self.service.submit(state, valid_actions, max_bet, min_bet)
+
+    def act(self, state, valid_actions, max_bet, min_bet):
+        """
+        Choose the greedy action for a state, batched with other tables' requests.
+
+        Returns:
+            tuple: (action, bet_size).
+        """
+        return self.service.act(state, valid_actions, max_bet, min_bet)
+
+
+def get_service(model_name, models_dir=None):
+    """
+    Return the process-wide service for a registered model, starting it on first use.
+
+    Args:
+        model_name (str): The model's file name in the registry.
+        models_dir (str, optional): The registry directory, defaults to MODELS_DIR.
+
+    Returns:
+        InferenceService: The service.
+    """
+    registry = get_registry(models_dir) if models_dir else get_registry()
+    key = (registry.models_dir, registry.get(model_name)["sha256"])
+    with services_lock:
+        if key not in services:
+            services[key] = InferenceService(registry.load_network(model_name))
+        return services[key]
@@ -1,58 +1,442 @@
-import socket
-import threading
+import asyncio
 import json
-from game_logic import PokerGame
+import logging
+import math
+import secrets
+from game_logic import PokerGame, Player
+from inference_service import ServedAgent, get_service
+from model_registry import MODELS_DIR, get_registry
+
+# HTTP game server with one isolated PokerGame per table.
+#
+# A single asyncio event loop serves every connection. Connections are kept
+# alive between requests (HTTP/1.1 semantics, or HTTP/1.0 with
+# "Connection: keep-alive"), and each request is framed by its headers and
+# Content-Length, so pipelined requests are answered in order. Tables live in
+# a registry keyed by game id; each has its own game and seats, and a player
+# acts through the seat token returned when they join. A table may seat an AI
+# in one position; every table playing a model sends the AI's decisions to
+# that model's shared InferenceService, which batches them into one forward
+# pass. The AI acts as soon as it is its turn.
+#
+#   POST   /tables                  {"ai_position", "model"} (optional) -> {"game_id", "state"}
+#   GET    /tables                  list the game ids
+#   GET    /tables/<id>             public table state
+#   POST   /tables/<id>/join        {"position": "oop" | "ip"} -> {"token", "hand", "state"}
+#   POST   /tables/<id>/action      {"token", "action", "amount"} -> state
+#   DELETE /tables/<id>             close the table
 
 HOST = 'localhost'
 PORT = 8080
+MAX_TABLES = 1000  # Open tables at a time
+KEEPALIVE_TIMEOUT = 60  # Seconds an idle connection is kept open
+MAX_HEADER_BYTES = 16384  # Request line and headers
+MAX_BODY_BYTES = 65536
+
+STATUS_MESSAGES = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    409: 'Conflict',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+    503: 'Service Unavailable',
+}
+POSITIONS = ('oop', 'ip')
+ACTION_NAMES = {0: 'fold', 1: 'check', 2: 'call', 3: 'bet'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, message=None):
+        super().__init__(message or STATUS_MESSAGES.get(status_code, ''))
+        self.status_code = status_code
+
+
+class Request:
+    __slots__ = ('method', 'path', 'version', 'headers', 'body')
+
+    def __init__(self, method, path, version, headers, body):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise HTTPError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+
+class Table:
+    """
+    One game and its seats.
+
+    Attributes:
+        game (PokerGame): The table's game, not shared with any other table.
+        seats (dict): Seat token of each position, None while the seat is free.
+        ai_position (str): Position played by the game's agent, or None.
+    """
+
+    def __init__(self, game_id, game, ai_position=None):
+        self.game_id = game_id
+        self.game = game
+        self.ai_position = ai_position
+        self.seats = {position: None for position in POSITIONS}
+        # Serializes actions, since AI decisions are awaited
+        self.lock = asyncio.Lock()
+
+    def join(self, position):
+        if position not in POSITIONS:
+            raise HTTPError(400, f"Position must be one of {', '.join(POSITIONS)}")
+        if position == self.ai_position:
+            raise HTTPError(409, f"The {position} seat is played by the AI")
+        if self.seats[position] is not None:
+            raise HTTPError(409, f"The {position} seat is taken")
+        token = secrets.token_urlsafe(16)
+        self.seats[position] = token
+        return token
+
+    def seat_of(self, token):
+        for position, seat_token in self.seats.items():
+            if isinstance(token, str) and seat_token is not None and secrets.compare_digest(token, seat_token):
+                return position
+        raise HTTPError(409, "Not seated at this table")
+
+    async def act(self, token, action, amount=None):
+        async with self.lock:
+            position = self.seat_of(token)
+            if self.game.hand_over:
+                raise HTTPError(409, "The hand is over")
+            if self.game.current_player.name != position.upper():
+                raise HTTPError(409, "Not your turn")
+            result = self.game.process_action(action, amount)
+            if "error" in result:
+                raise HTTPError(400, result["error"])
+            await self.play_ai()
+        return self.game.get_public_game_state()
+
+    async def play_ai(self):
+        """
+        Let the AI act for as long as it is its turn.
+        """
+        game = self.game
+        if self.ai_position is None:
+            return
+        agent = game.oop_agent if self.ai_position == 'oop' else game.ip_agent
+        while not game.hand_over and game.current_player.name == self.ai_position.upper():
+            state, valid_actions, max_bet, min_bet = decision_inputs(game)
+            if hasattr(agent, 'submit'):
+                # Batched with the decisions of every other table on the service
+                action, bet_size = await asyncio.wrap_future(agent.submit(state, valid_actions, max_bet, min_bet))
+            else:
+                action, bet_size = await asyncio.get_running_loop().run_in_executor(
+                    None, agent.act, state, valid_actions, max_bet, min_bet
+                )
+            game.process_action(ACTION_NAMES[action], min(bet_size, max_bet) if bet_size is not None else None)
+
+
+def decision_inputs(game):
+    """
+    Encode the current player's decision the way PokerGame.get_player_action does.
+
+    Returns:
+        tuple: (state, valid_actions, max_bet, min_bet).
+    """
+    if game.street == 'preflop':
+        valid_actions, max_bet, min_bet = game.get_valid_preflop_actions()
+    else:
+        valid_actions, min_bet = game.get_valid_postflop_actions()
+        # Tables do not track the pot a street started with; the current pot stands in for it
+        max_bet = game.calculate_max_postflop_bet_size(game.pot)
+    state = game.get_state_representation(current_player=game.current_player)
+    return state, valid_actions, max_bet, min_bet
+
+
+class TableRegistry:
+    """
+    Open tables keyed by game id.
+    """
+
+    def __init__(self, max_tables=MAX_TABLES, models_dir=MODELS_DIR):
+        self.max_tables = max_tables
+        self.models_dir = models_dir
+        self.tables = {}
+
+    def __len__(self):
+        return len(self.tables)
+
+    async def create(self, ai_position=None, model_name=None):
+        """
+        Open a table with a new game and deal its first hand.
+
+        Args:
+            ai_position (str, optional): Position the AI plays, None for two human seats.
+            model_name (str, optional): Registered model of the AI, by default the
+                newest one for its position.
+
+        Returns:
+            Table: The new table.
+        """
+        if len(self.tables) >= self.max_tables:
+            raise HTTPError(503, "No free tables")
+        if ai_position is not None and ai_position not in POSITIONS:
+            raise HTTPError(400, f"AI position must be one of {', '.join(POSITIONS)}")
+        # Loading a network on a cache miss takes milliseconds, so it runs off the event loop
+        game = await asyncio.get_running_loop().run_in_executor(None, new_game, ai_position, model_name, self.models_dir)
+        game_id = secrets.token_hex(8)
+        while game_id in self.tables:
+            game_id = secrets.token_hex(8)
+        table = Table(game_id, game, ai_position)
+        self.tables[game_id] = table
+        async with table.lock:
+            await table.play_ai()
+        return table
+
+    def get(self, game_id):
+        table = self.tables.get(game_id)
+        if table is None:
+            raise HTTPError(404, f"No table {game_id}")
+        return table
+
+    def remove(self, game_id):
+        table = self.get(game_id)
+        del self.tables[game_id]
+        # Players register themselves class-wide; drop them so closed tables can be freed
+        for player in (table.game.oop_player, table.game.ip_player):
+            if player in Player.players:
+                Player.players.remove(player)
+        return table
+
+
+def newest_model(registry, position):
+    entries = registry.list(position=position)
+    return entries[-1]["name"] if entries else None
+
+
+def new_game(ai_position=None, model_name=None, models_dir=MODELS_DIR):
+    """
+    Build a table's game and deal its first hand.
+
+    The AI seat acts through the model's shared InferenceService, so the
+    decisions of all tables playing that model are batched into one forward
+    pass. The human seat gets an acting-only agent from the model registry,
+    which shares the cached network and is never asked to act.
+
+    Args:
+        ai_position (str, optional): Position the AI plays.
+        model_name (str, optional): Registered model of the AI seat.
+        models_dir (str): Directory of the model registry.
+
+    Returns:
+        PokerGame: The game.
+    """
+    registry = get_registry(models_dir)
+    agents = {}
+    for position in POSITIONS:
+        name = model_name if position == ai_position and model_name else newest_model(registry, position)
+        if name is None and position == ai_position:
+            raise HTTPError(404, f"No registered model for the {position} seat")
+        try:
+            if position == ai_position:
+                agents[position] = ServedAgent(get_service(name, models_dir))
+            else:
+                agents[position] = registry.load(name) if name else None
+        except KeyError as e:
+            raise HTTPError(404, str(e.args[0]))
+    game = PokerGame(oop_agent=agents['oop'], ip_agent=agents['ip'])
+    game.start_new_hand()
+    return game
+
+
+def validate_amount(amount):
+    """
+    Check a bet amount from a client.
+
+    Returns:
+        int or float: The amount, or None if none was given.
+    """
+    if amount is None:
+        return None
+    # bool is an int subclass, but true is not a bet size; JSON also allows NaN and Infinity
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not math.isfinite(amount):
+        raise HTTPError(400, "Amount must be a number")
+    return amount
+
+
+def json_default(value):
+    # NumPy scalars and arrays from the game state
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
 
 class HTTPServer:
-    def __init__(self):
-        self.game = PokerGame()
-
-    def start(self):
-        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server_socket.bind((HOST, PORT))
-        server_socket.listen(5)
-        print(f"Server listening on {HOST}:{PORT}")
-
-        while True:
-            client_socket, addr = server_socket.accept()
-            client_thread = threading.Thread(target=self.handle_client, args=(client_socket,))
-            client_thread.start()
-
-    def handle_client(self, client_socket):
-        request = client_socket.recv(1024).decode('utf-8')
-        method, path, _ = request.split('\n')[0].split()
-
-        if method == 'POST' and path == '/start_game':
-            self.game = PokerGame()
-            response = self.create_response(200, json.dumps(self.game.get_public_game_state()))
-        elif method == 'GET' and path == '/get_state':
-            game_state = self.game.get_public_game_state()
-            response = self.create_response(200, json.dumps(game_state))
-        elif method == 'POST' and path == '/action':
-            body = request.split('\r\n\r\n')[1]
-            action_data = json.loads(body)
-            result = self.game.process_action(action_data['action'], action_data.get('amount'))
-            response = self.create_response(200, json.dumps(result))
-        else:
-            response = self.create_response(404, "Not Found")
-
-        client_socket.sendall(response.encode('utf-8'))
-        client_socket.close()
-
-    def create_response(self, status_code, body):
-        status_messages = {200: 'OK', 404: 'Not Found'}
+    def __init__(self, registry=None):
+        self.registry = registry or TableRegistry()
+
+    async def start(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_HEADER_BYTES)
+        print(f"Server listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), KEEPALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HTTPError as e:
+                    # The stream position is unknown after a malformed request, so the connection is closed
+                    writer.write(self.create_response(e.status_code, {"error": str(e)}, keep_alive=False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                keep_alive = request.keep_alive
+                try:
+                    status_code, body = await self.route(request)
+                    response = self.create_response(status_code, body, keep_alive)
+                except HTTPError as e:
+                    response = self.create_response(e.status_code, {"error": str(e)}, keep_alive)
+                except Exception:
+                    logging.exception(f"Unhandled error serving {request.method} {request.path}")
+                    # The request was read in full, so the connection can stay open
+                    response = self.create_response(500, {"error": STATUS_MESSAGES[500]}, keep_alive)
+                writer.write(response)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def read_request(self, reader):
+        """
+        Read one request off the stream.
+
+        Returns:
+            Request: The request, or None if the client closed the connection
+            between requests.
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise HTTPError(400, "Incomplete request")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431)
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, path, version = lines[0].split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        if version not in ('HTTP/1.0', 'HTTP/1.1'):
+            raise HTTPError(400, f"Unsupported protocol {version}")
+
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise HTTPError(400, "Malformed header")
+            headers[name.strip().lower()] = value.strip()
+
+        if 'transfer-encoding' in headers:
+            raise HTTPError(501, "Transfer-Encoding is not supported, send a Content-Length")
+        length = headers.get('content-length', '0')
+        if not length.isdigit():
+            raise HTTPError(400, "Invalid Content-Length")
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413)
+        body = await reader.readexactly(length) if length else b''
+        return Request(method.upper(), path.split('?', 1)[0], version, headers, body)
+
+    async def route(self, request):
+        """
+        Dispatch a request to its table endpoint.
+
+        Returns:
+            tuple: (status code, JSON-serializable body).
+        """
+        parts = [part for part in request.path.split('/') if part]
+        method = request.method
+        if not parts or parts[0] != 'tables' or len(parts) > 3:
+            raise HTTPError(404)
+
+        if len(parts) == 1:
+            if method == 'POST':
+                data = request.json()
+                table = await self.registry.create(data.get('ai_position'), data.get('model'))
+                return 200, {"game_id": table.game_id, "state": table.game.get_public_game_state()}
+            if method == 'GET':
+                return 200, {"tables": list(self.registry.tables)}
+            raise HTTPError(405)
+
+        table = self.registry.get(parts[1])
+        if len(parts) == 2:
+            if method == 'GET':
+                return 200, table.game.get_public_game_state()
+            if method == 'DELETE':
+                self.registry.remove(table.game_id)
+                return 200, {"game_id": table.game_id, "closed": True}
+            raise HTTPError(405)
+
+        if method != 'POST':
+            raise HTTPError(405)
+        data = request.json()
+        if parts[2] == 'join':
+            position = data.get('position')
+            token = table.join(position)
+            hand = table.game.get_private_game_state()[f"{position}_player"]["hand"]
+            return 200, {"game_id": table.game_id, "position": position, "token": token, "hand": hand,
+                         "state": table.game.get_public_game_state()}
+        if parts[2] == 'action':
+            if 'action' not in data:
+                raise HTTPError(400, "Missing action")
+            return 200, await table.act(data.get('token'), data['action'], validate_amount(data.get('amount')))
+        raise HTTPError(404)
+
+    def create_response(self, status_code, body, keep_alive=True):
+        payload = json.dumps(body, default=json_default).encode('utf-8')
         headers = [
-            f"HTTP/1.1 {status_code} {status_messages.get(status_code, '')}",
+            f"HTTP/1.1 {status_code} {STATUS_MESSAGES.get(status_code, '')}",
             "Content-Type: application/json",
-            f"Content-Length: {len(body)}",
-            "Connection: close"
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
         ]
-        return '\r\n'.join(headers) + '\r\n\r\n' + body
+        return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + payload
+
 
 if __name__ == '__main__':
     server = HTTPServer()
-    server.start()
\ No newline at end of file
+    asyncio.run(server.start())
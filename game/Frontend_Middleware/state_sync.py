@@ -0,0 +1,211 @@
+import msgpack
+
+# Delta-encoded table state updates for the websocket channel.
+#
+# Each table has a TableChannel holding the last public state it published
+# and a sequence number. A new subscriber, or one that asks to resync, gets a
+# snapshot of the whole state. After each action the channel encodes a single
+# delta with only the fields that changed, and the same bytes go to every
+# subscriber of the table. Nested fields are addressed by dotted paths
+# ("oop_player.committed"), and board cards dealt since the previous state
+# are sent as just the new cards.
+#
+# A snapshot's seq is the version of the state it carries; a delta with seq n
+# turns version n - 1 into version n. A StateMirror on the client applies
+# them in order and reports a gap when a delta does not follow the version it
+# holds, after which the client sends a resync request.
+#
+#   snapshot: {"t": "s", "seq": 7, "state": {...}}
+#   delta:    {"t": "d", "seq": 8, "set": {"pot": 10, "last_action": "bet"}, "board": ["Ah"]}
+
+SNAPSHOT = "s"
+DELTA = "d"
+BOARD_FIELD = "community_cards"
+
+
+def pack(message):
+    return msgpack.packb(message, use_bin_type=True, default=pack_default)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def pack_default(value):
+    # NumPy scalars and arrays from the game state
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} cannot be packed")
+
+
+def flatten_state(state, prefix=""):
+    """
+    Flatten nested state dicts into {dotted path: value}.
+    """
+    flat = {}
+    for key, value in state.items():
+        if isinstance(value, dict):
+            flat.update(flatten_state(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def unflatten_state(flat):
+    """
+    Rebuild the nested state dict from {dotted path: value}.
+    """
+    state = {}
+    for path, value in flat.items():
+        *parents, key = path.split(".")
+        node = state
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[key] = value
+    return state
+
+
+def state_delta(previous, current):
+    """
+    Compute the delta between two flattened states.
+
+    Args:
+        previous (dict): The state the client holds.
+        current (dict): The new state.
+
+    Returns:
+        dict: The delta's "set", "board" and "unset" fields, only those that
+        are non-empty. An empty dict means nothing changed.
+    """
+    changed = {}
+    for path, value in current.items():
+        if path not in previous or previous[path] != value:
+            changed[path] = value
+    delta = {}
+
+    board = changed.pop(BOARD_FIELD, None)
+    if board is not None:
+        old_board = previous.get(BOARD_FIELD) or []
+        if len(board) > len(old_board) and board[: len(old_board)] == old_board:
+            # Cards were dealt; earlier ones are already on the client
+            delta["board"] = board[len(old_board):]
+        else:
+            changed[BOARD_FIELD] = board
+
+    if changed:
+        delta["set"] = changed
+    removed = [path for path in previous if path not in current]
+    if removed:
+        delta["unset"] = removed
+    return delta
+
+
+def apply_delta(flat, delta):
+    """
+    Apply a delta message to a flattened state in place.
+    """
+    flat.update(delta.get("set", {}))
+    if "board" in delta:
+        flat[BOARD_FIELD] = list(flat.get(BOARD_FIELD) or []) + delta["board"]
+    for path in delta.get("unset", ()):
+        flat.pop(path, None)
+
+
+class TableChannel:
+    """
+    Server side of one table's state stream.
+
+    Attributes:
+        seq (int): Version of the last published state, 0 before the first.
+        state (dict): The last published state, flattened.
+    """
+
+    def __init__(self, state=None):
+        self.seq = 0
+        self.state = {}
+        self.snapshot_message = None
+        if state is not None:
+            self.update(state)
+
+    def snapshot(self):
+        """
+        Encode the whole current state.
+
+        Returns:
+            bytes: The msgpack snapshot message, reused until the state changes.
+        """
+        if self.snapshot_message is None:
+            self.snapshot_message = pack({"t": SNAPSHOT, "seq": self.seq, "state": unflatten_state(self.state)})
+        return self.snapshot_message
+
+    def update(self, state):
+        """
+        Publish a new state.
+
+        Args:
+            state (dict): The table's public game state.
+
+        Returns:
+            bytes: The msgpack delta message for subscribers, or None if no
+            field changed, in which case the version is not advanced.
+        """
+        current = flatten_state(state)
+        delta = state_delta(self.state, current)
+        if not delta:
+            return None
+        self.seq += 1
+        self.state = current
+        self.snapshot_message = None
+        delta["t"] = DELTA
+        delta["seq"] = self.seq
+        return pack(delta)
+
+
+class StateMirror:
+    """
+    Client side of a table's state stream.
+
+    Attributes:
+        seq (int): Version of the state held, None before the first snapshot
+            or after a gap.
+    """
+
+    def __init__(self):
+        self.seq = None
+        self.flat = {}
+
+    @property
+    def state(self):
+        return unflatten_state(self.flat)
+
+    def apply(self, data):
+        """
+        Apply a snapshot or delta message.
+
+        Args:
+            data (bytes): The msgpack message.
+
+        Returns:
+            bool: False if a delta was missed and the client must resync.
+        """
+        message = unpack(data)
+        kind = message.get("t")
+        if kind == SNAPSHOT:
+            if self.seq is None or message["seq"] >= self.seq:
+                self.flat = flatten_state(message["state"])
+                self.seq = message["seq"]
+            return True
+        if kind != DELTA:
+            raise ValueError(f"Not a state message: {kind!r}")
+
+        if self.seq is None:
+            return False
+        if message["seq"] <= self.seq:
+            # Already covered by a later snapshot
+            return True
+        if message["seq"] != self.seq + 1:
+            self.seq = None
+            return False
+        apply_delta(self.flat, message)
+        self.seq = message["seq"]
+        return True
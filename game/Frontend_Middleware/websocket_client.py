@@ -1,18 +1,38 @@
 #!/usr/bin/env python
 
-import asyncio
+import json
 from websockets.sync.client import connect
+from state_sync import StateMirror, unpack
 
 uri = "localhost"
 port = "8765"
 
-def test(msg):
+def receive_state(websocket, mirror, game_id):
+    message = websocket.recv()
+    if not mirror.apply(message):
+        # A delta was missed. Deltas already in flight are rejected until the
+        # snapshot answering the resync arrives.
+        websocket.send(json.dumps({"type": "resync", "game_id": game_id}))
+        while not mirror.apply(websocket.recv()):
+            pass
+    print(f"State {mirror.seq}: {mirror.state}")
+
+def test(actions):
     with connect("ws://"+uri+":"+port) as websocket:
-        websocket.send(msg)
-        message = websocket.recv()
-        print(f"Received: {message}")
+        websocket.send(json.dumps({"type": "create"}))
+        game_id = unpack(websocket.recv())["game_id"]
+
+        mirror = StateMirror()
+        tokens = {}
+        for position in ("ip", "oop"):
+            websocket.send(json.dumps({"type": "join", "game_id": game_id, "position": position}))
+            joined = unpack(websocket.recv())
+            tokens[position] = joined["token"]
+            print(f"Joined as {position} with {joined['hand']}")
+            receive_state(websocket, mirror, game_id)
+
+        for position, action, amount in actions:
+            websocket.send(json.dumps({"type": "action", "game_id": game_id, "token": tokens[position], "action": action, "amount": amount}))
+            receive_state(websocket, mirror, game_id)
 
-test("{\"id\": \"1\", \"name\": \"demo\", \"count\": \"0\", \"action\": \"call:0\"}")
-test("{\"id\": \"1\", \"name\": \"demo\", \"count\": \"0\", \"action\": \"bet:50\"}")
-test("{\"id\": \"1\", \"name\": \"demo\", \"count\": \"0\", \"action\": \"fold:0\"}")
-test("{\"id\": \"1\", \"name\": \"demo\", \"count\": \"0\", \"action\": \"check:0\"}")
\ No newline at end of file
+test([("ip", "call", None), ("oop", "bet", 6), ("ip", "call", None)])
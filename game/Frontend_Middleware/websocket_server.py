@@ -2,7 +2,28 @@
 
 import asyncio
 import json
-from websockets.asyncio.server import serve
+import logging
+from websockets.asyncio.server import serve, broadcast
+from game_server import HTTPError, TableRegistry, validate_amount
+from state_sync import TableChannel, pack, unpack
+
+# Table play over websockets.
+#
+# Clients send requests as msgpack (binary frames) or JSON (text frames):
+#
+#   {"type": "create", "ai_position", "model"}         -> {"t": "ok", "game_id"}
+#   {"type": "join", "game_id", "position"}            -> {"t": "ok", "token", "hand"} + snapshot
+#   {"type": "watch", "game_id"}                       -> snapshot
+#   {"type": "action", "game_id", "token", "action", "amount"}
+#   {"type": "resync", "game_id"}                      -> snapshot
+#
+# Every subscriber of a table is sent one snapshot when it joins or watches,
+# then the delta of each action on the table (see state_sync.py). Replies and
+# state messages are msgpack; errors are {"t": "e", "error"}.
+
+registry = TableRegistry()
+channels = {}  # game_id -> TableChannel
+subscribers = {}  # game_id -> set of connections
 
 def get_ai_action(action):
     '''
@@ -16,47 +37,69 @@ def fetch_db_data():
     '''
     return
 
-def validate_action(action):
-    '''
-    Check if the action sent is valid.
-    '''
-    action_list = ["call", "check", "fold"]
-    valid_action = 0
-    for act in action_list:
-        if action[0] == act:
-            print("Need to validate action is valid assuming "+act+" is valid") # replace this with action valid
-            valid_action = 1
-    if action[0] == "bet":
-        print("Need to validate amount is valid for now assuming bet is valid") # replace this statement with validator
-        valid_action = 1
-    return valid_action
-
-def check_for_action_value(msg):
-    #print("message: "+msg)
-    parsed = msg.split(":")
-    return validate_action(parsed)
-
-def decode_ws_data(json_cmd):
-    # Convert JSON String to Python
+def decode_ws_data(message):
+    # Binary frames are msgpack, text frames JSON
     try:
-        hand_details = json.loads(json_cmd)
-        act = hand_details['action']
-        if check_for_action_value(act) == 1:
-            return "Valid Action was logged game state incoming" # need to return the state of the game
-        else:
-            raise Exception("Action "+act+" was not valid")
+        request = unpack(message) if isinstance(message, bytes) else json.loads(message)
+    except ValueError:
+        raise HTTPError(400, "Malformed message")
+    if not isinstance(request, dict) or "type" not in request:
+        raise HTTPError(400, "Message must be an object with a type")
+    return request
 
-    except:
-        print("Bad action")
-        return "Invalid Requested Action" # tell the client they have sent an invalid value
+def subscribe(websocket, game_id):
+    subscribers.setdefault(game_id, set()).add(websocket)
+    return channels[game_id].snapshot()
+
+def unsubscribe(websocket):
+    for game_id, connections in list(subscribers.items()):
+        connections.discard(websocket)
+        if not connections:
+            del subscribers[game_id]
+
+async def handle_request(websocket, request):
+    kind = request.get("type")
+    if kind == "create":
+        table = await registry.create(request.get("ai_position"), request.get("model"))
+        channels[table.game_id] = TableChannel(table.game.get_public_game_state())
+        await websocket.send(pack({"t": "ok", "game_id": table.game_id}))
+        return
+
+    table = registry.get(request.get("game_id"))
+    if kind == "join":
+        position = request.get("position")
+        token = table.join(position)
+        hand = table.game.get_private_game_state()[f"{position}_player"]["hand"]
+        await websocket.send(pack({"t": "ok", "game_id": table.game_id, "position": position, "token": token, "hand": hand}))
+        await websocket.send(subscribe(websocket, table.game_id))
+    elif kind in ("watch", "resync"):
+        await websocket.send(subscribe(websocket, table.game_id))
+    elif kind == "action":
+        state = await table.act(request.get("token"), request.get("action"), validate_amount(request.get("amount")))
+        delta = channels[table.game_id].update(state)
+        if delta is not None:
+            # Encoded once per action, whatever the number of subscribers
+            broadcast(subscribers.get(table.game_id, ()), delta)
+    else:
+        raise HTTPError(400, f"Unknown message type {kind}")
 
 async def super_loop(websocket):
-    async for message in websocket:
-            ret_msg = decode_ws_data(message)
-            await websocket.send(ret_msg)
+    try:
+        async for message in websocket:
+            try:
+                await handle_request(websocket, decode_ws_data(message))
+            except HTTPError as e:
+                await websocket.send(pack({"t": "e", "error": str(e)}))
+            except Exception:
+                # One bad request does not drop the connection or its subscriptions
+                logging.exception("Unhandled error serving a websocket request")
+                await websocket.send(pack({"t": "e", "error": "Internal server error"}))
+    finally:
+        unsubscribe(websocket)
 
 async def main():
     async with serve(super_loop, "localhost", 8765):
         await asyncio.get_running_loop().create_future()  # run forever
 
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())
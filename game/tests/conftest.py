@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The backend and middleware modules import each other as top-level modules
+GAME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("Backend", "Frontend_Middleware"):
+    sys.path.insert(0, os.path.join(GAME_DIR, directory))
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import torch
+import inference_service
+from agent import DQNAgent
+from game_server import MAX_BODY_BYTES, MAX_HEADER_BYTES, HTTPServer, TableRegistry
+from inference_service import get_service
+from model_registry import get_registry
+
+NUM_TABLES = 8
+
+
+def register_model(models_dir):
+    path = os.path.join(models_dir, "oop_model.pth")
+    torch.save(DQNAgent(33, 4).model.state_dict(), path)
+    return get_registry(models_dir).register(path, position="oop")["name"]
+
+
+def test_concurrent_tables_share_one_forward_pass(tmp_path):
+    models_dir = str(tmp_path)
+    model_name = register_model(models_dir)
+    service = get_service(model_name, models_dir)
+    # Hold the first request until every table's decision has arrived
+    service.max_batch = NUM_TABLES
+    service.max_wait = 30
+
+    batch_sizes = []
+    act_batch = service.policy.act_batch
+
+    def counting_act_batch(states, *args):
+        batch_sizes.append(len(states))
+        return act_batch(states, *args)
+
+    service.policy.act_batch = counting_act_batch
+
+    async def play():
+        registry = TableRegistry(NUM_TABLES, models_dir=models_dir)
+        tables = [await registry.create("oop", model_name) for _ in range(NUM_TABLES)]
+        # The human in position acts first preflop, after which the AI is to act
+        tokens = [table.join("ip") for table in tables]
+        return await asyncio.gather(*(table.act(token, "call", None) for table, token in zip(tables, tokens)))
+
+    try:
+        states = asyncio.run(play())
+    finally:
+        service.close()
+        inference_service.services.clear()
+
+    assert batch_sizes == [NUM_TABLES]
+    for state in states:
+        assert state["num_actions"] >= 2
+
+
+def request(method, path, body=None, version="HTTP/1.1", headers=()):
+    # bytes bodies are sent as they are, for JSON that json.dumps would not write
+    payload = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b""
+    lines = [f"{method} {path} {version}", f"Content-Length: {len(payload)}", *headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + payload
+
+
+async def read_response(reader):
+    """
+    Returns:
+        tuple: (status code, headers, decoded JSON body).
+    """
+    lines = (await reader.readuntil(b"\r\n\r\n")).decode().split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers["content-length"]))
+    return int(lines[0].split()[1]), headers, json.loads(body)
+
+
+def run_with_client(tmp_path, scenario):
+    """
+    Serve an empty model registry and run scenario(server, reader, writer) on one connection.
+    """
+    async def main():
+        server = HTTPServer(TableRegistry(models_dir=str(tmp_path)))
+        listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0, limit=MAX_HEADER_BYTES)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            return await scenario(server, reader, writer)
+        finally:
+            writer.close()
+            listener.close()
+            await listener.wait_closed()
+
+    return asyncio.run(main())
+
+
+async def exchange(reader, writer, data):
+    writer.write(data)
+    await writer.drain()
+    return await read_response(reader)
+
+
+async def create_table(reader, writer):
+    status, _, body = await exchange(reader, writer, request("POST", "/tables"))
+    assert status == 200
+    return body["game_id"]
+
+
+def test_pipelined_requests_are_answered_in_order(tmp_path):
+    async def scenario(server, reader, writer):
+        game_id = await create_table(reader, writer)
+        writer.write(request("GET", f"/tables/{game_id}") + request("GET", "/tables") + request("GET", "/nowhere"))
+        await writer.drain()
+        first = await read_response(reader)
+        second = await read_response(reader)
+        third = await read_response(reader)
+        assert first[0] == 200 and "pot" in first[2]
+        assert second[0] == 200 and second[2] == {"tables": [game_id]}
+        assert third[0] == 404
+
+    run_with_client(tmp_path, scenario)
+
+
+def test_connection_close_and_http_1_0(tmp_path):
+    async def scenario(server, reader, writer):
+        status, headers, _ = await exchange(reader, writer, request("GET", "/tables", version="HTTP/1.0", headers=["Connection: keep-alive"]))
+        assert status == 200 and headers["connection"] == "keep-alive"
+        status, headers, _ = await exchange(reader, writer, request("GET", "/tables", headers=["Connection: close"]))
+        assert status == 200 and headers["connection"] == "close"
+        assert await reader.read() == b""
+
+    run_with_client(tmp_path, scenario)
+
+    async def http_1_0(server, reader, writer):
+        status, headers, _ = await exchange(reader, writer, request("GET", "/tables", version="HTTP/1.0"))
+        assert status == 200 and headers["connection"] == "close"
+        assert await reader.read() == b""
+
+    run_with_client(tmp_path, http_1_0)
+
+
+def test_malformed_requests_close_the_connection(tmp_path):
+    cases = [
+        (b"GET /tables HTTP/1.1\r\nContent-Length: ten\r\n\r\n", 400),
+        (f"POST /tables HTTP/1.1\r\nContent-Length: {MAX_BODY_BYTES + 1}\r\n\r\n".encode(), 413),
+        (b"GET /tables HTTP/1.1\r\nX-Padding: " + b"a" * MAX_HEADER_BYTES + b"\r\n\r\n", 431),
+        (b"POST /tables HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n", 501),
+        (b"GET /tables HTTP/2.0\r\n\r\n", 400),
+    ]
+    for data, expected in cases:
+        async def scenario(server, reader, writer):
+            status, headers, _ = await exchange(reader, writer, data)
+            assert status == expected
+            assert headers["connection"] == "close"
+            assert await reader.read() == b""
+
+        run_with_client(tmp_path, scenario)
+
+
+def test_routing_errors(tmp_path):
+    async def scenario(server, reader, writer):
+        game_id = await create_table(reader, writer)
+        assert (await exchange(reader, writer, request("GET", "/tables/unknown")))[0] == 404
+        assert (await exchange(reader, writer, request("PUT", "/tables")))[0] == 405
+        assert (await exchange(reader, writer, request("GET", f"/tables/{game_id}/join")))[0] == 405
+        status, _, _ = await exchange(reader, writer, request("POST", f"/tables/{game_id}/join", {"position": "ip"}))
+        assert status == 200
+        assert (await exchange(reader, writer, request("POST", f"/tables/{game_id}/join", {"position": "ip"})))[0] == 409
+        assert (await exchange(reader, writer, request("POST", f"/tables/{game_id}/action", {"token": "x", "action": "call"})))[0] == 409
+
+    run_with_client(tmp_path, scenario)
+
+
+def test_invalid_amounts_are_rejected(tmp_path):
+    async def scenario(server, reader, writer):
+        game_id = await create_table(reader, writer)
+        _, _, joined = await exchange(reader, writer, request("POST", f"/tables/{game_id}/join", {"position": "ip"}))
+        bodies = [
+            json.dumps({"token": joined["token"], "action": "bet", "amount": amount}).encode()
+            for amount in ("5", True, [5], {"chips": 5})
+        ]
+        # Python's JSON decoder accepts NaN and Infinity
+        bodies.append(f'{{"token": "{joined["token"]}", "action": "bet", "amount": NaN}}'.encode())
+        for body in bodies:
+            status, _, reply = await exchange(reader, writer, request("POST", f"/tables/{game_id}/action", body))
+            assert status == 400, body
+            assert reply["error"] == "Amount must be a number"
+
+    run_with_client(tmp_path, scenario)
+
+
+def test_unexpected_errors_are_answered_with_500(tmp_path):
+    async def scenario(server, reader, writer):
+        game_id = await create_table(reader, writer)
+        _, _, joined = await exchange(reader, writer, request("POST", f"/tables/{game_id}/join", {"position": "ip"}))
+
+        def fail(action, amount=None):
+            raise RuntimeError("engine failure")
+
+        server.registry.get(game_id).game.process_action = fail
+        status, headers, body = await exchange(
+            reader, writer, request("POST", f"/tables/{game_id}/action", {"token": joined["token"], "action": "call"})
+        )
+        assert status == 500 and body == {"error": "Internal Server Error"}
+        # The connection and the table's lock are still usable
+        assert headers["connection"] == "keep-alive"
+        status, _, _ = await exchange(reader, writer, request("GET", f"/tables/{game_id}"))
+        assert status == 200
+
+    run_with_client(tmp_path, scenario)
@@ -0,0 +1,106 @@
+from game_logic import PokerGame
+from state_sync import StateMirror, TableChannel, apply_delta, flatten_state, pack, state_delta, unpack
+
+
+def public_state(game):
+    # The state as a client decodes it, with NumPy values turned into lists and ints
+    return unpack(pack(game.get_public_game_state()))
+
+
+def test_delta_has_only_changed_fields():
+    previous = flatten_state({"pot": 3, "oop_player": {"chips": 198, "committed": 2}})
+    current = flatten_state({"pot": 5, "oop_player": {"chips": 198, "committed": 4}})
+    assert state_delta(previous, current) == {"set": {"pot": 5, "oop_player.committed": 4}}
+    assert state_delta(current, current) == {}
+
+
+def test_dealt_board_cards_are_appended():
+    previous = {"community_cards": ["Ah", "Kd", "2c"]}
+    current = {"community_cards": ["Ah", "Kd", "2c", "7s"]}
+    delta = state_delta(previous, current)
+    assert delta == {"board": ["7s"]}
+    apply_delta(previous, delta)
+    assert previous == current
+
+
+def test_new_board_replaces_the_old_one():
+    previous = {"community_cards": ["Ah", "Kd", "2c"]}
+    current = {"community_cards": []}
+    delta = state_delta(previous, current)
+    assert delta == {"set": {"community_cards": []}}
+    apply_delta(previous, delta)
+    assert previous == current
+
+
+def test_removed_fields_are_unset():
+    previous = {"pot": 3, "message": "OOP wins $3"}
+    current = {"pot": 3}
+    delta = state_delta(previous, current)
+    assert delta == {"unset": ["message"]}
+    apply_delta(previous, delta)
+    assert previous == current
+
+
+def test_unchanged_state_publishes_nothing():
+    channel = TableChannel({"pot": 3})
+    assert channel.update({"pot": 3}) is None
+    assert channel.seq == 1
+    assert unpack(channel.update({"pot": 4}))["seq"] == 2
+
+
+def test_mirror_detects_a_gap_until_resynced():
+    channel = TableChannel({"pot": 1})
+    mirror = StateMirror()
+    assert mirror.apply(channel.snapshot())
+    first = channel.update({"pot": 2})
+    channel.update({"pot": 3})  # Lost
+    third = channel.update({"pot": 4})
+
+    assert mirror.apply(first)
+    assert not mirror.apply(third)
+    assert mirror.seq is None
+    # Deltas in flight before the snapshot answering the resync are rejected too
+    assert not mirror.apply(third)
+    assert mirror.apply(channel.snapshot())
+    assert mirror.seq == 4
+    assert mirror.state == {"pot": 4}
+
+
+def test_mirror_skips_deltas_covered_by_a_snapshot():
+    channel = TableChannel({"pot": 1})
+    stale = channel.update({"pot": 2})
+    old_snapshot = TableChannel({"pot": 1}).snapshot()
+    mirror = StateMirror()
+    mirror.apply(channel.snapshot())
+    assert mirror.apply(stale)
+    assert mirror.apply(old_snapshot)
+    assert mirror.seq == 2
+    assert mirror.state == {"pot": 2}
+
+
+def test_mirror_follows_a_hand_with_a_dropped_delta():
+    game = PokerGame()
+    game.start_new_hand()
+    channel = TableChannel(game.get_public_game_state())
+    mirror = StateMirror()
+    mirror.apply(channel.snapshot())
+
+    def publish():
+        return channel.update(game.get_public_game_state())
+
+    game.process_action("call")
+    assert mirror.apply(publish())
+    game.process_action("check")
+    game.deal_community_cards(3)
+    dropped = publish()
+    assert dropped is not None
+    game.deal_community_cards(1)
+    assert not mirror.apply(publish())
+
+    assert mirror.apply(channel.snapshot())
+    assert mirror.state == public_state(game)
+
+    # A new hand resets the board and the stacks
+    game.start_new_hand()
+    assert mirror.apply(publish())
+    assert mirror.state == public_state(game)